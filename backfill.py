@@ -0,0 +1,59 @@
+import argparse
+import asyncio
+import logging
+
+import aiohttp
+
+from tgbot.config import settings
+from tgbot.models.base import create_db_session
+from tgbot.models.db_commands import get_address_book_account_keys
+from tgbot.services.backfill import backfill_accounts
+from tgbot.utils.net_accounts import create_account_readers
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Backfill full transaction history of accounts")
+    parser.add_argument("addresses", nargs="*", help="account addresses")
+    parser.add_argument("--type", dest="account_type", choices=["TRC20", "ERC20", "BEP20"],
+                        help="account type, all matching chains if omitted")
+    parser.add_argument("--all", action="store_true", help="backfill all accounts of all address books")
+    parser.add_argument("--restart", action="store_true", help="ignore saved checkpoints")
+    return parser.parse_args()
+
+
+async def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format=u'%(filename)s:%(lineno)d #%(levelname)-8s [%(asctime)s] - %(name)s - %(message)s',
+    )
+    args = parse_args()
+    config = settings
+    db_session = await create_db_session(config.db_dialect, config.db_name, config.db_user,
+                                         config.db_pass.get_secret_value(), config.db_host, config.db_echo,
+                                         sqlite_pragmas=config.sqlite_pragmas,
+                                         pool_size=config.db_pool_size,
+                                         max_overflow=config.db_max_overflow,
+                                         pool_timeout=config.db_pool_timeout)
+    accounts = [(address, args.account_type) for address in args.addresses]
+    if args.all:
+        accounts.extend((row.account_address, row.account_type_id)
+                        for row in await get_address_book_account_keys(db_session))
+
+    async with aiohttp.ClientSession() as http_session:
+        account_readers = create_account_readers(http_session, config)
+        results = await backfill_accounts(db_session=db_session,
+                                          readers=account_readers,
+                                          accounts=accounts,
+                                          concurrency=config.backfill_concurrency,
+                                          restart=args.restart)
+    for (address, account_type), result in results.items():
+        logger.info("%s %s: %s", account_type, address, result or "not backfilled")
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except (KeyboardInterrupt, SystemExit):
+        logger.error("Backfill stopped!")
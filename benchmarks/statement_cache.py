@@ -0,0 +1,79 @@
+"""
+Micro-benchmark of the statement overhead of the db_commands hot paths on an in-memory SQLite database:
+statements rebuilt per call without the compiled cache (as with the former cache_ok = False columns),
+statements rebuilt per call with the cache, and the prebuilt db_commands statements.
+
+    python -m benchmarks.statement_cache [calls]
+"""
+import asyncio
+import sys
+import time
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import joinedload
+
+from tgbot.models.addressbook import AccountType, AddressBook, Account, AddressBookEntry
+from tgbot.models.base import Base
+from tgbot.models.db_commands import get_address_book_entries, read_account
+
+ADDRESS_BOOK_ID = 1
+ENTRIES = 20
+
+
+async def create_session(query_cache_size: int) -> async_sessionmaker:
+    engine = create_async_engine("sqlite+aiosqlite://", query_cache_size=query_cache_size)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(AccountType), [dict(id="ERC20", native_token="ETH", token_contract="0x0")])
+        await conn.execute(insert(AddressBook), [dict(id=ADDRESS_BOOK_ID, title="benchmark")])
+        await conn.execute(insert(Account), [dict(address=f"0x{i:040x}", account_type_id="ERC20",
+                                                  native_balance=2 ** 70 + i, token_balance=i)
+                                             for i in range(ENTRIES)])
+        await conn.execute(insert(AddressBookEntry), [dict(address_book_id=ADDRESS_BOOK_ID,
+                                                           account_address=f"0x{i:040x}",
+                                                           account_type_id="ERC20",
+                                                           account_alias=f"wallet {i}") for i in range(ENTRIES)])
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def rebuilt_get_address_book_entries(session: async_sessionmaker, address_book_id: int):
+    statement = select(AddressBookEntry).where(AddressBookEntry.address_book_id == address_book_id)
+    statement = statement.order_by(AddressBookEntry.account_alias)
+    statement = statement.options(joinedload(AddressBookEntry.account,
+                                             innerjoin=True).joinedload(Account.account_type, innerjoin=True))
+    async with session() as session:
+        return (await session.execute(statement)).scalars().all()
+
+
+async def rebuilt_read_account(session: async_sessionmaker, address: str, account_type_id: str):
+    statement = select(Account).where(Account.address == address, Account.account_type_id == account_type_id)
+    async with session() as session:
+        return (await session.execute(statement)).scalars().one_or_none()
+
+
+async def measure(name: str, calls: int, call) -> None:
+    await call()
+    started = time.perf_counter()
+    for _ in range(calls):
+        await call()
+    print(f"{name:<55} {(time.perf_counter() - started) / calls * 1e6:9.1f} us/call")
+
+
+async def main(calls: int) -> None:
+    uncached = await create_session(query_cache_size=0)
+    cached = await create_session(query_cache_size=500)
+    address = f"0x{0:040x}"
+    for title, entries, account in (
+            ("rebuilt, no compiled cache", lambda: rebuilt_get_address_book_entries(uncached, ADDRESS_BOOK_ID),
+             lambda: rebuilt_read_account(uncached, address, "ERC20")),
+            ("rebuilt, compiled cache", lambda: rebuilt_get_address_book_entries(cached, ADDRESS_BOOK_ID),
+             lambda: rebuilt_read_account(cached, address, "ERC20")),
+            ("prebuilt, compiled cache", lambda: get_address_book_entries(cached, ADDRESS_BOOK_ID),
+             lambda: read_account(cached, address, "ERC20"))):
+        await measure(f"get_address_book_entries ({title})", calls, entries)
+        await measure(f"read_account ({title})", calls, account)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000))
@@ -0,0 +1,82 @@
+"""
+Memory and lookup cost of the watchlist index against the tracked entries loaded as ORM objects,
+on an in-memory SQLite database of `entries` address book entries, two chats per account.
+Load times are taken under tracemalloc, so they are only comparable with each other.
+
+    python -m benchmarks.watchlist_memory [entries]
+"""
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from tgbot.models.addressbook import AccountType, AddressBook, Account, AddressBookEntry
+from tgbot.models.base import Base
+from tgbot.models.db_commands import get_tracked_address_book_entries, load_watchlist
+from tgbot.models.watchlist import watchlist
+
+ADDRESS_BOOKS = 2
+INSERT_CHUNK = 5000
+LOOKUPS = 100000
+
+
+async def create_session(entries: int) -> async_sessionmaker:
+    engine = create_async_engine("sqlite+aiosqlite://")
+    accounts = [f"0x{i:040x}" for i in range(entries // ADDRESS_BOOKS)]
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(AccountType), [dict(id="ERC20", native_token="ETH", token_contract="0x0")])
+        await conn.execute(insert(AddressBook), [dict(id=i, title=f"chat {i}") for i in range(ADDRESS_BOOKS)])
+        for i in range(0, len(accounts), INSERT_CHUNK):
+            await conn.execute(insert(Account), [dict(address=address, account_type_id="ERC20",
+                                                      native_balance=2 ** 70, token_balance=0)
+                                                 for address in accounts[i:i + INSERT_CHUNK]])
+            await conn.execute(insert(AddressBookEntry), [dict(address_book_id=address_book_id,
+                                                               account_address=address,
+                                                               account_type_id="ERC20",
+                                                               account_alias=f"wallet {address[-8:]}",
+                                                               track_native=True,
+                                                               track_token=False,
+                                                               native_threshold=10 ** 18,
+                                                               token_threshold=10 ** 9)
+                                                          for address in accounts[i:i + INSERT_CHUNK]
+                                                          for address_book_id in range(ADDRESS_BOOKS)])
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def measure_memory(name: str, entries: int, load) -> object:
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    loaded = await load()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<45} {size / 2 ** 20:8.1f} MiB {size / entries:8.0f} B/entry {elapsed:8.2f} s load")
+    return loaded
+
+
+async def main(entries: int) -> None:
+    session = await create_session(entries)
+    orm_entries = await measure_memory("tracked entries as ORM objects", entries,
+                                       lambda: get_tracked_address_book_entries(session))
+    del orm_entries
+    await measure_memory("watchlist index", entries, lambda: load_watchlist(session))
+
+    addresses = [f"0x{i:040x}" for i in range(0, entries // ADDRESS_BOOKS, 7)]
+    started = time.perf_counter()
+    for i in range(LOOKUPS):
+        watchlist.subscribers(addresses[i % len(addresses)], "ERC20")
+    print(f"{'watchlist subscribers lookup':<45} {(time.perf_counter() - started) / LOOKUPS * 1e6:8.2f} us/call")
+    started = time.perf_counter()
+    tracked = sum(1 for _ in watchlist.tracked())
+    print(f"{'watchlist tracked scan':<45} {(time.perf_counter() - started) * 1e3:8.1f} ms for {tracked} entries")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000))
@@ -15,7 +15,14 @@ from tgbot.handlers.groups.track_bot_chat_member import bot_chat_member_router
 from tgbot.handlers.user import user_router
 from tgbot.middlewares.config import ConfigMiddleware
 from tgbot.models.base import create_db_session
+from tgbot.models.db_commands import init_account_latest_statements, load_watchlist
 from tgbot.services import broadcaster
+from tgbot.services.block_watcher import BlockWatcher
+from tgbot.services.delivery import DeliveryQueue
+from tgbot.utils.alerts import set_alert_sender
+from tgbot.services.scheduler import BalancePoller
+from tgbot.utils.net_accounts import create_account_readers
+from tgbot.wallet_readers.response_cache import create_response_cache
 
 logger = logging.getLogger(__name__)
 
@@ -24,10 +31,10 @@ async def on_startup(bot: Bot, admin_ids: list[int]):
     await broadcaster.broadcast(bot, admin_ids, "Bot started")
 
 
-def register_global_middlewares(dp: Dispatcher, config, db_session, http_session):
-    dp.my_chat_member.outer_middleware(ConfigMiddleware(config, db_session, http_session))
-    dp.message.outer_middleware(ConfigMiddleware(config, db_session, http_session))
-    dp.callback_query.outer_middleware(ConfigMiddleware(config, db_session, http_session))
+def register_global_middlewares(dp: Dispatcher, config, db_session, http_session, account_readers):
+    dp.my_chat_member.outer_middleware(ConfigMiddleware(config, db_session, http_session, account_readers))
+    dp.message.outer_middleware(ConfigMiddleware(config, db_session, http_session, account_readers))
+    dp.callback_query.outer_middleware(ConfigMiddleware(config, db_session, http_session, account_readers))
 
 
 async def main():
@@ -45,11 +52,20 @@ async def main():
         storage = MemoryStorage()
 
     db_session = await create_db_session(config.db_dialect, config.db_name, config.db_user,
-                                         config.db_pass.get_secret_value(), config.db_host, config.db_echo)
+                                         config.db_pass.get_secret_value(), config.db_host, config.db_echo,
+                                         sqlite_pragmas=config.sqlite_pragmas,
+                                         pool_size=config.db_pool_size,
+                                         max_overflow=config.db_max_overflow,
+                                         pool_timeout=config.db_pool_timeout)
+    await init_account_latest_statements(db_session)
+    logger.info("Watchlist index loaded: %d entries", await load_watchlist(db_session))
     http_session = aiohttp.ClientSession()
+    response_cache = create_response_cache(config.use_redis, config.redis_dsn, config.response_cache_size)
+    account_readers = create_account_readers(http_session, config, response_cache)
     bot = Bot(token=config.bot_token.get_secret_value(), parse_mode='HTML')
     dp = Dispatcher(storage=storage)
     dp["http_session"] = http_session
+    dp["response_cache"] = response_cache
     dp.shutdown.register(on_shutdown)
     setup_dialogs(dp)
 
@@ -62,15 +78,36 @@ async def main():
 
         dp.include_router(router)
 
-    register_global_middlewares(dp, config, db_session, http_session)
+    register_global_middlewares(dp, config, db_session, http_session, account_readers)
     await on_startup(bot, config.admins)
+    delivery = DeliveryQueue(bot, config)
+    dp["delivery"] = delivery
+    delivery.start()
+    set_alert_sender(delivery.send)
+    block_watcher = BlockWatcher(bot, db_session, account_readers, config)
+    watched_account_types = block_watcher.account_types if config.block_watcher else []
+    if watched_account_types:
+        dp["block_watcher"] = block_watcher
+        block_watcher.start()
+    balance_poller = BalancePoller(bot, db_session, account_readers, config,
+                                   watched_account_types=watched_account_types)
+    dp["balance_poller"] = balance_poller
+    balance_poller.start()
     await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
 
 
 async def on_shutdown(bot: Bot, **kwargs: Any):
     dp = kwargs.get('dispatcher')
+    balance_poller = dp.get("balance_poller")
+    await balance_poller.stop() if balance_poller else None
+    block_watcher = dp.get("block_watcher")
+    await block_watcher.stop() if block_watcher else None
+    delivery = dp.get("delivery")
+    await delivery.stop() if delivery else None
     http_session = dp.get("http_session")
     await http_session.close() if http_session else None
+    response_cache = dp.get("response_cache")
+    await response_cache.close() if response_cache is not None else None
 
 
 if __name__ == '__main__':
@@ -0,0 +1,45 @@
+import os
+
+# tgbot.config reads the settings on import, tests do not need real values
+os.environ.setdefault("BOT_TOKEN", "123:test")
+os.environ.setdefault("ADMINS", "1")
+os.environ.setdefault("USE_REDIS", "false")
+os.environ.setdefault("TRON_API_KEYS", "test")
+os.environ.setdefault("BSC_SCAN_API_KEYS", "test")
+os.environ.setdefault("ETHERSCAN_API_KEYS", "test")
+os.environ.setdefault("REDIS_DSN", "redis://localhost:6379/0")
+os.environ.setdefault("DB_DIALECT", "sqlite+aiosqlite")
+os.environ.setdefault("DB_USER", "test")
+os.environ.setdefault("PG_PASSWORD", "test")
+os.environ.setdefault("DB_PASS", "test")
+os.environ.setdefault("DB_HOST", "localhost")
+os.environ.setdefault("DB_NAME", ":memory:")
+os.environ.setdefault("DB_ECHO", "false")
+
+import pytest  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from tgbot.models.addressbook import AccountType  # noqa: E402
+from tgbot.models.base import create_db_session  # noqa: E402
+from tgbot.models.db_commands import load_watchlist  # noqa: E402
+
+ACCOUNT_TYPES = [dict(id="ERC20", native_token="ETH", native_unit=10 ** 18, token_unit=10 ** 6, token_contract="0x0"),
+                 dict(id="BEP20", native_token="BNB", native_unit=10 ** 18, token_unit=10 ** 18, token_contract="0x1"),
+                 dict(id="TRC20", native_token="TRX", native_unit=10 ** 6, token_unit=10 ** 6, token_contract="T0")]
+
+
+@pytest.fixture
+def create_session(tmp_path):
+    """
+    Factory of a session of a new SQLite database with the account types, to be awaited in the test event loop.
+    The watchlist index is loaded from the new database.
+    """
+    async def create():
+        session = await create_db_session("sqlite+aiosqlite", str(tmp_path / "test.db"), "", "", "", False)
+        async with session() as db_session:
+            await db_session.execute(insert(AccountType), ACCOUNT_TYPES)
+            await db_session.commit()
+        await load_watchlist(session)
+        return session
+
+    return create
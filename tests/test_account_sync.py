@@ -0,0 +1,93 @@
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import select
+
+from tgbot.models import db_commands
+from tgbot.models.addressbook import Account, AccountStatement, AccountLatestStatement, AccountTransaction, \
+    AccountSyncCursor
+from tgbot.models.db_commands import AccountSync, sync_db_accounts
+from tgbot.models.watchlist import watchlist
+from tgbot.utils.alerts import set_alert_sender
+from tgbot.utils.net_accounts import store_account_syncs
+from tgbot.wallet_readers.account_readers import APIAccountTransaction, APISyncCursor
+
+ADDRESSES = ["0x" + f"{number:040x}" for number in range(1, 6)]
+COUNTERPARTY = "0x" + "f" * 40
+
+
+def account(address: str, native_balance: int, token_balance: int = 0) -> Account:
+    return Account(address, "ERC20", native_balance, token_balance)
+
+
+async def read_all(session, model):
+    async with session() as db_session:
+        return (await db_session.scalars(select(model))).all()
+
+
+def test_sync_db_accounts_statements(create_session, monkeypatch):
+    # lookups of the last statements are split into several queries
+    monkeypatch.setattr(db_commands, "SYNC_LOOKUP_CHUNK", 2)
+    timestamp = datetime.datetime(2023, 5, 1, 12, 0)
+    transfer = APIAccountTransaction(from_address=COUNTERPARTY, to_address=ADDRESSES[0], amount=10 ** 18,
+                                     timestamp=timestamp, block_number=100)
+
+    async def run():
+        session = await create_session()
+        first = [AccountSync(db_account=None, net_account=account(address, 100))
+                 for address in ADDRESSES]
+        first[0].tx = {"native": [transfer]}
+        first[0].cursors = {"native": APISyncCursor(block_number=100)}
+        assert await sync_db_accounts(session, first) == len(ADDRESSES)
+        # the last statement is moved forward while the stored balances are unchanged since it,
+        # a new statement is added otherwise
+        await sync_db_accounts(session, [AccountSync(db_account=account(address, 100 if number % 2 else 150),
+                                                     net_account=account(address, 200))
+                                         for number, address in enumerate(ADDRESSES)])
+        return (await read_all(session, AccountStatement), await read_all(session, AccountLatestStatement),
+                await read_all(session, Account), await read_all(session, AccountTransaction),
+                await read_all(session, AccountSyncCursor))
+
+    statements, latest, accounts, transactions, cursors = asyncio.run(run())
+    statement_counts = {address: len([statement for statement in statements if statement.account_address == address])
+                        for address in ADDRESSES}
+    assert statement_counts == {address: 1 if number % 2 else 2 for number, address in enumerate(ADDRESSES)}
+    assert {statement.account_address: statement.native_balance for statement in latest} == \
+           {address: 200 for address in ADDRESSES}
+    assert sorted(statement.native_balance for statement in statements) == [100] * 3 + [200] * 5
+    assert {item.address for item in accounts} == {*ADDRESSES, COUNTERPARTY}
+    assert [(tx.from_address, tx.to_address, tx.tx_amount) for tx in transactions] == \
+           [(COUNTERPARTY, ADDRESSES[0], 10 ** 18)]
+    assert [(cursor.account_address, cursor.tx_type, cursor.last_block) for cursor in cursors] == \
+           [(ADDRESSES[0], "native", 100)]
+
+
+def test_store_account_syncs_batches_and_alerts(create_session):
+    sent = []
+    subscription = SimpleNamespace(address_book_id=7, account_address=ADDRESSES[0], account_type_id="ERC20",
+                                   account_alias="wallet", track_native=True, native_threshold=1000,
+                                   track_token=False, token_threshold=0, schedule=5)
+
+    async def run():
+        session = await create_session()
+        watchlist.put(subscription)
+        set_alert_sender(lambda chat_id, text: sent.append(chat_id))
+        try:
+            refreshes = await store_account_syncs(session, [AccountSync(db_account=account(address, 500),
+                                                                        net_account=account(address, 2000))
+                                                            for address in ADDRESSES], batch_size=2)
+            # the next alert is evaluated against the alert state, not the stale database account
+            await store_account_syncs(session, [AccountSync(db_account=account(ADDRESSES[0], 500),
+                                                            net_account=account(ADDRESSES[0], 3000))])
+            await store_account_syncs(session, [AccountSync(db_account=account(ADDRESSES[0], 3000),
+                                                            net_account=account(ADDRESSES[0], 10))])
+        finally:
+            set_alert_sender(None)
+        return refreshes, await read_all(session, Account)
+
+    refreshes, accounts = asyncio.run(run())
+    assert [refresh.net_account.address for refresh in refreshes] == ADDRESSES
+    assert {item.address: item.native_balance for item in accounts} == {**{address: 2000 for address in ADDRESSES},
+                                                                        ADDRESSES[0]: 10}
+    assert sent == [7, 7]
@@ -0,0 +1,59 @@
+import asyncio
+
+import base58
+
+from tgbot.models.addressbook import Account
+from tgbot.utils import address_import
+from tgbot.utils.address_import import parse_address_list, import_address_list, ALIAS_MAX_LENGTH
+
+EVM_ADDRESS = "0x" + "Ab" * 20
+TRON_ADDRESS = base58.b58encode_check(b"\x41" + bytes(range(20))).decode()
+# valid base58 of the right length, the checksum does not match
+BROKEN_TRON_ADDRESS = TRON_ADDRESS[:-1] + ("1" if TRON_ADDRESS[-1] != "1" else "2")
+
+
+def test_parse_address_list():
+    text = "\n".join(["address,alias",
+                      "",
+                      "# comment",
+                      f"{EVM_ADDRESS}, \"main wallet\"",
+                      f"  {TRON_ADDRESS};tron",
+                      f"{EVM_ADDRESS.lower()} second alias of the same address",
+                      "0x1234",
+                      BROKEN_TRON_ADDRESS,
+                      "address",
+                      f"{'0x' + '1' * 40}\t{'x' * 100}",
+                      "0x" + "2" * 40])
+    addresses, invalid = parse_address_list(text)
+    assert addresses == {EVM_ADDRESS.lower(): "main wallet",
+                         TRON_ADDRESS: "tron",
+                         "0x" + "1" * 40: "x" * ALIAS_MAX_LENGTH,
+                         "0x" + "2" * 40: None}
+    # only the first line can be a CSV header
+    assert invalid == ["0x1234", BROKEN_TRON_ADDRESS, "address"]
+
+
+def test_import_address_list(create_session, monkeypatch):
+    found = {EVM_ADDRESS.lower(): [Account(EVM_ADDRESS.lower(), "ERC20", 1, 0),
+                                   Account(EVM_ADDRESS.lower(), "BEP20", 2, 0)],
+             TRON_ADDRESS: [Account(TRON_ADDRESS, "TRC20", 3, 0)]}
+
+    async def read_net_accounts(readers, addresses, progress=None):
+        return {address: found[address] for address in addresses if address in found}
+
+    monkeypatch.setattr(address_import, "read_net_accounts", read_net_accounts)
+    text = f"{EVM_ADDRESS} wallet\n{TRON_ADDRESS}\n{'0x' + '3' * 40}\nnot an address"
+
+    async def run():
+        session = await create_session()
+        return await import_address_list(db_session=session, readers={}, address_book_id=1,
+                                         address_book_title="book", text=text)
+
+    result = asyncio.run(run())
+    assert result.invalid == ["not an address"]
+    assert result.not_found == ["0x" + "3" * 40]
+    # an address found on several chains gets the chain suffix, an address without alias the default one
+    assert {(entry.account_type_id, entry.account_alias) for entry in result.entries} == {
+        ("ERC20", "wallet ERC20"),
+        ("BEP20", "wallet BEP20"),
+        ("TRC20", f"! book TRC20 {found[TRON_ADDRESS][0].short_address}")}
@@ -0,0 +1,88 @@
+import asyncio
+from typing import List, Tuple, Dict, Optional
+
+import pytest
+from aiogram import exceptions
+from aiogram.methods import SendMessage
+
+from tgbot.config import settings
+from tgbot.services.delivery import DeliveryQueue, MESSAGE_SEPARATOR
+
+# timer granularity of the event loop
+TOLERANCE = 0.02
+
+
+class FakeBot:
+    def __init__(self, errors: Optional[Dict[int, List[Exception]]] = None) -> None:
+        self.sent: List[Tuple[float, int, str]] = []
+        self.errors = errors or {}
+
+    async def send_message(self, chat_id: int, text: str) -> None:
+        if self.errors.get(chat_id):
+            raise self.errors[chat_id].pop(0)
+        self.sent.append((asyncio.get_running_loop().time(), chat_id, text))
+
+
+def create_queue(bot: FakeBot, rate: float = 1000, chat_interval: float = 0.1,
+                 group_interval: float = 0.3) -> DeliveryQueue:
+    return DeliveryQueue(bot, settings, rate=rate, workers=4, chat_interval=chat_interval,
+                         group_interval=group_interval)
+
+
+async def deliver(queue: DeliveryQueue, texts: List[Tuple[int, str]], pause: Optional[float] = None) -> None:
+    """
+    Queue the texts and wait until they are delivered. With `pause` the first text is sent alone
+    and the rest are queued `pause` seconds later, while the chat waits for its interval.
+    """
+    queue.start()
+    queue.send(*texts[0])
+    if pause is not None:
+        await asyncio.sleep(pause)
+    for text in texts[1:]:
+        queue.send(*text)
+    await asyncio.wait_for(queue.join(), 5)
+    await queue.stop()
+
+
+@pytest.mark.parametrize("chat_id, interval", [(1, 0.1), (-100, 0.3)])
+def test_chat_interval_and_coalescing(chat_id, interval):
+    bot = FakeBot()
+    queue = create_queue(bot)
+    asyncio.run(deliver(queue, [(chat_id, "a"), (chat_id, "b"), (chat_id, "c")], pause=0.02))
+    assert [text for _, _, text in bot.sent] == ["a", MESSAGE_SEPARATOR.join(["b", "c"])]
+    assert bot.sent[1][0] - bot.sent[0][0] >= interval - TOLERANCE
+    assert queue.sent == 2 and queue.coalesced == 1
+
+
+def test_rate_of_all_chats():
+    bot = FakeBot()
+    queue = create_queue(bot, rate=50)
+    asyncio.run(deliver(queue, [(chat_id, "a") for chat_id in range(1, 11)]))
+    times = [sent_at for sent_at, _, _ in bot.sent]
+    assert len(times) == 10
+    assert all(later - earlier >= 1 / 50 - TOLERANCE for earlier, later in zip(times, times[1:]))
+
+
+def test_retry_after_pauses_only_its_chat():
+    retry_after = exceptions.TelegramRetryAfter(SendMessage(chat_id=1, text="a"), "Flood control exceeded", 1)
+    bot = FakeBot(errors={1: [retry_after]})
+    queue = create_queue(bot)
+
+    async def run() -> float:
+        started = asyncio.get_running_loop().time()
+        await deliver(queue, [(1, "a"), (2, "b")])
+        return started
+
+    started = asyncio.run(run())
+    assert [(chat_id, text) for _, chat_id, text in bot.sent] == [(2, "b"), (1, "a")]
+    assert bot.sent[0][0] - started < 0.5
+    assert bot.sent[1][0] - started >= 1 - TOLERANCE
+
+
+def test_forbidden_drops_queued_texts():
+    forbidden = exceptions.TelegramForbiddenError(SendMessage(chat_id=1, text="a"), "bot was blocked by the user")
+    bot = FakeBot(errors={1: [forbidden]})
+    queue = create_queue(bot)
+    asyncio.run(deliver(queue, [(1, "a"), (1, "b"), (2, "c")]))
+    assert [(chat_id, text) for _, chat_id, text in bot.sent] == [(2, "c")]
+    assert len(queue) == 0
@@ -0,0 +1,111 @@
+import asyncio
+import datetime
+from typing import Any, Dict, List, Callable, Awaitable
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from tgbot.wallet_readers.account_readers import EvmRpcAccountReader, RpcError, ERC20_TRANSFER_TOPIC
+
+USDT_CONTRACT = "0x" + "c" * 40
+ADDRESSES = ["0x" + f"{i:040x}" for i in range(1, 6)]
+FAILED_ADDRESS = ADDRESSES[2]
+LOGS_MAX_BLOCK_RANGE = 100
+
+
+def topic(address: str) -> str:
+    return "0x" + address[2:].rjust(64, "0")
+
+
+def answer(call: Dict[str, Any]) -> Dict[str, Any]:
+    method, params = call["method"], call["params"]
+    if method == "eth_getBalance":
+        address = params[0]
+        if address == FAILED_ADDRESS:
+            return {"error": {"code": -32000, "message": "header not found"}}
+        return {"result": hex(ADDRESSES.index(address) * 10 ** 18)}
+    if method == "eth_call":
+        holder = "0x" + params[0]["data"][-40:]
+        if holder == ADDRESSES[0]:
+            return {"result": "0x"}
+        return {"result": "0x" + hex(ADDRESSES.index(holder) * 10 ** 6)[2:].rjust(64, "0")}
+    if method == "eth_blockNumber":
+        return {"result": hex(1000)}
+    if method == "eth_getBlockByNumber":
+        number = int(params[0], 16)
+        return {"result": {"number": params[0], "timestamp": hex(1700000000 + number), "transactions": []}}
+    if method == "eth_getLogs":
+        from_block, to_block = int(params[0]["fromBlock"], 16), int(params[0]["toBlock"], 16)
+        if to_block - from_block >= LOGS_MAX_BLOCK_RANGE:
+            return {"error": {"code": -32005, "message": "query returned more than 10000 results"}}
+        topics = params[0]["topics"]
+        logs = []
+        for block in range(from_block, to_block + 1):
+            if block % 40 != 0:
+                continue
+            sender, receiver = (ADDRESSES[0], ADDRESSES[1]) if block % 80 else (ADDRESSES[1], ADDRESSES[0])
+            if topics[1:] and topics[1:] not in ([topic(sender)], [None, topic(receiver)]):
+                continue
+            logs.append({"blockNumber": hex(block), "logIndex": "0x0", "transactionHash": hex(block),
+                         "topics": [ERC20_TRANSFER_TOPIC, topic(sender), topic(receiver)],
+                         "data": hex(block * 10 ** 6), "removed": False})
+        return {"result": logs}
+    return {"error": {"code": -32601, "message": "the method does not exist"}}
+
+
+def create_app(requests: List[List[Dict]]) -> web.Application:
+    async def handle(request: web.Request) -> web.Response:
+        calls = await request.json()
+        requests.append(calls)
+        # batch responses may come in any order, the reader matches them by id
+        return web.json_response([{"jsonrpc": "2.0", "id": call["id"], **answer(call)} for call in reversed(calls)])
+
+    app = web.Application()
+    app.router.add_post("/", handle)
+    return app
+
+
+def run_with_reader(test: Callable[[EvmRpcAccountReader], Awaitable[Any]], requests: List[List[Dict]],
+                    batch_size: int = 3) -> Any:
+    async def run() -> Any:
+        async with TestServer(create_app(requests)) as server, aiohttp.ClientSession() as session:
+            reader = EvmRpcAccountReader(session=session, url=str(server.make_url("/")),
+                                         usdt_contract=USDT_CONTRACT, batch_size=batch_size,
+                                         logs_block_range=200)
+            return await test(reader)
+
+    return asyncio.run(run())
+
+
+def test_balances_are_matched_by_id_across_batches():
+    requests = []
+    accounts = run_with_reader(lambda reader: reader.get_accounts_data(ADDRESSES + ADDRESSES[:1]), requests)
+    assert sorted(len(calls) for calls in requests) == [1, 3, 3, 3]
+    assert set(accounts) == set(ADDRESSES) - {FAILED_ADDRESS}
+    assert accounts[ADDRESSES[0]].native_balance == 0 and accounts[ADDRESSES[0]].token_balance == 0
+    assert accounts[ADDRESSES[4]].native_balance == 4 * 10 ** 18
+    assert accounts[ADDRESSES[4]].token_balance == 4 * 10 ** 6
+
+
+def test_call_batch_returns_errors_in_place():
+    results = run_with_reader(lambda reader: reader.call_batch([("eth_blockNumber", []),
+                                                                ("eth_unknown", []),
+                                                                ("eth_blockNumber", [])]), [])
+    assert results[0] == results[2] == hex(1000)
+    assert isinstance(results[1], RpcError) and results[1].code == -32601
+
+
+def test_call_raises_rpc_error():
+    with pytest.raises(RpcError):
+        run_with_reader(lambda reader: reader.call("eth_unknown", []), [])
+
+
+def test_token_transfers_split_refused_log_ranges():
+    transfers = run_with_reader(lambda reader: reader.get_token_transfers(ADDRESSES[0], 1, 400), [])
+    assert [transfer.block_number for transfer in transfers] == [40, 80, 120, 160, 200, 240, 280, 320, 360, 400]
+    assert transfers[0].from_address == ADDRESSES[0] and transfers[0].to_address == ADDRESSES[1]
+    assert transfers[1].from_address == ADDRESSES[1] and transfers[1].to_address == ADDRESSES[0]
+    assert transfers[0].amount == 40 * 10 ** 6
+    assert transfers[0].timestamp == datetime.datetime.fromtimestamp(1700000040, datetime.timezone.utc)
@@ -0,0 +1,108 @@
+import asyncio
+import json
+from typing import Any, List
+
+import pytest
+
+from tgbot.wallet_readers.json_stream import JsonObjectStream, map_json_records
+
+DOCUMENT = {
+    "status": "1",
+    "message": "OK \"quoted\" \\ back\\slash",
+    "result": [
+        {"hash": "0x01", "value": "12", "nested": {"list": [1, [2, {"x": "]}"}]], "empty": {}}},
+        {"hash": "0x02", "value": "0", "text": "ü € 😀 \u0001 \n"},
+        {"hash": "0x03", "value": "1234567890123456789012345678901234567890", "number": -1.5e10},
+        "plain string item",
+        12345678901234567890,
+        None,
+        True,
+    ],
+    "meta": {"fingerprint": "abc", "links": []},
+    "count": 7,
+}
+
+
+class ChunkedContent:
+    """
+    aiohttp.StreamReader replacement returning the body by chunks of fixed size.
+    """
+
+    def __init__(self, body: bytes, size: int) -> None:
+        self.__chunks = [body[i:i + size] for i in range(0, len(body), size)]
+        self.reads = 0
+
+    async def read(self, n: int = -1) -> bytes:
+        self.reads += 1
+        return self.__chunks.pop(0) if self.__chunks else b""
+
+    @property
+    def is_exhausted(self) -> bool:
+        return not self.__chunks
+
+
+def read(document: Any, array_key: str, size: int, indent: int | None = None, process=lambda item: item):
+    content = ChunkedContent(json.dumps(document, indent=indent, ensure_ascii=False).encode(), size)
+    return asyncio.run(JsonObjectStream(content, array_key, chunk_size=size).read(process))
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 1 << 16])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_stream_matches_decoded_document(size, indent):
+    records = read(DOCUMENT, "result", size, indent)
+    assert records == map_json_records(DOCUMENT, "result", lambda item: item)
+
+
+def test_process_drops_none_results_but_counts_items():
+    records = read(DOCUMENT, "result", 5, process=lambda item: item["hash"] if isinstance(item, dict) else None)
+    assert records.records == ["0x01", "0x02", "0x03"]
+    assert records.count == 7
+    assert records.last_item is True
+    assert records.fields == {key: value for key, value in DOCUMENT.items() if key != "result"}
+
+
+@pytest.mark.parametrize("document", [{}, {"result": []}, {"result": "Max rate limit reached"}, {"other": [1]}])
+def test_missing_or_empty_array(document):
+    assert read(document, "result", 3) == map_json_records(document, "result", lambda item: item)
+
+
+@pytest.mark.parametrize("body", [b'{"result": [1, 2', b'{"result": [{"a": "b}]}', b'["not an object"]',
+                                  b'{"result" 1}'])
+def test_malformed_body_raises(body):
+    with pytest.raises(ValueError):
+        asyncio.run(JsonObjectStream(ChunkedContent(body, 4), "result").read(lambda item: item))
+
+
+def test_values_are_decoded_by_the_given_loads_once():
+    decoded: List[str] = []
+
+    def loads(text: str) -> Any:
+        decoded.append(text)
+        return json.loads(text)
+
+    item = {"payload": "x" * 1000, "items": list(range(100))}
+    body = json.dumps({"result": [item, item]}).encode()
+    stream = JsonObjectStream(ChunkedContent(body, 16), "result", loads=loads, chunk_size=16)
+    records = asyncio.run(stream.read(lambda value: value))
+    assert records.records == [item, item]
+    # the key and every item are decoded once from their complete text
+    assert decoded == ['"result"', json.dumps(item), json.dumps(item)]
+
+
+def test_records_are_yielded_before_the_body_is_read():
+    items = [{"n": i, "padding": "x" * 100} for i in range(50)]
+    content = ChunkedContent(json.dumps({"status": "1", "result": items, "tail": 1}).encode(), 256)
+    stream = JsonObjectStream(content, "result", chunk_size=256)
+
+    async def run():
+        assert await stream.open_array()
+        assert stream.fields == {"status": "1"}
+        records = stream.records(lambda item: item["n"])
+        first = await records.__anext__()
+        assert not content.is_exhausted
+        rest = [record async for record in records]
+        return [first, *rest]
+
+    assert asyncio.run(run()) == list(range(50))
+    assert stream.fields == {"status": "1", "tail": 1}
+    assert content.is_exhausted
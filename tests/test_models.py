@@ -0,0 +1,63 @@
+import asyncio
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from tgbot.models.addressbook import AddressBook, AddressBookEntry, Account
+from tgbot.models.db_commands import compose_address_book_entries, get_address_book_entry_from_db, \
+    get_address_book_page, count_address_book_entries
+
+SUPERGROUP_ID = -1001234567890
+
+
+def test_chat_ids_are_64_bit_on_postgresql():
+    for table, column in ((AddressBook, "id"), (AddressBookEntry, "address_book_id")):
+        ddl = str(CreateTable(table.__table__).compile(dialect=postgresql.dialect()))
+        assert f"\t{column} BIGINT NOT NULL" in ddl
+        assert "SERIAL" not in ddl
+
+
+def test_supergroup_address_book_round_trip(create_session):
+    address = "0x" + "1" * 40
+
+    async def run():
+        session = await create_session()
+        await compose_address_book_entries(session=session,
+                                           address_book_id=SUPERGROUP_ID,
+                                           address_book_title="group",
+                                           accounts=[Account(address, "ERC20", 10 ** 18, 0)])
+        return await get_address_book_entry_from_db(session=session,
+                                                    address_book_id=SUPERGROUP_ID,
+                                                    account_address=address,
+                                                    account_type_id="ERC20")
+
+    entry = asyncio.run(run())
+    assert entry.address_book_id == SUPERGROUP_ID
+    assert entry.account.native_balance == 10 ** 18
+
+
+def test_address_book_keyset_pages(create_session):
+    accounts = [Account("0x" + f"{number:040x}", ("ERC20", "BEP20")[number % 2], number, 0) for number in range(24)]
+    # equal aliases make the address and the account type decide the order
+    aliases = {(account.address, account.account_type_id): f"alias {account.native_balance % 3}"
+               for account in accounts}
+
+    async def run():
+        session = await create_session()
+        await compose_address_book_entries(session=session, address_book_id=SUPERGROUP_ID,
+                                           address_book_title="group", accounts=accounts, aliases=aliases)
+        await compose_address_book_entries(session=session, address_book_id=1, address_book_title="other",
+                                           accounts=accounts[:3])
+        pages, after = [], None
+        while page := await get_address_book_page(session=session, address_book_id=SUPERGROUP_ID,
+                                                   limit=5, after=after):
+            pages.append(page)
+            after = page[-1][:3]
+        return pages, await count_address_book_entries(session=session, address_book_id=SUPERGROUP_ID)
+
+    pages, count = asyncio.run(run())
+    rows = [row for page in pages for row in page]
+    assert [len(page) for page in pages] == [5, 5, 5, 5, 4]
+    assert count == len(accounts)
+    assert [tuple(row[:3]) for row in rows] == sorted((aliases[key], *key) for key in aliases)
+    assert all(row.native_balance == int(row.account_address, 16) and row.native_unit == 10 ** 18 for row in rows)
@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+import pytest
+
+from tgbot.wallet_readers.rate_limiter import TokenBucket, ApiKeyPool
+
+
+def test_token_bucket_starts_full_and_refills():
+    bucket = TokenBucket(rate=2)
+    now = time.monotonic()
+    assert bucket.try_consume(now) == 0
+    assert bucket.try_consume(now) == 0
+    assert bucket.try_consume(now) == pytest.approx(0.5)
+    assert bucket.try_consume(now + 0.25) == pytest.approx(0.25)
+    assert bucket.try_consume(now + 0.5) == 0
+
+
+def test_token_bucket_refill_is_capped_by_capacity():
+    bucket = TokenBucket(rate=2, capacity=3)
+    now = time.monotonic()
+    assert bucket.available(now + 100) == pytest.approx(3)
+
+
+def test_token_bucket_penalty_blocks_for_retry_after():
+    bucket = TokenBucket(rate=2)
+    now = time.monotonic()
+    bucket.penalize(3, now)
+    assert bucket.try_consume(now) == pytest.approx(3.5)
+    assert bucket.try_consume(now + 3) == pytest.approx(0.5)
+    assert bucket.try_consume(now + 3.5) == 0
+
+
+def test_key_pool_spreads_requests_over_keys():
+    async def acquire_all():
+        pool = ApiKeyPool(["a", "b"], rate=100)
+        return [await pool.acquire() for _ in range(10)]
+
+    keys = asyncio.run(acquire_all())
+    assert keys.count("a") == keys.count("b") == 5
+
+
+def test_key_pool_skips_penalized_key():
+    async def acquire_all():
+        pool = ApiKeyPool(["a", "b"], rate=100)
+        pool.penalize("a", 10)
+        pool.penalize("unknown", 10)
+        return [await pool.acquire() for _ in range(50)]
+
+    assert set(asyncio.run(acquire_all())) == {"b"}
+
+
+def test_key_pool_requires_keys():
+    with pytest.raises(ValueError):
+        ApiKeyPool([], rate=1)
@@ -0,0 +1,45 @@
+import asyncio
+from types import SimpleNamespace
+
+from tgbot.models.watchlist import watchlist
+from tgbot.services.scheduler import BalancePoller
+
+CONFIG = SimpleNamespace(poller_tick=60, poller_chain_concurrency=4, poller_watched_interval=60)
+
+
+class RecordingPoller(BalancePoller):
+    """
+    Poller which records the due accounts instead of reading them from the network.
+    """
+    def __init__(self, **kwargs) -> None:
+        super().__init__(bot=None, db_session=None, account_readers=None, config=CONFIG, **kwargs)
+        self.polled = []
+
+    async def _prefetch(self, keys):
+        self.polled.append(sorted(keys))
+        return {}
+
+    async def _fetch(self, key, net_account=None):
+        return None
+
+    async def _store(self, syncs):
+        return [None] * len(syncs)
+
+
+def entry(address: str, account_type_id: str, schedule: int) -> SimpleNamespace:
+    return SimpleNamespace(address_book_id=1, account_address=address, account_type_id=account_type_id,
+                           account_alias=address, track_native=True, native_threshold=0, track_token=True,
+                           token_threshold=0, schedule=schedule)
+
+
+def test_watched_chains_are_polled_slowly():
+    watchlist.load([entry("0x1", "ERC20", 5), entry("T1", "TRC20", 5)])
+    poller = RecordingPoller(watched_account_types=["ERC20"])
+
+    async def run():
+        return [await poller.poll_once(now=minute * 60) for minute in range(1, 122)]
+
+    counts = asyncio.run(run())
+    watched = [keys for keys in poller.polled if ("0x1", "ERC20") in keys]
+    assert len(watched) == 3
+    assert sum(counts) == len(range(1, 122, 5)) + len(watched)
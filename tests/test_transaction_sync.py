@@ -0,0 +1,219 @@
+import asyncio
+import datetime
+from functools import partial
+from typing import Any, Dict, List, Callable, Awaitable, Optional
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from tgbot.wallet_readers.account_readers import EthereumAccountReader, TronAccountReader, APISyncCursor, \
+    APIAccountTransaction, ETHERSCAN_PAGE_SIZE, ETHERSCAN_MAX_RESULT_WINDOW, TRON_PAGE_LIMIT, SYNC_MAX_PAGES
+from tgbot.wallet_readers.rate_limiter import ApiKeyPool
+
+ADDRESS = "0x" + "a" * 40
+TRON_ADDRESS = "TXYZ"
+TIMESTAMP = 1700000000
+
+
+def etherscan_transaction(block: int, index: int) -> Dict[str, str]:
+    return {"hash": f"0x{block:x}{index:04x}", "blockNumber": str(block), "timeStamp": str(TIMESTAMP + block),
+            "from": ADDRESS, "to": "0x" + f"{index:040x}", "value": str(index + 1)}
+
+
+def etherscan_app(transactions: List[Dict[str, str]], requests: List[Dict[str, str]]) -> web.Application:
+    """
+    txlist of Etherscan: block range, order and page * offset pagination up to the result window.
+    """
+    async def handle(request: web.Request) -> web.Response:
+        query = dict(request.query)
+        requests.append(query)
+        start_block, end_block = int(query["startblock"]), int(query["endblock"])
+        page, offset = int(query["page"]), int(query["offset"])
+        if page * offset > ETHERSCAN_MAX_RESULT_WINDOW:
+            return web.json_response({"status": "0", "message": "NOTOK",
+                                      "result": "Result window is too large, PageNo x Offset size must be less than "
+                                                "or equal to 10000"})
+        selected = [trn for trn in transactions if start_block <= int(trn["blockNumber"]) <= end_block]
+        if query["sort"] == "desc":
+            selected.reverse()
+        selected = selected[(page - 1) * offset:page * offset]
+        if not selected:
+            return web.json_response({"status": "0", "message": "No transactions found", "result": []})
+        return web.json_response({"status": "1", "message": "OK", "result": selected})
+
+    app = web.Application()
+    app.router.add_get("/api", handle)
+    return app
+
+
+async def walk_history(reader: EthereumAccountReader, cursor: Optional[str] = None) -> List[APIAccountTransaction]:
+    transactions = []
+    while True:
+        page = await reader.get_history_page(ADDRESS, "native", cursor)
+        transactions.extend(page.transactions)
+        if not (cursor := page.next_cursor):
+            return transactions
+
+
+def tron_transaction(i: int) -> Dict[str, Any]:
+    return {"transaction_id": f"{i:064x}", "block_timestamp": (TIMESTAMP + i) * 1000,
+            "from": TRON_ADDRESS, "to": f"T{i:033d}", "value": str(i + 1)}
+
+
+def tron_app(transactions: List[Dict[str, Any]], requests: List[Dict[str, str]]) -> web.Application:
+    """
+    trc20 transactions of TronGrid: ascending order from min_timestamp, fingerprint of the next page in meta.
+    """
+    async def handle(request: web.Request) -> web.Response:
+        query = dict(request.query)
+        requests.append(query)
+        selected = [trn for trn in transactions if trn["block_timestamp"] >= int(query.get("min_timestamp", 0))]
+        start = int(query.get("fingerprint", 0))
+        limit = int(query["limit"])
+        meta = {"page_size": len(selected[start:start + limit])}
+        if start + limit < len(selected):
+            meta["fingerprint"] = str(start + limit)
+        return web.json_response({"success": True, "data": selected[start:start + limit], "meta": meta})
+
+    app = web.Application()
+    app.router.add_get(f"/{TRON_ADDRESS}/transactions/trc20", handle)
+    return app
+
+
+def run_with_reader(app: web.Application, create_reader: Callable[[aiohttp.ClientSession, str], Any],
+                    test: Callable[[Any], Awaitable[Any]]) -> Any:
+    async def run() -> Any:
+        async with TestServer(app) as server, aiohttp.ClientSession() as session:
+            return await test(create_reader(session, str(server.make_url("/"))))
+
+    return asyncio.run(run())
+
+
+def ethereum_reader(session: aiohttp.ClientSession, url: str, stream: bool = False) -> EthereumAccountReader:
+    return EthereumAccountReader(session=session, api_keys=["test"], url=url + "api", stream=stream,
+                                 key_pool=ApiKeyPool(["test"], rate=1000))
+
+
+def tron_reader(session: aiohttp.ClientSession, url: str) -> TronAccountReader:
+    return TronAccountReader(session=session, api_keys=["test"], url=url,
+                             key_pool=ApiKeyPool(["test"], rate=1000))
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_etherscan_first_sync_points_cursor_to_newest_transaction(stream):
+    transactions = [etherscan_transaction(block, 0) for block in range(1, 301)]
+    sync = run_with_reader(etherscan_app(transactions, []), partial(ethereum_reader, stream=stream),
+                           lambda reader: reader.sync_native_transactions(ADDRESS))
+    assert len(sync.transactions) == ETHERSCAN_PAGE_SIZE
+    assert [trn.block_number for trn in sync.transactions] == list(range(300, 200, -1))
+    assert sync.cursor.block_number == 300
+    assert sync.cursor.timestamp == datetime.datetime.fromtimestamp(TIMESTAMP + 300, datetime.timezone.utc)
+
+
+def test_etherscan_streamed_transactions_are_consumed_lazily():
+    transactions = [etherscan_transaction(block, 0) for block in range(1, 301)]
+
+    async def read(reader: EthereumAccountReader):
+        records = await reader.get_native_transactions(ADDRESS)
+        first = await records.__anext__()
+        await records.aclose()
+        return first
+
+    first = run_with_reader(etherscan_app(transactions, []), partial(ethereum_reader, stream=True), read)
+    assert first.block_number == 300
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_etherscan_answer_without_transactions_is_not_a_page(stream):
+    transactions = run_with_reader(etherscan_app([], []), partial(ethereum_reader, stream=stream),
+                                   lambda reader: reader.get_native_transactions(ADDRESS))
+    assert transactions is None
+
+
+def test_etherscan_sync_pages_within_a_busy_block():
+    transactions = ([etherscan_transaction(150, index) for index in range(250)] +
+                    [etherscan_transaction(block, 0) for block in range(151, 181)])
+    requests = []
+    sync = run_with_reader(etherscan_app(transactions, requests), ethereum_reader,
+                           lambda reader: reader.sync_native_transactions(ADDRESS, APISyncCursor(block_number=150)))
+    assert len(sync.transactions) == 280
+    assert sync.cursor.block_number == 180
+    assert [(query["startblock"], query["page"]) for query in requests] == [("150", "1"), ("150", "2"), ("150", "3")]
+
+
+def test_etherscan_sync_continues_from_cursor_when_pages_run_out():
+    transactions = [etherscan_transaction(block, 0) for block in range(1, 1501)]
+    app = etherscan_app(transactions, [])
+
+    async def sync_twice(reader: EthereumAccountReader):
+        first = await reader.sync_native_transactions(ADDRESS, APISyncCursor(block_number=1))
+        return first, await reader.sync_native_transactions(ADDRESS, first.cursor)
+
+    first, second = run_with_reader(app, ethereum_reader, sync_twice)
+    assert len(first.transactions) == SYNC_MAX_PAGES * ETHERSCAN_PAGE_SIZE
+    last_block = first.transactions[-1].block_number
+    assert first.cursor.block_number == last_block
+    # the cursor block is read again, its duplicates are dropped by the database
+    assert second.transactions[0].block_number == last_block
+    assert second.transactions[-1].block_number == 1500
+    assert {trn.block_number for trn in first.transactions + second.transactions} == set(range(1, 1501))
+
+
+def test_etherscan_history_pages_through_busy_blocks():
+    transactions = ([etherscan_transaction(block, 0) for block in range(511, 500, -1)] +
+                    [etherscan_transaction(500, index) for index in range(2500)] +
+                    [etherscan_transaction(block, index) for block in range(499, 299, -1) for index in range(10)])
+    transactions.reverse()
+    requests = []
+    history = run_with_reader(etherscan_app(transactions, requests), ethereum_reader, walk_history)
+    assert len(history) == len(transactions)
+    assert len({(trn.block_number, trn.to_address) for trn in history}) == len(transactions)
+    assert [trn.block_number for trn in history] == sorted((trn.block_number for trn in history), reverse=True)
+    assert [(query["endblock"], query["page"]) for query in requests][:5] == [
+        ("99999999", "1"), ("500", "1"), ("500", "2"), ("500", "3"), ("450", "1")]
+
+
+def test_etherscan_history_resumes_from_a_block_cursor():
+    transactions = [etherscan_transaction(block, 0) for block in range(1, 1501)]
+    history = run_with_reader(etherscan_app(transactions, []), ethereum_reader,
+                              lambda reader: walk_history(reader, "1000"))
+    assert [trn.block_number for trn in history] == list(range(1000, 0, -1))
+
+
+def test_etherscan_history_skips_the_rest_of_a_block_over_the_result_window():
+    transactions = ([etherscan_transaction(100, index) for index in range(ETHERSCAN_MAX_RESULT_WINDOW + 5)] +
+                    [etherscan_transaction(99, 0)])
+    transactions.reverse()
+    history = run_with_reader(etherscan_app(transactions, []), ethereum_reader, walk_history)
+    assert len(history) == ETHERSCAN_MAX_RESULT_WINDOW + 1
+    assert history[-1].block_number == 99
+
+
+def test_tron_sync_follows_fingerprints_and_moves_the_timestamp():
+    transactions = [tron_transaction(i) for i in range(450)]
+    requests = []
+    cursor = APISyncCursor(timestamp=datetime.datetime.fromtimestamp(TIMESTAMP, datetime.timezone.utc))
+    sync = run_with_reader(tron_app(transactions, requests), tron_reader,
+                           lambda reader: reader.sync_token_transactions(TRON_ADDRESS, cursor))
+    assert len(sync.transactions) == 450
+    assert [query.get("fingerprint") for query in requests] == [None, str(TRON_PAGE_LIMIT), str(2 * TRON_PAGE_LIMIT)]
+    assert sync.cursor == APISyncCursor(timestamp=datetime.datetime.fromtimestamp(TIMESTAMP + 449,
+                                                                                  datetime.timezone.utc))
+
+
+def test_tron_sync_keeps_the_pending_fingerprint_when_pages_run_out():
+    transactions = [tron_transaction(i) for i in range((SYNC_MAX_PAGES + 1) * TRON_PAGE_LIMIT)]
+    cursor = APISyncCursor(timestamp=datetime.datetime.fromtimestamp(TIMESTAMP, datetime.timezone.utc))
+    app = tron_app(transactions, [])
+
+    async def sync_twice(reader: TronAccountReader):
+        first = await reader.sync_token_transactions(TRON_ADDRESS, cursor)
+        return first, await reader.sync_token_transactions(TRON_ADDRESS, first.cursor)
+
+    first, second = run_with_reader(app, tron_reader, sync_twice)
+    assert len(first.transactions) == SYNC_MAX_PAGES * TRON_PAGE_LIMIT
+    assert first.cursor == APISyncCursor(timestamp=cursor.timestamp, fingerprint=str(SYNC_MAX_PAGES * TRON_PAGE_LIMIT))
+    assert len(second.transactions) == TRON_PAGE_LIMIT
+    assert second.cursor.fingerprint is None
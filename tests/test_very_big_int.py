@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select, func, insert, text
+
+from tgbot.models.addressbook import Account
+from tgbot.models.base import encode_very_big_int, decode_very_big_int, create_db_session, SQLITE_BLOB_VERSION
+
+VALUES = [-2 ** 255, -10 ** 30, -1, 0, 1, 255, 256, 10 ** 18, 2 ** 64 + 1, 2 ** 255 - 1]
+
+
+def address(number: int) -> str:
+    return "0x" + f"{number:040x}"
+
+
+@pytest.mark.parametrize("value", VALUES)
+def test_codec_round_trip(value):
+    encoded = encode_very_big_int(value)
+    assert len(encoded) == 32
+    assert decode_very_big_int(encoded) == value
+
+
+def test_legacy_values_are_decoded():
+    assert decode_very_big_int(10 ** 20) == 10 ** 20
+    assert decode_very_big_int("ff") == 255
+
+
+def test_blob_order_is_value_order():
+    assert sorted(VALUES, key=encode_very_big_int) == sorted(VALUES)
+
+
+def test_database_order_and_sum(create_session):
+    balances = [10 ** 30, -5, 0, 2 ** 200, -10 ** 25, 7]
+
+    async def run():
+        session = await create_session()
+        async with session() as db_session:
+            db_session.add_all(Account(address(number), "ERC20", 0, balance) for number, balance in enumerate(balances))
+            await db_session.commit()
+            ordered = (await db_session.scalars(select(Account.token_balance)
+                                                .order_by(Account.token_balance))).all()
+            positive = (await db_session.scalars(select(Account.token_balance)
+                                                 .where(Account.token_balance > 0))).all()
+            total = await db_session.scalar(select(func.sum(Account.token_balance)))
+            empty_total = await db_session.scalar(select(func.sum(Account.token_balance))
+                                                  .where(Account.token_balance > 2 ** 254))
+            length_total = await db_session.scalar(select(func.sum(func.length(Account.address))))
+        return ordered, positive, total, empty_total, length_total
+
+    ordered, positive, total, empty_total, length_total = asyncio.run(run())
+    assert ordered == sorted(balances)
+    assert sorted(positive) == sorted(balance for balance in balances if balance > 0)
+    assert total == sum(balances)
+    assert empty_total is None
+    assert length_total == 42 * len(balances)
+
+
+def test_legacy_values_are_migrated_once(create_session, tmp_path):
+    async def run():
+        session = await create_session()
+        async with session() as db_session:
+            await db_session.execute(text("PRAGMA user_version=0"))
+            await db_session.execute(insert(Account), [dict(address=address(1), account_type_id="ERC20")])
+            await db_session.execute(text("UPDATE account SET native_balance = 1000000000000000000000, "
+                                          "token_balance = 'ff'"))
+            await db_session.commit()
+        session = await create_db_session("sqlite+aiosqlite", str(tmp_path / "test.db"), "", "", "", False)
+        async with session() as db_session:
+            migrated = (await db_session.execute(select(Account.native_balance, Account.token_balance))).one()
+            version = await db_session.scalar(text("PRAGMA user_version"))
+            # a value written after the migration is not looked at again on the next startup
+            await db_session.execute(text("UPDATE account SET token_balance = 7"))
+            await db_session.commit()
+        session = await create_db_session("sqlite+aiosqlite", str(tmp_path / "test.db"), "", "", "", False)
+        async with session() as db_session:
+            kind = await db_session.scalar(text("SELECT typeof(token_balance) FROM account"))
+        return tuple(migrated), version, kind
+
+    migrated, version, kind = asyncio.run(run())
+    assert migrated == (10 ** 21, 255)
+    assert version == SQLITE_BLOB_VERSION
+    assert kind == "integer"
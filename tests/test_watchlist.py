@@ -0,0 +1,86 @@
+import asyncio
+from types import SimpleNamespace
+
+from tgbot.models.addressbook import Account
+from tgbot.models.db_commands import compose_address_book_entries, update_address_book_entry, delete_entry, \
+    update_address_book, update_address_book_id, get_tracked_address_book_entries, load_watchlist
+from tgbot.models.watchlist import WatchlistIndex, watchlist
+
+ADDRESSES = ["0x" + f"{number:040x}" for number in range(1, 5)]
+
+
+def entry(address_book_id: int, address: str, track_native: bool = True, schedule: int = 5) -> SimpleNamespace:
+    return SimpleNamespace(address_book_id=address_book_id, account_address=address, account_type_id="ERC20",
+                           account_alias=f"{address_book_id} {address}", track_native=track_native,
+                           native_threshold=0, track_token=False, token_threshold=0, schedule=schedule)
+
+
+def keys(subscriptions) -> set:
+    return {(subscription.address_book_id, subscription.account_address, subscription.account_type_id,
+             subscription.track_native, subscription.schedule) for subscription in subscriptions}
+
+
+def test_put_replaces_and_remove_drops():
+    index = WatchlistIndex()
+    index.load([entry(1, ADDRESSES[0]), entry(2, ADDRESSES[0]), entry(1, ADDRESSES[1])])
+    index.put(entry(1, ADDRESSES[0], schedule=15))
+    assert len(index) == 3
+    assert [subscription.schedule for subscription in index.subscribers(ADDRESSES[0], "ERC20")] == [5, 15]
+
+    index.remove(2, ADDRESSES[0], "ERC20")
+    index.remove(1, ADDRESSES[1], "ERC20")
+    index.remove(1, ADDRESSES[1], "BEP20")
+    assert len(index) == 1
+    assert list(index.addresses("ERC20")) == [ADDRESSES[0]]
+    assert index.subscribers(ADDRESSES[1], "ERC20") == ()
+
+
+def test_inactive_address_books_and_untracked_entries_are_hidden():
+    index = WatchlistIndex()
+    index.load([entry(1, ADDRESSES[0]), entry(2, ADDRESSES[0]), entry(3, ADDRESSES[0], track_native=False)],
+               inactive_address_books=[2])
+    assert [subscription.address_book_id for subscription in index.subscribers(ADDRESSES[0], "ERC20")] == [1, 3]
+    assert [subscription.address_book_id for subscription in index.tracked()] == [1]
+
+    index.set_address_book_active(2, True)
+    assert [subscription.address_book_id for subscription in index.tracked()] == [1, 2]
+
+
+def test_moved_address_book_keeps_taken_subscriptions():
+    index = WatchlistIndex()
+    index.load([entry(1, ADDRESSES[0]), entry(2, ADDRESSES[0])], inactive_address_books=[1])
+    index.set_address_book_active(1, True)
+    taken = index.subscribers(ADDRESSES[0], "ERC20")
+    index.set_address_book_active(1, False)
+    index.move_address_book(1, 10)
+
+    assert [subscription.address_book_id for subscription in taken] == [1, 2]
+    assert [subscription.address_book_id for subscription in index.subscribers(ADDRESSES[0], "ERC20")] == [2]
+    index.set_address_book_active(10, True)
+    assert [subscription.address_book_id for subscription in index.subscribers(ADDRESSES[0], "ERC20")] == [10, 2]
+    assert taken[1] is index.subscribers(ADDRESSES[0], "ERC20")[1]
+
+
+def test_index_follows_database_writes(create_session):
+    accounts = [Account(address, "ERC20", 0, 0) for address in ADDRESSES]
+
+    async def run():
+        session = await create_session()
+        for address_book_id in (1, 2):
+            await compose_address_book_entries(session=session, address_book_id=address_book_id,
+                                               address_book_title=str(address_book_id), accounts=accounts)
+        await update_address_book_entry(session, 1, ADDRESSES[0], "ERC20", dict(track_native=True, schedule=15))
+        await update_address_book_entry(session, 2, ADDRESSES[1], "ERC20", dict(track_token=True))
+        await delete_entry(session, 1, ADDRESSES[1], "ERC20")
+        await update_address_book_entry(session, 2, ADDRESSES[2], "ERC20", dict(track_native=True))
+        await update_address_book(session, 2, dict(is_active=False))
+        await update_address_book_entry(session, 1, ADDRESSES[3], "ERC20", dict(track_token=True))
+        await update_address_book_id(session, 1, 3)
+        incremental = keys(watchlist.tracked())
+        expected = keys(await get_tracked_address_book_entries(session))
+        await load_watchlist(session)
+        return incremental, expected, keys(watchlist.tracked())
+
+    incremental, expected, reloaded = asyncio.run(run())
+    assert incremental == expected == reloaded
+    assert {key[:2] for key in expected} == {(3, ADDRESSES[0]), (3, ADDRESSES[3])}
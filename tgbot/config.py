@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, Optional
 
 from pydantic import BaseSettings, SecretStr, RedisDsn
 
@@ -11,6 +11,22 @@ class Settings(BaseSettings):
     tron_api_keys: list[str]
     bsc_scan_api_keys: list[str]
     etherscan_api_keys: list[str]
+    tron_api_rps: float = 10.0
+    bsc_scan_api_rps: float = 5.0
+    etherscan_api_rps: float = 5.0
+    eth_rpc_url: Optional[str] = None
+    bsc_rpc_url: Optional[str] = None
+    rpc_rps: float = 25.0
+    rpc_batch_size: int = 200
+    rpc_logs_block_range: int = 5000
+    stream_json: bool = False
+    json_backend: str = "json"
+    response_cache_size: int = 1024
+    cache_balance_ttl: float = 15.0
+    cache_transactions_ttl: float = 120.0
+    refresh_freshness: float = 5.0
+    entry_background_refresh: bool = True
+    entry_refresh_interval: float = 30.0
 
     redis_dsn: RedisDsn
 
@@ -21,6 +37,38 @@ class Settings(BaseSettings):
     db_host: str
     db_name: str
     db_echo: bool
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+
+    sqlite_busy_timeout: int = 5000
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_temp_store: str = "MEMORY"
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    sqlite_cache_size: int = -64 * 1024
+
+    poller_tick: int = 60
+    poller_chain_concurrency: int = 4
+    poller_watched_interval: int = 60
+    block_watcher: bool = False
+    watcher_tick: float = 15.0
+    watcher_max_blocks: int = 100
+    watcher_confirmations: int = 2
+    backfill_concurrency: int = 4
+    delivery_rate: float = 30.0
+    delivery_workers: int = 8
+    delivery_chat_interval: float = 1.0
+    delivery_group_interval: float = 3.0
+
+    @property
+    def sqlite_pragmas(self) -> dict[str, Any]:
+        return {"busy_timeout": self.sqlite_busy_timeout,
+                "journal_mode": self.sqlite_journal_mode,
+                "synchronous": self.sqlite_synchronous,
+                "temp_store": self.sqlite_temp_store,
+                "mmap_size": self.sqlite_mmap_size,
+                "cache_size": self.sqlite_cache_size}
 
     class Config:
         @classmethod
@@ -1,3 +1,4 @@
+from aiogram.enums import ContentType
 from aiogram_dialog import Dialog
 
 from ..main_menu import windows, events, states, getters
@@ -9,10 +10,13 @@ def main_menu_dialogs():
             windows.main_menu_window(),
             windows.address_book_entry_window(),
             windows.enter_value_window(text="Dialog started by {started_by}\n"
-                                            "👇 Enter account address 👇",
+                                            "👇 Enter account address 👇\n"
+                                            "or a list of addresses (one \"address,alias\" per line), "
+                                            "or send a CSV/TXT file with it",
                                        handler=events.account_address_handler,
                                        state=states.MainMenuStates.enter_account_address,
-                                       getter=getters.get_started_by),
+                                       getter=getters.get_started_by,
+                                       content_types=(ContentType.TEXT, ContentType.DOCUMENT)),
             windows.enter_value_window(text="Dialog started by {started_by}\n"
                                             "👇 Enter account alias (Short human readable name) 👇",
                                        handler=events.account_alias_handler,
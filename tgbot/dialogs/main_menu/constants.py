@@ -4,7 +4,7 @@ from enum import Enum
 class MainMenu(str, Enum):
     NEW_ACCOUNT = "mm01"
     ADDRESS_BOOK = "mm02"
-    ADDRESS_BOOK_SCROLLING_GROUP = "mm03"
+    ADDRESS_BOOK_PAGE = "mm03"
     ENTER_ACCOUNT_ADDRESS = "mm04"
     SHOW_TOKEN_TRNS_BUTTON = "mm05"
     SHOW_NATIVE_TRNS_BUTTON = "mm06"
@@ -18,6 +18,8 @@ class MainMenu(str, Enum):
     TOKEN_OPTIONS = "mm14"
     SET_SCHEDULE_PERIOD_BUTTON = "mm15"
     DELETE_ENTRY_BUTTON = "mm16"
+    ADDRESS_BOOK_PREV_PAGE = "mm17"
+    ADDRESS_BOOK_NEXT_PAGE = "mm18"
 
     def __str__(self) -> str:
         return str.__str__(self)
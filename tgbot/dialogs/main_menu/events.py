@@ -1,29 +1,33 @@
 import logging
+import time
 
 from aiogram.types import Message
 from aiogram_dialog import DialogManager, ChatEvent
 from aiogram_dialog.widgets.common import ManagedWidget
 from aiogram_dialog.widgets.input import MessageInput
 from aiogram_dialog.widgets.kbd import Checkbox, Counter
+from sqlalchemy.exc import SQLAlchemyError
 
 from . import states, constants
-from ...models.db_commands import check_address_book_entry, ensure_persist_at_db, update_address_book_entry, \
-    update_address_book
+from ...models.db_commands import check_address_book_entry, ensure_persist_at_db, edit_address_book_entry
+from ...utils.address_import import import_address_list, IMPORT_MAX_ADDRESSES
 from ...utils.decimals import check_digit_value
 from ...utils.net_accounts import ensure_account_at_net
 
 logger = logging.getLogger(__name__)
 
+IMPORT_PROGRESS_INTERVAL: float = 3.0
+IMPORT_MAX_FILE_SIZE: int = 1024 * 1024
+
 
 async def account_address_handler(message: Message, message_input: MessageInput,
                                   manager: DialogManager):
     db_session = manager.middleware_data.get("db_session")
-    http_session = manager.middleware_data.get("http_session")
-    config = manager.middleware_data.get("config")
-    api_keys = {'TRC20': config.tron_api_keys,
-                'BEP20': config.bsc_scan_api_keys,
-                'ERC20': config.etherscan_api_keys}
-    accounts = await ensure_account_at_net(http_session, message.text, api_keys)
+    account_readers = manager.middleware_data.get("account_readers")
+    if message.document or len((message.text or "").strip().splitlines()) > 1:
+        await account_list_handler(message, manager)
+        return
+    accounts = await ensure_account_at_net(account_readers, message.text)
     if not accounts:
         message_text = f"Wrong account address {message.text}"
         await message.answer(message_text)
@@ -41,14 +45,71 @@ async def account_address_handler(message: Message, message_input: MessageInput,
         if entry:
             message_text += f"{entry.account_alias} ({entry.account_address}) already in address book.\n"
             continue
-        address_book_entries = await ensure_persist_at_db(db_session, [account], message)
+        try:
+            address_book_entries = await ensure_persist_at_db(db_session, [account], message)
+        except SQLAlchemyError as e:
+            logger.error("Error while adding %s %s: %r", account.account_type_id, account.address, e)
+            message_text += f"Account {account.address} was not added, please try again later.\n"
+            continue
         if address_book_entries:
             message_text += f"Account {address_book_entries[0].account_alias} was added\n"
+        else:
+            message_text += f"Account {account.address} already in address book.\n"
 
     await message.answer(message_text)
     await manager.switch_to(states.MainMenuStates.select_ab_entry)
 
 
+async def account_list_handler(message: Message, manager: DialogManager):
+    """
+    Bulk import of a pasted address list or an uploaded CSV/TXT document, one `address[,alias]` per line.
+    Progress is reported by editing one message.
+    """
+    db_session = manager.middleware_data.get("db_session")
+    account_readers = manager.middleware_data.get("account_readers")
+    if message.document:
+        if (message.document.file_size or 0) > IMPORT_MAX_FILE_SIZE:
+            await message.answer(f"File is too large, max size is {IMPORT_MAX_FILE_SIZE // 1024} KB")
+            return
+        text = (await message.bot.download(message.document)).read().decode("utf-8-sig", errors="replace")
+    else:
+        text = message.text
+    address_book_title = message.from_user.full_name if message.chat.type == "private" else message.chat.title
+    progress_message = await message.answer("Reading addresses...")
+    last_progress = time.monotonic()
+
+    async def on_progress(done: int, total: int) -> None:
+        nonlocal last_progress
+        if done < total and time.monotonic() - last_progress < IMPORT_PROGRESS_INTERVAL:
+            return
+        last_progress = time.monotonic()
+        try:
+            await progress_message.edit_text(f"Reading addresses: {done} of {total}")
+        except Exception as e:
+            logger.warning("Import progress was not updated: %r", e)
+
+    try:
+        result = await import_address_list(db_session=db_session,
+                                           readers=account_readers,
+                                           address_book_id=message.chat.id,
+                                           address_book_title=address_book_title,
+                                           text=text,
+                                           progress=on_progress)
+    except SQLAlchemyError as e:
+        logger.error("Error while importing addresses to %s: %r", message.chat.id, e)
+        await progress_message.edit_text("Import failed, no accounts were added. Please try again later.")
+        await manager.switch_to(states.MainMenuStates.select_ab_entry)
+        return
+    message_text = (f"Accounts added: {len(result.entries)}\n"
+                    f"Already in address book: {len(result.accounts) - len(result.entries)}\n"
+                    f"Not found: {len(result.not_found)}\n"
+                    f"Invalid lines: {len(result.invalid)} (max {IMPORT_MAX_ADDRESSES} addresses per import)")
+    if result.invalid:
+        message_text += "\n" + "\n".join(line[:80] for line in result.invalid[:10])
+    await progress_message.edit_text(message_text)
+    await manager.switch_to(states.MainMenuStates.select_ab_entry)
+
+
 async def account_alias_handler(message: Message, message_input: MessageInput,
                                 manager: DialogManager):
     db_session = manager.middleware_data.get("db_session")
@@ -57,14 +118,12 @@ async def account_alias_handler(message: Message, message_input: MessageInput,
     account_address = ctx.dialog_data.get("account_address")
     account_type = ctx.dialog_data.get("account_type")
     address_book_title = message.from_user.full_name if message.chat.type == "private" else message.chat.title
-    await update_address_book_entry(session=db_session,
-                                    address_book_id=address_book_id,
-                                    account_address=account_address,
-                                    account_type_id=account_type,
-                                    values={"account_alias": message.text})
-    await update_address_book(session=db_session,
-                              address_book_id=address_book_id,
-                              values={"title": address_book_title})
+    await edit_address_book_entry(session=db_session,
+                                  address_book_id=address_book_id,
+                                  account_address=account_address,
+                                  account_type_id=account_type,
+                                  values={"account_alias": message.text},
+                                  address_book_title=address_book_title)
     await manager.switch_to(states.MainMenuStates.edit_ab_entry)
 
 
@@ -91,14 +150,12 @@ async def threshold_handler(message: Message, message_input: MessageInput,
                                                               type_factory=float,
                                                               min=0, max=999) * token_unit)
 
-    await update_address_book_entry(session=db_session,
-                                    address_book_id=address_book_id,
-                                    account_address=account_address,
-                                    account_type_id=account_type,
-                                    values=values)
-    await update_address_book(session=db_session,
-                              address_book_id=address_book_id,
-                              values={"title": address_book_title})
+    await edit_address_book_entry(session=db_session,
+                                  address_book_id=address_book_id,
+                                  account_address=account_address,
+                                  account_type_id=account_type,
+                                  values=values,
+                                  address_book_title=address_book_title)
     await manager.switch_to(states.MainMenuStates.edit_ab_entry)
 
 
@@ -112,14 +169,12 @@ async def on_track_changed(event: ChatEvent, widget: ManagedWidget[Checkbox], ma
     account_type = ctx.dialog_data.get("account_type")
     values = {"track_native": ctx.widget_data.get(constants.MainMenu.TRACK_NATIVE_TOKEN),
               "track_token": ctx.widget_data.get(constants.MainMenu.TRACK_TOKEN)}
-    await update_address_book_entry(session=db_session,
-                                    address_book_id=address_book_id,
-                                    account_address=account_address,
-                                    account_type_id=account_type,
-                                    values=values)
-    await update_address_book(session=db_session,
-                              address_book_id=address_book_id,
-                              values={"title": address_book_title})
+    await edit_address_book_entry(session=db_session,
+                                  address_book_id=address_book_id,
+                                  account_address=account_address,
+                                  account_type_id=account_type,
+                                  values=values,
+                                  address_book_title=address_book_title)
 
 
 async def schedule_period_handler(message: Message, message_input: MessageInput,
@@ -131,14 +186,12 @@ async def schedule_period_handler(message: Message, message_input: MessageInput,
     account_type = ctx.dialog_data.get("account_type")
     address_book_title = message.from_user.full_name if message.chat.type == "private" else message.chat.title
 
-    await update_address_book_entry(session=db_session,
-                                    address_book_id=address_book_id,
-                                    account_address=account_address,
-                                    account_type_id=account_type,
-                                    values={"schedule": int(check_digit_value(message.text,
-                                                                              type_factory=int,
-                                                                              min=1, max=59))})
-    await update_address_book(session=db_session,
-                              address_book_id=address_book_id,
-                              values={"title": address_book_title})
+    await edit_address_book_entry(session=db_session,
+                                  address_book_id=address_book_id,
+                                  account_address=account_address,
+                                  account_type_id=account_type,
+                                  values={"schedule": int(check_digit_value(message.text,
+                                                                            type_factory=int,
+                                                                            min=1, max=59))},
+                                  address_book_title=address_book_title)
     await manager.switch_to(states.MainMenuStates.edit_ab_entry)
@@ -1,34 +1,61 @@
 import logging
+import time
+from typing import Optional
 
 from aiogram.types import Message
 from aiogram_dialog import DialogManager
 
-from tgbot.models.db_commands import get_address_book_entries, get_address_book_entry_from_db, sync_db_account, \
-    read_account
+from tgbot.config import settings
+from tgbot.models.db_commands import get_address_book_entry_from_db, get_address_book_page, \
+    count_address_book_entries
 from tgbot.utils.decimals import value_to_decimal, format_decimal
-from tgbot.utils.net_accounts import get_tron_account_from_net, get_bep20_account_from_net, get_erc20_account_from_net, \
-    get_native_trns_from_net, get_token_trns_from_net
+from tgbot.utils.net_accounts import refresh_account, refresh_account_in_background, get_refresh_time, \
+    get_refresh_failure_time, AccountRefresh
 
 logger = logging.getLogger(__name__)
 
+ADDRESS_BOOK_PAGE_SIZE: int = 10
+
 
 async def get_address_book(dialog_manager: DialogManager, **middleware_data):
     session = middleware_data.get('db_session')
 
     started_by = dialog_manager.start_data.get("started_by") or "UNKNOWN"
+    ctx = dialog_manager.current_context()
     event = dialog_manager.event if isinstance(dialog_manager.event, Message) else dialog_manager.event.message
-    address_book_entries = await get_address_book_entries(session=session,
-                                                          address_book_id=event.chat.id)
+    page_cursors = ctx.dialog_data.get("page_cursors") or []
+    rows = await get_address_book_page(session=session,
+                                       address_book_id=event.chat.id,
+                                       limit=ADDRESS_BOOK_PAGE_SIZE + 1,
+                                       after=page_cursors[-1] if page_cursors else None)
+    if not rows and page_cursors:
+        # entries of the page were deleted, start from the first page
+        page_cursors = []
+        rows = await get_address_book_page(session=session,
+                                           address_book_id=event.chat.id,
+                                           limit=ADDRESS_BOOK_PAGE_SIZE + 1)
+    has_next_page = len(rows) > ADDRESS_BOOK_PAGE_SIZE
+    rows = rows[:ADDRESS_BOOK_PAGE_SIZE]
+    count = await count_address_book_entries(session=session, address_book_id=event.chat.id)
+    ctx.dialog_data.update(page_cursors=page_cursors,
+                           next_page_cursor=list(rows[-1][:3]) if has_next_page else None)
+
     address_book_title = event.from_user.full_name if event.chat.type == "private" else event.chat.title
-    items = [(f"{entry.account_alias} | "
-              f"{format_decimal(value_to_decimal(entry.account.token_balance / entry.account.account_type.token_unit), pre=2)} | "
-              f"{format_decimal(value_to_decimal(entry.account.native_balance / entry.account.account_type.native_unit), pre=2)}",
-              f"{entry.account_address}_{entry.account_type_id}")
-             for entry in address_book_entries if address_book_entries]
+    items = [(f"{row.account_alias} | "
+              f"{format_decimal(value_to_decimal(row.token_balance / row.token_unit), pre=2)} | "
+              f"{format_decimal(value_to_decimal(row.native_balance / row.native_unit), pre=2)}",
+              f"{row.account_address}_{row.account_type_id}")
+             for row in rows]
+    pages = (count + ADDRESS_BOOK_PAGE_SIZE - 1) // ADDRESS_BOOK_PAGE_SIZE
 
     return {"address_book_title": address_book_title,
             "started_by": started_by,
-            "items": items}
+            "items": items,
+            "page": len(page_cursors) + 1,
+            "pages": pages,
+            "has_pages": pages > 1,
+            "has_prev_page": bool(page_cursors),
+            "has_next_page": has_next_page}
 
 
 async def get_started_by(dialog_manager: DialogManager, **middleware_data):
@@ -38,7 +65,7 @@ async def get_started_by(dialog_manager: DialogManager, **middleware_data):
 
 async def get_address_book_entry(dialog_manager: DialogManager, **middleware_data):
     session = middleware_data.get('db_session')
-    http_session = middleware_data.get("http_session")
+    account_readers = middleware_data.get("account_readers")
 
     ctx = dialog_manager.current_context()
     event = dialog_manager.event if isinstance(dialog_manager.event, Message) else dialog_manager.event.message
@@ -46,42 +73,28 @@ async def get_address_book_entry(dialog_manager: DialogManager, **middleware_dat
     address_book_id = event.chat.id
     account_address = ctx.dialog_data.get("account_address")
     account_type = ctx.dialog_data.get("account_type")
-    config = middleware_data.get("config")
-    api_keys = {'TRC20': config.tron_api_keys,
-                'BEP20': config.bsc_scan_api_keys,
-                'ERC20': config.etherscan_api_keys}
-    match account_type:
-        case "TRC20":
-            account = await get_tron_account_from_net(http_session=http_session,
-                                                      address=account_address,
-                                                      tron_api_keys=api_keys.get("TRC20"))
-        case "BEP20":
-            account = await get_bep20_account_from_net(http_session=http_session,
-                                                       address=account_address, bep20_api_keys=api_keys.get("BEP20"))
-        case "ERC20":
-            account = await get_erc20_account_from_net(http_session=http_session,
-                                                       address=account_address, erc20_api_keys=api_keys.get("ERC20"))
-        case _:
-            account = None
-            native_transactions = None
-            token_transactions = None
-
-    if account:
-        db_account = await read_account(session=session, address=account.address,
-                                        account_type_id=account.account_type_id)
-        native_tx = await get_native_trns_from_net(http_session=http_session,
-                                                   account=account,
-                                                   api_keys=api_keys) if not db_account or (
-                db_account.native_balance != account.native_balance) else None
-        token_tx = await get_token_trns_from_net(http_session=http_session,
-                                                 account=account,
-                                                 api_keys=api_keys) if not db_account or (
-                db_account.token_balance != account.token_balance) else None
-        await sync_db_account(session=session,
-                              db_account=db_account,
-                              net_account=account,
-                              tx={"token": token_tx,
-                                  "native": native_tx})
+    refreshed_at = get_refresh_time(account_address, account_type)
+    is_stale = refreshed_at is None or time.time() - refreshed_at > settings.entry_refresh_interval
+    # a refresh failed within the interval is not restarted until the failure expires
+    is_failed = is_stale and get_refresh_failure_time(account_address, account_type) is not None
+    if not settings.entry_background_refresh:
+        await refresh_account(db_session=session,
+                              readers=account_readers,
+                              address=account_address,
+                              account_type=account_type)
+        refreshed_at, is_stale = get_refresh_time(account_address, account_type), False
+    elif is_stale and not is_failed:
+        bg_manager = dialog_manager.bg()
+
+        async def on_refreshed(account_refresh: Optional[AccountRefresh]) -> None:
+            # the window is rendered again and its getter reads the fresh state or the failure
+            await bg_manager.update({})
+
+        refresh_account_in_background(db_session=session,
+                                      readers=account_readers,
+                                      address=account_address,
+                                      account_type=account_type,
+                                      on_refreshed=on_refreshed)
 
     entry = await get_address_book_entry_from_db(session=session,
                                                  address_book_id=address_book_id,
@@ -95,7 +108,16 @@ async def get_address_book_entry(dialog_manager: DialogManager, **middleware_dat
     ctx.dialog_data.update(native_unit=entry.account.account_type.native_unit)
     ctx.dialog_data.update(token_unit=entry.account.account_type.token_unit)
 
+    age = f"{int(time.time() - refreshed_at)} s ago" if refreshed_at else "unknown"
+    if is_failed:
+        updated = f"refresh failed, data from {age}"
+    elif is_stale:
+        updated = "updating..."
+    else:
+        updated = age
+
     return {"started_by": started_by,
+            "updated": updated,
             "account_alias": entry.account_alias,
             "account_address": entry.account_address,
             "native_token": entry.account.account_type.native_token,
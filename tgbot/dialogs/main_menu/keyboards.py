@@ -1,24 +1,38 @@
 import operator
 
-from aiogram_dialog.widgets.kbd import ScrollingGroup, Select, Row, Button, SwitchTo, Checkbox, Counter, Group
-from aiogram_dialog.widgets.text import Format
+from aiogram_dialog.widgets.kbd import Select, Row, Button, SwitchTo, Checkbox, Counter, Group, Column
+from aiogram_dialog.widgets.text import Format, Const
 
 from . import constants, states, events, onclick
 
 
-def address_book_kbd(on_click, on_page_changed=None):
-    return ScrollingGroup(
-        Select(
-            Format("{item[0]}"),
-            id=constants.MainMenu.ADDRESS_BOOK,
-            item_id_getter=operator.itemgetter(1),
-            items="items",
-            on_click=on_click,
+def address_book_kbd(on_click, on_page_changed):
+    """
+    Only the current page is in `items`, pages are switched by keyset cursors in dialog data.
+    """
+    return Group(
+        Column(
+            Select(
+                Format("{item[0]}"),
+                id=constants.MainMenu.ADDRESS_BOOK,
+                item_id_getter=operator.itemgetter(1),
+                items="items",
+                on_click=on_click,
+            )
         ),
-        id=constants.MainMenu.ADDRESS_BOOK_SCROLLING_GROUP,
-        width=1, height=10,
-        on_page_changed=on_page_changed,
-        hide_on_single_page=True
+        Row(
+            Button(Const("<"),
+                   id=constants.MainMenu.ADDRESS_BOOK_PREV_PAGE,
+                   on_click=on_page_changed,
+                   when="has_prev_page"),
+            Button(Format("{page} / {pages}"),
+                   id=constants.MainMenu.ADDRESS_BOOK_PAGE,
+                   when="has_pages"),
+            Button(Const(">"),
+                   id=constants.MainMenu.ADDRESS_BOOK_NEXT_PAGE,
+                   on_click=on_page_changed,
+                   when="has_next_page")
+        )
     )
 
 
@@ -17,6 +17,23 @@ async def on_select_entry(callback: CallbackQuery,
     await manager.switch_to(states.MainMenuStates.edit_ab_entry)
 
 
+async def on_address_book_page_changed(callback: CallbackQuery,
+                                       button: Button,
+                                       manager: DialogManager):
+    """
+    Keyset cursors of the visited pages are kept in dialog data, the cursor of the next page
+    is set by the address book getter.
+    """
+    ctx = manager.current_context()
+    page_cursors = ctx.dialog_data.get("page_cursors") or []
+    if button.widget_id == constants.MainMenu.ADDRESS_BOOK_NEXT_PAGE:
+        if next_page_cursor := ctx.dialog_data.get("next_page_cursor"):
+            page_cursors.append(next_page_cursor)
+    elif page_cursors:
+        page_cursors.pop()
+    ctx.dialog_data.update(page_cursors=page_cursors)
+
+
 async def on_click_show_trns(callback: CallbackQuery,
                              button: Button,
                              manager: DialogManager):
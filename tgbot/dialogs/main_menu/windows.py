@@ -10,7 +10,8 @@ from . import keyboards, states, onclick, constants, getters, events
 def main_menu_window():
     return Window(
         Format("Accounts in {address_book_title} (started by {started_by})"),
-        keyboards.address_book_kbd(on_click=onclick.on_select_entry),
+        keyboards.address_book_kbd(on_click=onclick.on_select_entry,
+                                   on_page_changed=onclick.on_address_book_page_changed),
         Row(Cancel(Const("<<")),
             SwitchTo(Const("+"),
                      id=constants.MainMenu.NEW_ACCOUNT,
@@ -20,11 +21,11 @@ def main_menu_window():
     )
 
 
-def enter_value_window(text: str, handler=None, state=None, getter=None):
+def enter_value_window(text: str, handler=None, state=None, getter=None, content_types=(ContentType.TEXT,)):
     return Window(
         Format(text),
         MessageInput(handler,
-                     content_types=[ContentType.TEXT]),
+                     content_types=list(content_types)),
         state=state,
         getter=getter
     )
@@ -38,6 +39,7 @@ def address_book_entry_window():
                "Address: {account_address}\n"
                "{native_token}: {native_balance}\n"
                "{account_type}: {token_balance}\n"
+               "Updated: {updated}\n"
                "====================\n"
                "Track {account_type}: {track_token}\n"
                "Threshold: {token_threshold} {account_type}\n"
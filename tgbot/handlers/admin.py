@@ -1,14 +1,22 @@
+import asyncio
+
 from aiogram import Router
-from aiogram.filters import CommandStart
+from aiogram.filters import CommandStart, Command, CommandObject
 from aiogram.types import Message
 from aiogram_dialog import DialogManager, ShowMode, StartMode
 
 from ..dialogs.main_menu import states
 from tgbot.filters.admin import AdminFilter
+from tgbot.services.backfill import backfill_accounts
 
 admin_router = Router()
 admin_router.message.filter(AdminFilter())
 
+"""
+Background backfill tasks, references are kept until the task is done
+"""
+backfill_tasks = set()
+
 
 @admin_router.message(CommandStart())
 async def admin_start(message: Message, dialog_manager: DialogManager):
@@ -16,3 +24,33 @@ async def admin_start(message: Message, dialog_manager: DialogManager):
                                data={"started_by": message.from_user.mention_html()},
                                mode=StartMode.RESET_STACK)
 
+
+async def run_backfill(message: Message, accounts: list, config, db_session, account_readers):
+    results = await backfill_accounts(db_session=db_session,
+                                      readers=account_readers,
+                                      accounts=accounts,
+                                      concurrency=config.backfill_concurrency)
+    message_text = "\n".join(f"{account_type} {address}: " +
+                             (", ".join(f"{tx_type} {count}" for tx_type, count in result.items())
+                              if result else "not backfilled")
+                             for (address, account_type), result in results.items())
+    await message.answer(f"Backfill finished\n{message_text}")
+
+
+@admin_router.message(Command("backfill"))
+async def admin_backfill(message: Message, command: CommandObject, **middleware_data):
+    """
+    /backfill <address> [TRC20|ERC20|BEP20]
+    """
+    args = command.args.split() if command.args else []
+    if not args:
+        await message.answer("Usage: /backfill address [TRC20|ERC20|BEP20]")
+        return
+    accounts = [(args[0], args[1].upper() if len(args) > 1 else None)]
+    task = asyncio.create_task(run_backfill(message, accounts,
+                                            config=middleware_data.get("config"),
+                                            db_session=middleware_data.get("db_session"),
+                                            account_readers=middleware_data.get("account_readers")))
+    backfill_tasks.add(task)
+    task.add_done_callback(backfill_tasks.discard)
+    await message.answer(f"Backfill of {args[0]} started")
@@ -5,10 +5,11 @@ from aiogram.types import Message
 
 
 class ConfigMiddleware(BaseMiddleware):
-    def __init__(self, config, db_session, http_session) -> None:
+    def __init__(self, config, db_session, http_session, account_readers) -> None:
         self.config = config
         self.db_session = db_session
         self.http_session = http_session
+        self.account_readers = account_readers
 
     async def __call__(
             self,
@@ -19,4 +20,5 @@ class ConfigMiddleware(BaseMiddleware):
         data["config"] = self.config
         data["db_session"] = self.db_session
         data["http_session"] = self.http_session
+        data["account_readers"] = self.account_readers
         return await handler(event, data)
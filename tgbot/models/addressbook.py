@@ -1,12 +1,12 @@
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 from sqlalchemy import text, Boolean, String, ForeignKey, CheckConstraint, ForeignKeyConstraint, DateTime, \
-    UniqueConstraint
+    UniqueConstraint, BigInteger, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql import expression
 
-from .base import Base, VeryBigInt, TimestampMixin
+from .base import Base, VeryBigInt, TimestampMixin, very_big_int_literal
 
 
 class AccountType(Base):
@@ -18,8 +18,8 @@ class AccountType(Base):
     native_token: Mapped[str] = mapped_column(String(16),
                                               CheckConstraint("native_token IN ('BNB', 'TRX', 'ETH')",
                                                               name="check_native_token"))
-    native_unit: Mapped[int] = mapped_column(VeryBigInt, server_default=text("1000000"))
-    token_unit: Mapped[int] = mapped_column(VeryBigInt, server_default=text("1000000"))
+    native_unit: Mapped[int] = mapped_column(VeryBigInt, default=1000000, server_default=very_big_int_literal(1000000))
+    token_unit: Mapped[int] = mapped_column(VeryBigInt, default=1000000, server_default=very_big_int_literal(1000000))
     token_contract: Mapped[str] = mapped_column(String(128), nullable=False)
 
     def __repr__(self) -> str:
@@ -34,8 +34,8 @@ class Account(TimestampMixin, Base):
                                                                         ondelete="RESTRICT",
                                                                         onupdate="CASCADE"),
                                                  primary_key=True)
-    native_balance: Mapped[int] = mapped_column(VeryBigInt, server_default=text("0"))
-    token_balance: Mapped[int] = mapped_column(VeryBigInt, server_default=text("0"))
+    native_balance: Mapped[int] = mapped_column(VeryBigInt, default=0, server_default=very_big_int_literal(0))
+    token_balance: Mapped[int] = mapped_column(VeryBigInt, default=0, server_default=very_big_int_literal(0))
     account_type: Mapped["AccountType"] = relationship()
 
     def __init__(self, address, account_type, native_balance, token_balance):
@@ -67,8 +67,8 @@ class AccountStatement(Base):
     account_address: Mapped[str] = mapped_column(String(128), nullable=False, primary_key=True)
     account_type_id: Mapped[str] = mapped_column(String(16), nullable=False, primary_key=True)
     timestamp: Mapped[datetime] = mapped_column(DateTime(True), nullable=False, primary_key=True)
-    native_balance: Mapped[int] = mapped_column(VeryBigInt, server_default=text("0"))
-    token_balance: Mapped[int] = mapped_column(VeryBigInt, server_default=text("0"))
+    native_balance: Mapped[int] = mapped_column(VeryBigInt, default=0, server_default=very_big_int_literal(0))
+    token_balance: Mapped[int] = mapped_column(VeryBigInt, default=0, server_default=very_big_int_literal(0))
     account: Mapped["Account"] = relationship()
 
     def __repr__(self) -> str:
@@ -79,6 +79,61 @@ class AccountStatement(Base):
                 f"token balance={self.token_balance!r}")
 
 
+Index("ix_account_statement_account_timestamp_desc",
+      AccountStatement.account_address, AccountStatement.account_type_id, AccountStatement.timestamp.desc())
+
+
+class AccountLatestStatement(Base):
+    """
+    Copy of the last AccountStatement row of every account, maintained on write,
+    so the last statement is read by primary key however long the statement history is.
+    """
+    __tablename__ = "account_latest_statement"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["account_address", "account_type_id"], ["account.address", "account.account_type_id"],
+            ondelete="CASCADE",
+            onupdate="CASCADE"
+        ),
+    )
+
+    account_address: Mapped[str] = mapped_column(String(128), nullable=False, primary_key=True)
+    account_type_id: Mapped[str] = mapped_column(String(16), nullable=False, primary_key=True)
+    timestamp: Mapped[datetime] = mapped_column(DateTime(True), nullable=False)
+    native_balance: Mapped[int] = mapped_column(VeryBigInt, default=0, server_default=very_big_int_literal(0))
+    token_balance: Mapped[int] = mapped_column(VeryBigInt, default=0, server_default=very_big_int_literal(0))
+
+    def __repr__(self) -> str:
+        return (f"AccountLatestStatement(account_address={self.account_address!r}, "
+                f"account_type_id={self.account_type_id!r}, timestamp={self.timestamp!r}, "
+                f"native_balance={self.native_balance!r}, token_balance={self.token_balance!r})")
+
+
+class AccountAlertState(TimestampMixin, Base):
+    """
+    Balances of the account threshold alerts were last evaluated at. Crossings are detected against them
+    rather than against the stored account, so balances written without an alert check are not skipped.
+    """
+    __tablename__ = "account_alert_state"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["account_address", "account_type_id"], ["account.address", "account.account_type_id"],
+            ondelete="CASCADE",
+            onupdate="CASCADE"
+        ),
+    )
+
+    account_address: Mapped[str] = mapped_column(String(128), nullable=False, primary_key=True)
+    account_type_id: Mapped[str] = mapped_column(String(16), nullable=False, primary_key=True)
+    native_balance: Mapped[int] = mapped_column(VeryBigInt, default=0, server_default=very_big_int_literal(0))
+    token_balance: Mapped[int] = mapped_column(VeryBigInt, default=0, server_default=very_big_int_literal(0))
+
+    def __repr__(self) -> str:
+        return (f"AccountAlertState(account_address={self.account_address!r}, "
+                f"account_type_id={self.account_type_id!r}, "
+                f"native_balance={self.native_balance!r}, token_balance={self.token_balance!r})")
+
+
 class AccountTransaction(Base):
     __tablename__ = "account_tx"
     __table_args__ = (
@@ -102,7 +157,7 @@ class AccountTransaction(Base):
     to_address: Mapped[str] = mapped_column(String(128), nullable=False, primary_key=True)
     to_account_type: Mapped[str] = mapped_column(String(16), nullable=False, primary_key=True)
     tx_timestamp: Mapped[datetime] = mapped_column(DateTime(True), nullable=False, primary_key=True)
-    tx_amount: Mapped[int] = mapped_column(VeryBigInt, server_default=text("0"))
+    tx_amount: Mapped[int] = mapped_column(VeryBigInt, default=0, server_default=very_big_int_literal(0))
 
     from_account: Mapped["Account"] = relationship(foreign_keys=[from_address, from_account_type])
     to_account: Mapped["Account"] = relationship(foreign_keys=[to_address, to_account_type])
@@ -129,7 +184,8 @@ class AccountTransaction(Base):
 class AddressBook(TimestampMixin, Base):
     __tablename__ = "address_book"
 
-    id: Mapped[int] = mapped_column(primary_key=True)
+    # Telegram chat id, supergroup ids do not fit into 32 bits
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
     title: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
     is_active: Mapped[bool] = mapped_column(Boolean, server_default=expression.true())
     accounts: Mapped[List["AddressBookEntry"]] = relationship()
@@ -147,9 +203,10 @@ class AddressBookEntry(Base):
             onupdate="CASCADE"
         ),
         UniqueConstraint("address_book_id", "account_address", "account_alias",
-                         name="uq_address_book_entry_address_book_id_account_address_account_alias")
+                         name="uq_address_book_entry_alias")
     )
-    address_book_id: Mapped[int] = mapped_column(ForeignKey("address_book.id",
+    address_book_id: Mapped[int] = mapped_column(BigInteger,
+                                                 ForeignKey("address_book.id",
                                                             ondelete="CASCADE",
                                                             onupdate="CASCADE"),
                                                  nullable=False,
@@ -159,9 +216,11 @@ class AddressBookEntry(Base):
 
     account_alias: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
     track_native: Mapped[bool] = mapped_column(Boolean, nullable=False, server_default=expression.false())
-    native_threshold: Mapped[int] = mapped_column(VeryBigInt, nullable=False, server_default=text("10"))
+    native_threshold: Mapped[int] = mapped_column(VeryBigInt, nullable=False, default=10,
+                                                  server_default=very_big_int_literal(10))
     track_token: Mapped[bool] = mapped_column(Boolean, nullable=False, server_default=expression.false())
-    token_threshold: Mapped[int] = mapped_column(VeryBigInt, nullable=False, server_default=text("10"))
+    token_threshold: Mapped[int] = mapped_column(VeryBigInt, nullable=False, default=10,
+                                                 server_default=very_big_int_literal(10))
     schedule: Mapped[int] = mapped_column(nullable=False, server_default=text("10"))
 
     account: Mapped["Account"] = relationship()
@@ -175,3 +234,74 @@ class AddressBookEntry(Base):
                 f"account_address={self.account_address!r}, account type {self.account_type_id!r}"
                 f"account_alias={self.account_alias!r}), track_native={self.track_native!r}, "
                 f"track_token={self.track_token!r}, schedule={self.schedule!r}")
+
+
+Index("ix_address_book_entry_address_book_id_alias",
+      AddressBookEntry.address_book_id, AddressBookEntry.account_alias,
+      AddressBookEntry.account_address, AddressBookEntry.account_type_id)
+
+
+class AccountSyncCursor(TimestampMixin, Base):
+    __tablename__ = "account_sync_cursor"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["account_address", "account_type_id"], ["account.address", "account.account_type_id"],
+            ondelete="CASCADE",
+            onupdate="CASCADE"
+        ),
+    )
+
+    account_address: Mapped[str] = mapped_column(String(128), nullable=False, primary_key=True)
+    account_type_id: Mapped[str] = mapped_column(String(16), nullable=False, primary_key=True)
+    tx_type: Mapped[str] = mapped_column(String(10),
+                                         CheckConstraint("tx_type IN ('native', 'token')",
+                                                         name="check_tx_type"),
+                                         nullable=False, primary_key=True)
+    last_block: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    last_timestamp: Mapped[Optional[datetime]] = mapped_column(DateTime(True), nullable=True)
+    fingerprint: Mapped[Optional[str]] = mapped_column(String(256), nullable=True)
+
+    def __repr__(self) -> str:
+        return (f"AccountSyncCursor(account_address={self.account_address!r}, "
+                f"account_type_id={self.account_type_id!r}, tx_type={self.tx_type!r}, "
+                f"last_block={self.last_block!r}, last_timestamp={self.last_timestamp!r}, "
+                f"fingerprint={self.fingerprint!r})")
+
+
+class AccountBackfill(TimestampMixin, Base):
+    __tablename__ = "account_backfill"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["account_address", "account_type_id"], ["account.address", "account.account_type_id"],
+            ondelete="CASCADE",
+            onupdate="CASCADE"
+        ),
+    )
+
+    account_address: Mapped[str] = mapped_column(String(128), nullable=False, primary_key=True)
+    account_type_id: Mapped[str] = mapped_column(String(16), nullable=False, primary_key=True)
+    tx_type: Mapped[str] = mapped_column(String(10),
+                                         CheckConstraint("tx_type IN ('native', 'token')",
+                                                         name="check_tx_type"),
+                                         nullable=False, primary_key=True)
+    cursor: Mapped[Optional[str]] = mapped_column(String(256), nullable=True)
+    tx_count: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default=text("0"))
+    is_done: Mapped[bool] = mapped_column(Boolean, nullable=False, server_default=expression.false())
+
+    def __repr__(self) -> str:
+        return (f"AccountBackfill(account_address={self.account_address!r}, "
+                f"account_type_id={self.account_type_id!r}, tx_type={self.tx_type!r}, "
+                f"cursor={self.cursor!r}, tx_count={self.tx_count!r}, is_done={self.is_done!r})")
+
+
+class ChainScanCursor(TimestampMixin, Base):
+    __tablename__ = "chain_scan_cursor"
+
+    account_type_id: Mapped[str] = mapped_column(String(16), ForeignKey("account_type.id",
+                                                                        ondelete="CASCADE",
+                                                                        onupdate="CASCADE"),
+                                                 primary_key=True)
+    last_block: Mapped[int] = mapped_column(BigInteger, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"ChainScanCursor(account_type_id={self.account_type_id!r}, last_block={self.last_block!r})"
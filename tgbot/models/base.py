@@ -1,10 +1,17 @@
 import logging
 from abc import ABC
 from datetime import datetime
+from decimal import Decimal
+from typing import Optional, Dict, Any
 
-from sqlalchemy import event, Engine, MetaData, types, func, DateTime
+from sqlalchemy import event, MetaData, types, DateTime
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.sql import functions
+from sqlalchemy.sql.functions import FunctionElement
 
 meta = MetaData(naming_convention={
     "ix": "ix_%(column_0_label)s",
@@ -13,32 +20,217 @@ meta = MetaData(naming_convention={
     "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
     "pk": "pk_%(table_name)s"
 })
-MAX_SQLITE_INT = 2 ** 63 - 1
+VERY_BIG_INT_BYTES = 32
+VERY_BIG_INT_OFFSET = 2 ** 255
+"""
+SUM over blobs is computed from 32-bit limbs summed natively by SQLite, each limb sum fits into 64 bits
+for up to 2**31 rows.
+"""
+VERY_BIG_INT_LIMB_BITS = 32
+VERY_BIG_INT_LIMBS = VERY_BIG_INT_BYTES * 8 // VERY_BIG_INT_LIMB_BITS
+"""
+PRAGMA user_version of SQLite databases whose VeryBigInt values are all blobs.
+"""
+SQLITE_BLOB_VERSION = 1
+
+"""
+WAL lets readers work while a writer commits, synchronous=NORMAL is durable in WAL mode except for power loss,
+busy_timeout makes a connection wait for the lock instead of failing with "database is locked".
+"""
+SQLITE_PRAGMAS: Dict[str, Any] = {"busy_timeout": 5000,
+                                  "journal_mode": "WAL",
+                                  "synchronous": "NORMAL",
+                                  "temp_store": "MEMORY",
+                                  "mmap_size": 256 * 1024 * 1024,
+                                  "cache_size": -64 * 1024}
+
+
+def encode_very_big_int(value: int) -> bytes:
+    """
+    Offset binary: 32 bytes big-endian of value + 2**255, so byte order of blobs is the order of signed values.
+    """
+    return (int(value) + VERY_BIG_INT_OFFSET).to_bytes(VERY_BIG_INT_BYTES, "big")
+
+
+def decode_very_big_int(value: bytes | str | int) -> int:
+    """
+    Legacy values written before the blob encoding (integers and hex strings) are decoded as well.
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return int.from_bytes(value, "big") - VERY_BIG_INT_OFFSET
+    return int(value, 16) if isinstance(value, str) else int(value)
 
 
 class VeryBigInt(types.TypeDecorator, ABC):
-    impl = types.Integer
-    cache_ok = False
+    """
+    Integer of up to 256 bits (token amounts in wei): NUMERIC(78, 0) on PostgreSQL,
+    fixed width order preserving blob on SQLite, so comparisons and ORDER BY work in the database.
+    """
+    impl = types.LargeBinary
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(types.Numeric(78, 0))
+        return dialect.type_descriptor(types.LargeBinary(VERY_BIG_INT_BYTES))
 
     def process_bind_param(self, value, dialect):
-        return hex(value) if value > MAX_SQLITE_INT else value
+        if value is None:
+            return value
+        if dialect.name == "postgresql":
+            return Decimal(value)
+        return encode_very_big_int(value)
 
     def process_result_value(self, value, dialect):
-        return int(value, 16) if isinstance(value, str) else value
+        if value is None:
+            return value
+        return int(value) if dialect.name == "postgresql" else decode_very_big_int(value)
+
+
+def very_big_int_limb(value: Optional[bytes], index: int) -> Optional[int]:
+    """
+    :return: limb number index (least significant first) of the offset binary value
+    """
+    if value is None:
+        return None
+    offset_value = int.from_bytes(value, "big") if isinstance(value, bytes) \
+        else decode_very_big_int(value) + VERY_BIG_INT_OFFSET
+    return (offset_value >> (index * VERY_BIG_INT_LIMB_BITS)) & ((1 << VERY_BIG_INT_LIMB_BITS) - 1)
+
+
+def very_big_int_join_sum(count: int, *limb_sums: Optional[int]) -> Optional[bytes]:
+    """
+    :param count: number of summed values, each of them carries VERY_BIG_INT_OFFSET
+    :return: encoded sum, None for no values like SQL SUM
+    """
+    if not count:
+        return None
+    total = sum(limb_sum << (index * VERY_BIG_INT_LIMB_BITS) for index, limb_sum in enumerate(limb_sums))
+    return encode_very_big_int(total - count * VERY_BIG_INT_OFFSET)
+
+
+def register_sqlite_functions(dbapi_connection) -> None:
+    dbapi_connection.create_function("very_big_int_limb", 2, very_big_int_limb, deterministic=True)
+    dbapi_connection.create_function("very_big_int_join_sum", VERY_BIG_INT_LIMBS + 1, very_big_int_join_sum,
+                                     deterministic=True)
+
+
+@compiles(functions.sum, "sqlite")
+def compile_sqlite_sum(element, compiler, **kwargs):
+    arguments = list(element.clauses)
+    if len(arguments) != 1 or not isinstance(arguments[0].type, VeryBigInt):
+        return compiler.visit_function(element, **kwargs)
+    argument = compiler.process(arguments[0], **kwargs)
+    limb_sums = ", ".join(f"sum(very_big_int_limb({argument}, {index}))" for index in range(VERY_BIG_INT_LIMBS))
+    return f"very_big_int_join_sum(count({argument}), {limb_sums})"
+
+
+class very_big_int_literal(ColumnElement):
+    """
+    VeryBigInt value for server defaults: blob literal on SQLite, number elsewhere.
+    """
+    inherit_cache = False
+
+    def __init__(self, value: int) -> None:
+        self.value = value
+
+
+@compiles(very_big_int_literal)
+def compile_very_big_int_literal(element, compiler, **kwargs):
+    return str(int(element.value))
+
+
+@compiles(very_big_int_literal, "sqlite")
+def compile_sqlite_very_big_int_literal(element, compiler, **kwargs):
+    return f"X'{encode_very_big_int(element.value).hex()}'"
+
+
+def migrate_very_big_int_values(connection) -> None:
+    """
+    Re-encode SQLite VeryBigInt values written as integers or hex strings into blobs,
+    once per database: PRAGMA user_version is set to SQLITE_BLOB_VERSION afterwards.
+    """
+    logger = logging.getLogger(__name__)
+    if connection.exec_driver_sql("PRAGMA user_version").scalar() >= SQLITE_BLOB_VERSION:
+        return
+    for table in Base.metadata.sorted_tables:
+        for column in table.columns:
+            if not isinstance(column.type, VeryBigInt):
+                continue
+            rows = connection.exec_driver_sql(
+                f'SELECT rowid, "{column.name}" FROM "{table.name}" '
+                f'WHERE "{column.name}" IS NOT NULL AND typeof("{column.name}") != \'blob\'').all()
+            if not rows:
+                continue
+            connection.exec_driver_sql(f'UPDATE "{table.name}" SET "{column.name}" = ? WHERE rowid = ?',
+                                       [(encode_very_big_int(decode_very_big_int(value)), rowid)
+                                        for rowid, value in rows])
+            logger.info("%d value(s) of %s.%s re-encoded", len(rows), table.name, column.name)
+    connection.exec_driver_sql(f"PRAGMA user_version={SQLITE_BLOB_VERSION}")
+
+
+class local_now(FunctionElement):
+    """
+    Current timestamp computed by the database server, local time on SQLite as before.
+    """
+    type = DateTime(True)
+    inherit_cache = True
+
+
+@compiles(local_now)
+def compile_local_now(element, compiler, **kwargs):
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(local_now, "sqlite")
+def compile_sqlite_local_now(element, compiler, **kwargs):
+    return "datetime('now', 'localtime')"
+
+
+@compiles(local_now, "postgresql")
+def compile_postgresql_local_now(element, compiler, **kwargs):
+    return "now()"
 
 
 class TimestampMixin:
-    created_at: Mapped[datetime] = mapped_column(DateTime(True), server_default=func.datetime('now', 'localtime'))
-    updated_at: Mapped[datetime] = mapped_column(DateTime(True), default=func.datetime('now', 'localtime'),
-                                                 onupdate=func.datetime('now', 'localtime'),
-                                                 server_default=func.datetime('now', 'localtime'))
+    created_at: Mapped[datetime] = mapped_column(DateTime(True), server_default=local_now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(True), default=local_now(),
+                                                 onupdate=local_now(),
+                                                 server_default=local_now())
 
 
 class Base(DeclarativeBase):
     metadata = meta
 
 
-async def create_db_session(db_dialect, db_name, db_user, db_pass, db_host, db_echo) -> async_sessionmaker:
+def create_missing_indexes(connection) -> None:
+    """
+    create_all skips indexes of already existing tables, indexes added to them later are created here.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def set_sqlite_pragmas(dbapi_connection, pragmas: Dict[str, Any]) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    for name, value in pragmas.items():
+        if not name.isidentifier():
+            raise ValueError(f"Invalid SQLite pragma {name!r}")
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+async def create_db_session(db_dialect, db_name, db_user, db_pass, db_host, db_echo,
+                            sqlite_pragmas: Optional[Dict[str, Any]] = None,
+                            pool_size: Optional[int] = None,
+                            max_overflow: Optional[int] = None,
+                            pool_timeout: Optional[float] = None) -> async_sessionmaker:
+    """
+    :param sqlite_pragmas: pragmas applied to every new SQLite connection, SQLITE_PRAGMAS if None
+    :param pool_size: connection pool size, dialect default if None
+    """
     logger = logging.getLogger(__name__)
     # dialect[+driver]: // user: password @ host / dbname[?key = value..],
 
@@ -48,22 +240,35 @@ async def create_db_session(db_dialect, db_name, db_user, db_pass, db_host, db_e
         database_uri = f"{db_dialect}://{db_user}:{db_pass}" \
                        f"@{db_host}/{db_name}"
 
+    pool_options = {name: value for name, value in (("pool_size", pool_size),
+                                                    ("max_overflow", max_overflow),
+                                                    ("pool_timeout", pool_timeout)) if value is not None}
+    if db_dialect.startswith('sqlite') and db_name in ("", ":memory:"):
+        pool_options = {}
+    elif db_dialect.startswith('sqlite') and pool_options:
+        # aiosqlite defaults to NullPool, pooled connections keep their pragmas and page cache
+        pool_options["poolclass"] = AsyncAdaptedQueuePool
     engine = create_async_engine(
         database_uri,
         echo=db_echo,
-        future=True
+        future=True,
+        **pool_options
     )
 
     if db_dialect.startswith('sqlite'):
-        @event.listens_for(Engine, "connect")
+        pragmas = SQLITE_PRAGMAS if sqlite_pragmas is None else sqlite_pragmas
+
+        @event.listens_for(engine.sync_engine, "connect")
         def set_sqlite_pragma(dbapi_connection, connection_record):
-            cursor = dbapi_connection.cursor()
-            cursor.execute("PRAGMA foreign_keys=ON")
-            cursor.close()
+            set_sqlite_pragmas(dbapi_connection, pragmas)
+            register_sqlite_functions(dbapi_connection)
 
     async with engine.begin() as conn:
         # await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(create_missing_indexes)
+        if db_dialect.startswith('sqlite'):
+            await conn.run_sync(migrate_very_big_int_values)
 
     session = async_sessionmaker(
         engine,
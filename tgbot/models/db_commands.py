@@ -1,24 +1,67 @@
 import datetime
 import logging
 from copy import copy
-from sqlite3 import IntegrityError
-from typing import Optional, List, Any, Sequence, Generator
+from dataclasses import dataclass, field
+from typing import Optional, List, Any, Sequence, Generator, Dict, Tuple
 
 from aiogram.types import Message
 from aiohttp import ClientSession
-from sqlalchemy import update, Result, select, Row, RowMapping, func, Select, delete
-from sqlalchemy.dialects.sqlite import insert, Insert
+from cachetools import TTLCache
+from sqlalchemy import update, Result, select, Row, RowMapping, func, Select, delete, or_, and_, tuple_, \
+    bindparam, Update, insert as generic_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import joinedload
 
-from tgbot.models.addressbook import AddressBook, Account, AddressBookEntry, AccountStatement, AccountTransaction
-from tgbot.utils.net_accounts import get_native_trns_from_net, get_token_trns_from_net
-from tgbot.wallet_readers.account_readers import APIAccountTransaction
+from tgbot.models.dialect import Insert, InsertConstruct, DialectStatement, get_insert
+from tgbot.models.addressbook import AddressBook, Account, AddressBookEntry, AccountStatement, AccountTransaction, \
+    AccountSyncCursor, AccountBackfill, AccountLatestStatement, AccountType, ChainScanCursor, AccountAlertState
+from tgbot.models.watchlist import watchlist
+from tgbot.wallet_readers.account_readers import APIAccountTransaction, APISyncCursor
 
 logger = logging.getLogger(__name__)
 
+"""
+Max count of accounts per statement of IN (...) lookups, keeps bound parameters under the SQLite limit.
+"""
+SYNC_LOOKUP_CHUNK: int = 400
 
-def get_upsert_address_book_query(values: List[dict] | dict) -> Insert:
+
+"""
+Statements of the hot paths are built once at import with bound parameters, so neither the construct
+nor its cache key is rebuilt per call and the compiled form is taken from the statement cache.
+"""
+ADDRESS_BOOK_ENTRY_KEY = (AddressBookEntry.address_book_id == bindparam("address_book_id"),
+                          AddressBookEntry.account_address == bindparam("account_address"),
+                          AddressBookEntry.account_type_id == bindparam("account_type_id"))
+ADDRESS_BOOK_ENTRY_ACCOUNT = joinedload(AddressBookEntry.account,
+                                        innerjoin=True).joinedload(Account.account_type, innerjoin=True)
+
+"""
+Last written title of every address book by chat id, title refreshes are skipped while the title is the same.
+"""
+address_book_titles = TTLCache(maxsize=4096, ttl=3600.0)
+
+
+def remember_address_book_titles(values: List[dict] | dict) -> None:
+    for address_book in values if isinstance(values, list) else [values]:
+        if "id" in address_book and "title" in address_book:
+            address_book_titles[address_book["id"]] = address_book["title"]
+
+
+@dataclass
+class AccountSync:
+    """
+    Refresh result of one account written by sync_db_accounts.
+    tx: transactions by tx_type, cursors: sync cursors by tx_type pointing after the transactions in `tx`
+    """
+    db_account: Optional[Account]
+    net_account: Account
+    tx: Dict[str, List[APIAccountTransaction]] = field(default_factory=dict)
+    cursors: Dict[str, APISyncCursor] = field(default_factory=dict)
+
+
+def get_upsert_address_book_query(insert: InsertConstruct, values: List[dict] | dict) -> Insert:
     insert_statement = insert(AddressBook).values(values)
     return insert_statement.on_conflict_do_update(
         index_elements=["id"],
@@ -40,41 +83,61 @@ async def upsert_address_book(session: async_sessionmaker,
     :return:
     """
 
-    statement = get_upsert_address_book_query(values)
     async with session() as session:
+        statement = get_upsert_address_book_query(get_insert(session), values)
         try:
             result: Result = await session.execute(statement, execution_options={"populate_existing": True})
             await session.commit()
-            return result.scalars().all()
+            remember_address_book_titles(values)
+            address_books = result.scalars().all()
+            for address_book in address_books:
+                watchlist.set_address_book_active(address_book.id, address_book.is_active)
+            return address_books
         except IntegrityError as e:
             logger.error("Error while upserting AddressBook: %r", e)
 
 
+UPDATE_ADDRESS_BOOK_ID_QUERY = update(AddressBook).where(AddressBook.id == bindparam("old_id")
+                                                         ).values(id=bindparam("new_id")).returning(AddressBook)
+
+
 async def update_address_book_id(session: async_sessionmaker, old_id: int, new_id: int) -> Optional[AddressBook]:
-    update_statement = update(AddressBook).where(AddressBook.id == old_id
-                                                 ).values(id=new_id
-                                                          ).returning(AddressBook)
     async with session() as session:
-        result: Result = await session.execute(update_statement)
+        result: Result = await session.execute(UPDATE_ADDRESS_BOOK_ID_QUERY, dict(old_id=old_id, new_id=new_id))
         await session.commit()
-        return result.scalars().one_or_none()
+        if address_book := result.scalars().one_or_none():
+            watchlist.move_address_book(old_id, new_id)
+        return address_book
+
+
+ADDRESS_BOOK_BY_ID_QUERY = select(AddressBook).options(joinedload(AddressBook.accounts)
+                                                       ).where(AddressBook.id == bindparam("id"))
 
 
 async def read_address_book_by_id(session: async_sessionmaker, id: int) -> Optional[AddressBook]:
-    statement = select(AddressBook).options(joinedload(AddressBook.accounts)).where(AddressBook.id == id)
     async with session() as session:
-        result: Result = await session.execute(statement)
-        return result.scalars().one_or_none()
+        result: Result = await session.execute(ADDRESS_BOOK_BY_ID_QUERY, dict(id=id))
+        return result.unique().scalars().one_or_none()
 
 
-def get_upsert_account_query(values: List[dict] | dict) -> Insert:
-    insert_statement = insert(Account).values(values)
+def get_upsert_account_statement(insert: InsertConstruct) -> Insert:
+    """
+    Upsert without values, to be executed with a list of parameters (executemany).
+    """
+    insert_statement = insert(Account)
     return insert_statement.on_conflict_do_update(
         index_elements=["address", "account_type_id"],
         set_=dict(native_balance=insert_statement.excluded.native_balance,
                   token_balance=insert_statement.excluded.token_balance,
                   created_at=insert_statement.excluded.created_at,
-                  updated_at=insert_statement.excluded.updated_at)).returning(Account)
+                  updated_at=insert_statement.excluded.updated_at))
+
+
+UPSERT_ACCOUNTS_QUERY = DialectStatement(get_upsert_account_statement)
+
+
+def get_upsert_account_query(insert: InsertConstruct, values: List[dict] | dict) -> Insert:
+    return get_upsert_account_statement(insert).values(values).returning(Account)
 
 
 async def upsert_account(session: async_sessionmaker,
@@ -88,8 +151,8 @@ async def upsert_account(session: async_sessionmaker,
     token_balance: Mapped[int] = mapped_column(VeryBigInt, server_default=text("0"))
     """
 
-    statement = get_upsert_account_query(values)
     async with session() as session:
+        statement = get_upsert_account_query(get_insert(session), values)
         try:
             result: Result = await session.execute(statement, execution_options={"populate_existing": True})
             await session.commit()
@@ -98,10 +161,23 @@ async def upsert_account(session: async_sessionmaker,
             logger.error("Error while upserting Account: %r", e)
 
 
+IMPORT_CHUNK_SIZE: int = 500
+
+
 async def compose_address_book_entries(session: async_sessionmaker,
                                        address_book_id: int,
                                        address_book_title: str,
-                                       accounts: List[Account]) -> Optional[List[AddressBookEntry]]:
+                                       accounts: List[Account],
+                                       aliases: Optional[Dict[Tuple[str, str], str]] = None,
+                                       chunk_size: int = IMPORT_CHUNK_SIZE) -> List[AddressBookEntry]:
+    """
+    Add accounts to the address book in one transaction, rows are inserted by multi-row statements
+    of `chunk_size` rows. Accounts which are already in the address book are skipped.
+    Database errors are raised to the caller, nothing is added then.
+    :param aliases: account alias by (address, account_type_id), default alias is made of the title and address
+    :return: added entries
+    """
+    aliases = aliases or {}
     address_book_values = {"id": address_book_id,
                            "title": address_book_title,
                            "is_active": True}
@@ -114,41 +190,51 @@ async def compose_address_book_entries(session: async_sessionmaker,
     address_book_entry_values = [{"address_book_id": address_book_id,
                                   "account_address": account.address,
                                   "account_type_id": account.account_type_id,
-                                  "account_alias": f"! {address_book_title} "
-                                                   f"{account.account_type_id} "
-                                                   f"{account.short_address}"} for account in
+                                  "account_alias": aliases.get((account.address, account.account_type_id))
+                                                   or f"! {address_book_title} "
+                                                      f"{account.account_type_id} "
+                                                      f"{account.short_address}"} for account in
                                  accounts]
 
-    insert_address_book = get_upsert_address_book_query(address_book_values)
-    insert_account = get_upsert_account_query(accounts_values)
-    insert_address_book_entries = insert(AddressBookEntry).values(address_book_entry_values).returning(AddressBookEntry)
     async with session() as session:
-        try:
-            await session.execute(insert_address_book, execution_options={"populate_existing": True})
+        insert = get_insert(session)
+        insert_address_book = get_upsert_address_book_query(insert, address_book_values)
+        await session.execute(insert_address_book, execution_options={"populate_existing": True})
+        entries = []
+        for i in range(0, len(accounts), chunk_size):
+            insert_account = get_upsert_account_query(insert, accounts_values[i:i + chunk_size])
+            insert_address_book_entries = insert(AddressBookEntry).values(
+                address_book_entry_values[i:i + chunk_size]).on_conflict_do_nothing().returning(AddressBookEntry)
             await session.execute(insert_account, execution_options={"populate_existing": True})
-            result = await session.execute(insert_address_book_entries, execution_options={"populate_existing": True})
-            await session.commit()
-            return result.scalars().all()
-        except Exception as e:
-            logger.error("Error while create address book entry %r", e)
+            result = await session.execute(insert_address_book_entries,
+                                           execution_options={"populate_existing": True})
+            entries.extend(result.scalars().all())
+        await session.commit()
+    remember_address_book_titles(address_book_values)
+    watchlist.set_address_book_active(address_book_id, True)
+    for entry in entries:
+        watchlist.put(entry)
+    return entries
+
+
+ADDRESS_BOOK_ENTRY_QUERY = select(AddressBookEntry).where(*ADDRESS_BOOK_ENTRY_KEY)
 
 
 async def check_address_book_entry(session: async_sessionmaker,
                                    address_book_id: int,
                                    account_address: str,
                                    account_type_id: str) -> Optional[AddressBookEntry]:
-    statement = select(AddressBookEntry).where(
-        AddressBookEntry.address_book_id == address_book_id,
-        AddressBookEntry.account_address == account_address,
-        AddressBookEntry.account_type_id == account_type_id)
     async with session() as session:
-        result: Result = await session.execute(statement)
+        result: Result = await session.execute(ADDRESS_BOOK_ENTRY_QUERY,
+                                               dict(address_book_id=address_book_id,
+                                                    account_address=account_address,
+                                                    account_type_id=account_type_id))
         return result.scalars().one_or_none()
 
 
 async def ensure_persist_at_db(db_session: async_sessionmaker,
                                accounts: List[Account],
-                               message: Message) -> Optional[List[AddressBookEntry]]:
+                               message: Message) -> List[AddressBookEntry]:
     address_book_id = message.chat.id
     address_book_title = message.from_user.full_name if message.chat.type == "private" else message.chat.title
     return await compose_address_book_entries(session=db_session,
@@ -157,28 +243,132 @@ async def ensure_persist_at_db(db_session: async_sessionmaker,
                                               accounts=accounts)
 
 
+ADDRESS_BOOK_ENTRIES_QUERY = select(AddressBookEntry).where(
+    AddressBookEntry.address_book_id == bindparam("address_book_id")
+).order_by(AddressBookEntry.account_alias).options(ADDRESS_BOOK_ENTRY_ACCOUNT)
+
+
 async def get_address_book_entries(session: async_sessionmaker,
                                    address_book_id: int) -> Sequence[AddressBookEntry] | None:
-    statement = select(AddressBookEntry).where(AddressBookEntry.address_book_id == address_book_id)
-    statement = statement.order_by(AddressBookEntry.account_alias)
-    statement = statement.options(joinedload(AddressBookEntry.account,
-                                             innerjoin=True).joinedload(Account.account_type, innerjoin=True))
     async with session() as session:
-        result: Result = await session.execute(statement)
+        result: Result = await session.execute(ADDRESS_BOOK_ENTRIES_QUERY, dict(address_book_id=address_book_id))
         return result.scalars().all()
 
 
+"""
+Address book pages are read by keyset (account_alias, account_address, account_type_id),
+only columns needed to render the list are selected.
+"""
+ADDRESS_BOOK_PAGE_KEY = (AddressBookEntry.account_alias, AddressBookEntry.account_address,
+                         AddressBookEntry.account_type_id)
+ADDRESS_BOOK_PAGE_QUERY = select(
+    *ADDRESS_BOOK_PAGE_KEY,
+    Account.native_balance, Account.token_balance, AccountType.native_unit, AccountType.token_unit
+).join(
+    Account, and_(Account.address == AddressBookEntry.account_address,
+                  Account.account_type_id == AddressBookEntry.account_type_id)
+).join(
+    AccountType, AccountType.id == AddressBookEntry.account_type_id
+).where(
+    AddressBookEntry.address_book_id == bindparam("address_book_id")
+).order_by(*ADDRESS_BOOK_PAGE_KEY).limit(bindparam("limit"))
+ADDRESS_BOOK_PAGE_AFTER_QUERY = ADDRESS_BOOK_PAGE_QUERY.where(
+    tuple_(*ADDRESS_BOOK_PAGE_KEY) > tuple_(bindparam("after_alias"), bindparam("after_address"),
+                                            bindparam("after_type"))
+)
+COUNT_ADDRESS_BOOK_ENTRIES_QUERY = select(func.count()).select_from(AddressBookEntry).where(
+    AddressBookEntry.address_book_id == bindparam("address_book_id"))
+
+
+async def get_address_book_page(session: async_sessionmaker,
+                                address_book_id: int,
+                                limit: int,
+                                after: Optional[Sequence[str]] = None) -> Sequence[Row]:
+    """
+    :param after: (account_alias, account_address, account_type_id) of the last row of the previous page
+    :return: rows of account_alias, account_address, account_type_id, native_balance, token_balance,
+    native_unit, token_unit
+    """
+    params = dict(address_book_id=address_book_id, limit=limit)
+    async with session() as session:
+        if after:
+            after_alias, after_address, after_type = after
+            result: Result = await session.execute(ADDRESS_BOOK_PAGE_AFTER_QUERY,
+                                                   dict(params, after_alias=after_alias,
+                                                        after_address=after_address, after_type=after_type))
+        else:
+            result: Result = await session.execute(ADDRESS_BOOK_PAGE_QUERY, params)
+        return result.all()
+
+
+async def count_address_book_entries(session: async_sessionmaker, address_book_id: int) -> int:
+    async with session() as session:
+        result: Result = await session.execute(COUNT_ADDRESS_BOOK_ENTRIES_QUERY,
+                                               dict(address_book_id=address_book_id))
+        return result.scalar_one()
+
+
+TRACKED_ADDRESS_BOOK_ENTRIES_QUERY = select(AddressBookEntry).join(
+    AddressBook, AddressBook.id == AddressBookEntry.address_book_id
+).where(AddressBook.is_active.is_(True),
+        or_(AddressBookEntry.track_native.is_(True), AddressBookEntry.track_token.is_(True))
+        ).options(ADDRESS_BOOK_ENTRY_ACCOUNT)
+
+
+async def get_tracked_address_book_entries(session: async_sessionmaker) -> Sequence[AddressBookEntry]:
+    async with session() as session:
+        result: Result = await session.execute(TRACKED_ADDRESS_BOOK_ENTRIES_QUERY)
+        return result.scalars().all()
+
+
+ADDRESS_BOOK_ACCOUNT_KEYS_QUERY = select(AddressBookEntry.account_address, AddressBookEntry.account_type_id).distinct()
+
+
+async def get_address_book_account_keys(session: async_sessionmaker) -> Sequence[Row]:
+    async with session() as session:
+        result: Result = await session.execute(ADDRESS_BOOK_ACCOUNT_KEYS_QUERY)
+        return result.all()
+
+
+WATCHLIST_ENTRIES_QUERY = select(AddressBookEntry.address_book_id,
+                                 AddressBookEntry.account_address,
+                                 AddressBookEntry.account_type_id,
+                                 AddressBookEntry.account_alias,
+                                 AddressBookEntry.track_native,
+                                 AddressBookEntry.native_threshold,
+                                 AddressBookEntry.track_token,
+                                 AddressBookEntry.token_threshold,
+                                 AddressBookEntry.schedule)
+INACTIVE_ADDRESS_BOOKS_QUERY = select(AddressBook.id).where(AddressBook.is_active.is_(False))
+
+
+async def load_watchlist(session: async_sessionmaker) -> int:
+    """
+    Fill the watchlist index from the address book entries, entries are read as plain rows, not ORM objects.
+    :return: Count of loaded entries
+    """
+    async with session() as session:
+        entries: Result = await session.execute(WATCHLIST_ENTRIES_QUERY)
+        inactive: Result = await session.execute(INACTIVE_ADDRESS_BOOKS_QUERY)
+        account_types: Result = await session.execute(select(AccountType))
+        watchlist.load(entries=entries, inactive_address_books=inactive.scalars(),
+                       account_types=account_types.scalars().all())
+    return len(watchlist)
+
+
+ADDRESS_BOOK_ENTRY_WITH_ACCOUNT_QUERY = select(AddressBookEntry).where(*ADDRESS_BOOK_ENTRY_KEY
+                                                                       ).options(ADDRESS_BOOK_ENTRY_ACCOUNT)
+
+
 async def get_address_book_entry_from_db(session: async_sessionmaker,
                                          address_book_id: int,
                                          account_address: str,
                                          account_type_id: str) -> Optional[AddressBookEntry]:
-    statement = select(AddressBookEntry).where(AddressBookEntry.address_book_id == address_book_id,
-                                               AddressBookEntry.account_address == account_address,
-                                               AddressBookEntry.account_type_id == account_type_id)
-    statement = statement.options(joinedload(AddressBookEntry.account,
-                                             innerjoin=True).joinedload(Account.account_type, innerjoin=True))
     async with session() as session:
-        result: Result = await session.execute(statement)
+        result: Result = await session.execute(ADDRESS_BOOK_ENTRY_WITH_ACCOUNT_QUERY,
+                                               dict(address_book_id=address_book_id,
+                                                    account_address=account_address,
+                                                    account_type_id=account_type_id))
         return result.scalars().one_or_none()
 
 
@@ -195,21 +385,27 @@ async def update_address_book_entry(session: async_sessionmaker,
     async with session() as session:
         result: Result = await session.execute(statement)
         await session.commit()
-        return result.scalars().one_or_none()
+        if entry := result.scalars().one_or_none():
+            watchlist.put(entry)
+        return entry
+
+
+DELETE_ADDRESS_BOOK_ENTRY_QUERY = delete(AddressBookEntry).where(*ADDRESS_BOOK_ENTRY_KEY).returning(AddressBookEntry)
 
 
 async def delete_entry(session: async_sessionmaker,
                        address_book_id: int,
                        account_address: str,
                        account_type_id: str) -> Optional[AddressBookEntry]:
-    statement = delete(AddressBookEntry).where(AddressBookEntry.address_book_id == address_book_id,
-                                               AddressBookEntry.account_address == account_address,
-                                               AddressBookEntry.account_type_id == account_type_id)
-    statement = statement.returning(AddressBookEntry)
     async with session() as session:
-        result: Result = await session.execute(statement)
+        result: Result = await session.execute(DELETE_ADDRESS_BOOK_ENTRY_QUERY,
+                                               dict(address_book_id=address_book_id,
+                                                    account_address=account_address,
+                                                    account_type_id=account_type_id))
         await session.commit()
-        return result.scalars().one_or_none()
+        if entry := result.scalars().one_or_none():
+            watchlist.remove(address_book_id, account_address, account_type_id)
+        return entry
 
 
 async def update_address_book(session: async_sessionmaker,
@@ -221,54 +417,200 @@ async def update_address_book(session: async_sessionmaker,
     async with session() as session:
         result: Result = await session.execute(statement)
         await session.commit()
-        return result.scalars().one_or_none()
+        remember_address_book_titles({"id": address_book_id, **values})
+        if (address_book := result.scalars().one_or_none()) and "is_active" in values:
+            watchlist.set_address_book_active(address_book_id, address_book.is_active)
+        return address_book
+
+
+UPDATE_ADDRESS_BOOK_TITLE_QUERY = update(AddressBook).where(AddressBook.id == bindparam("b_address_book_id")
+                                                            ).values(title=bindparam("b_title"))
+
+
+async def edit_address_book_entry(session: async_sessionmaker,
+                                  address_book_id: int,
+                                  account_address: str,
+                                  account_type_id: str,
+                                  values: dict,
+                                  address_book_title: Optional[str] = None) -> Optional[AddressBookEntry]:
+    """
+    Update the entry and refresh the address book title in one transaction,
+    the title is written only if it differs from the last written one.
+    """
+    refresh_title = address_book_title is not None and address_book_titles.get(address_book_id) != address_book_title
+    async with session() as session:
+        if values:
+            statement = update(AddressBookEntry).where(AddressBookEntry.address_book_id == address_book_id,
+                                                       AddressBookEntry.account_address == account_address,
+                                                       AddressBookEntry.account_type_id == account_type_id)
+            result: Result = await session.execute(statement.values(values).returning(AddressBookEntry))
+        else:
+            result: Result = await session.execute(ADDRESS_BOOK_ENTRY_QUERY,
+                                                   dict(address_book_id=address_book_id,
+                                                        account_address=account_address,
+                                                        account_type_id=account_type_id))
+        entry = result.scalars().one_or_none()
+        if refresh_title:
+            await session.execute(UPDATE_ADDRESS_BOOK_TITLE_QUERY,
+                                  dict(b_address_book_id=address_book_id, b_title=address_book_title))
+        await session.commit()
+    if refresh_title:
+        address_book_titles[address_book_id] = address_book_title
+    if entry and values:
+        watchlist.put(entry)
+    return entry
+
+
+ACCOUNT_QUERY = select(Account).where(Account.address == bindparam("address"),
+                                      Account.account_type_id == bindparam("account_type_id"))
 
 
 async def read_account(session: async_sessionmaker, address: str, account_type_id: str) -> Optional[Account]:
-    statement = select(Account).where(Account.address == address, Account.account_type_id == account_type_id)
     async with session() as session:
-        result: Result = await session.execute(statement)
+        result: Result = await session.execute(ACCOUNT_QUERY, dict(address=address, account_type_id=account_type_id))
         return result.scalars().one_or_none()
 
 
-def get_last_account_statement_query(account_address: str, account_type_id: str) -> Select:
-    cte_max_timestamp = select(func.max(AccountStatement.timestamp).label("timestamp"))
-    cte_max_timestamp = cte_max_timestamp.where(AccountStatement.account_address == account_address,
-                                                AccountStatement.account_type_id == account_type_id)
-    cte_max_timestamp = cte_max_timestamp.cte("last_timestamp")
-    return select(AccountStatement).where(AccountStatement.account_address == account_address,
-                                          AccountStatement.account_type_id == account_type_id,
-                                          AccountStatement.timestamp == cte_max_timestamp.c.timestamp)
+ACCOUNTS_QUERY = select(Account).where(tuple_(Account.address,
+                                              Account.account_type_id).in_(bindparam("keys", expanding=True)))
+
+
+async def read_accounts(session: async_sessionmaker,
+                        keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Account]:
+    """
+    :param keys: (address, account_type_id) pairs, read by one query per SYNC_LOOKUP_CHUNK accounts
+    :return: stored accounts by key
+    """
+    accounts = {}
+    async with session() as session:
+        for i in range(0, len(keys), SYNC_LOOKUP_CHUNK):
+            result: Result = await session.execute(ACCOUNTS_QUERY, dict(keys=keys[i:i + SYNC_LOOKUP_CHUNK]))
+            accounts.update({(account.address, account.account_type_id): account
+                             for account in result.scalars().all()})
+    return accounts
+
+
+LAST_ACCOUNT_STATEMENT_QUERY = select(AccountLatestStatement).where(
+    AccountLatestStatement.account_address == bindparam("account_address"),
+    AccountLatestStatement.account_type_id == bindparam("account_type_id"))
+"""
+Last statements of many accounts at once, `keys` are (account_address, account_type_id) pairs.
+"""
+LAST_ACCOUNT_STATEMENTS_QUERY = select(AccountLatestStatement).where(
+    tuple_(AccountLatestStatement.account_address,
+           AccountLatestStatement.account_type_id).in_(bindparam("keys", expanding=True)))
+
+
+def get_upsert_account_latest_statement_query(insert: InsertConstruct) -> Insert:
+    insert_statement = insert(AccountLatestStatement)
+    return insert_statement.on_conflict_do_update(
+        index_elements=["account_address", "account_type_id"],
+        set_=dict(timestamp=insert_statement.excluded.timestamp,
+                  native_balance=insert_statement.excluded.native_balance,
+                  token_balance=insert_statement.excluded.token_balance))
+
+
+UPSERT_ACCOUNT_LATEST_STATEMENTS_QUERY = DialectStatement(get_upsert_account_latest_statement_query)
+
+
+async def init_account_latest_statements(session: async_sessionmaker) -> int:
+    """
+    Fill the latest statements from the statement history once, when the table is added to an existing database.
+    :return: Count of filled accounts
+    """
+    async with session() as session:
+        if (await session.execute(select(AccountLatestStatement.account_address).limit(1))).first():
+            return 0
+        last_timestamps = select(AccountStatement.account_address,
+                                 AccountStatement.account_type_id,
+                                 func.max(AccountStatement.timestamp).label("timestamp"))
+        last_timestamps = last_timestamps.group_by(AccountStatement.account_address, AccountStatement.account_type_id)
+        last_timestamps = last_timestamps.subquery("last_timestamp")
+        last_statements = select(AccountStatement.account_address,
+                                 AccountStatement.account_type_id,
+                                 AccountStatement.timestamp,
+                                 AccountStatement.native_balance,
+                                 AccountStatement.token_balance)
+        last_statements = last_statements.join(
+            last_timestamps, and_(AccountStatement.account_address == last_timestamps.c.account_address,
+                                  AccountStatement.account_type_id == last_timestamps.c.account_type_id,
+                                  AccountStatement.timestamp == last_timestamps.c.timestamp))
+        result: Result = await session.execute(
+            generic_insert(AccountLatestStatement).from_select(["account_address", "account_type_id", "timestamp",
+                                                        "native_balance", "token_balance"], last_statements))
+        await session.commit()
+        if result.rowcount:
+            logger.info("Latest statements of %d account(s) filled from the statement history", result.rowcount)
+        return result.rowcount
+
+
+def get_update_account_statement_query() -> Update:
+    """
+    Move the last statement to the new timestamp and balances, to be executed with a list of parameters.
+    """
+    table = AccountStatement.__table__
+    return update(table).where(table.c.account_address == bindparam("b_account_address"),
+                               table.c.account_type_id == bindparam("b_account_type_id"),
+                               table.c.timestamp == bindparam("b_timestamp")
+                               ).values(timestamp=bindparam("b_new_timestamp"),
+                                        native_balance=bindparam("b_native_balance"),
+                                        token_balance=bindparam("b_token_balance"))
+
+
+UPDATE_ACCOUNT_STATEMENTS_QUERY = get_update_account_statement_query()
 
 
-def get_actual_tx(tx_type: str, account_tx: List[APIAccountTransaction], old_amount: int,
+def get_actual_tx(tx_type: str, account_tx: List[APIAccountTransaction],
                   account: Account) -> Optional[List[dict] | List]:
     if tx_type not in ("native", "token"):
         return
 
-    op_sum = 0
-    values = []
-    for tx in account_tx:
-        op_sum += tx.amount if tx.to_address == account.address else -tx.amount
-        values.append({"tx_type": tx_type,
-                       "from_address": tx.from_address,
-                       "from_account_type": account.account_type_id,
-                       "to_address": tx.to_address,
-                       "to_account_type": account.account_type_id,
-                       "tx_timestamp": tx.timestamp,
-                       "tx_amount": tx.amount})
-        if old_amount + op_sum == account.token_balance:
-            break
-    return values if len(values) else []
+    return [{"tx_type": tx_type,
+             "from_address": tx.from_address,
+             "from_account_type": account.account_type_id,
+             "to_address": tx.to_address,
+             "to_account_type": account.account_type_id,
+             "tx_timestamp": tx.timestamp,
+             "tx_amount": tx.amount} for tx in account_tx]
+
+
+ACCOUNT_SYNC_CURSORS_QUERY = select(AccountSyncCursor).where(
+    AccountSyncCursor.account_address == bindparam("address"),
+    AccountSyncCursor.account_type_id == bindparam("account_type_id"))
+
+
+async def get_account_sync_cursors(session: async_sessionmaker,
+                                   address: str,
+                                   account_type_id: str) -> dict[str, APISyncCursor]:
+    async with session() as session:
+        result: Result = await session.execute(ACCOUNT_SYNC_CURSORS_QUERY,
+                                               dict(address=address, account_type_id=account_type_id))
+        return {cursor.tx_type: APISyncCursor(
+            block_number=cursor.last_block,
+            timestamp=cursor.last_timestamp.replace(tzinfo=datetime.timezone.utc)
+            if cursor.last_timestamp and not cursor.last_timestamp.tzinfo else cursor.last_timestamp,
+            fingerprint=cursor.fingerprint) for cursor in result.scalars().all()}
+
+
+def get_upsert_account_sync_cursor_query(insert: InsertConstruct) -> Insert:
+    insert_statement = insert(AccountSyncCursor)
+    return insert_statement.on_conflict_do_update(
+        index_elements=["account_address", "account_type_id", "tx_type"],
+        set_=dict(last_block=insert_statement.excluded.last_block,
+                  last_timestamp=insert_statement.excluded.last_timestamp,
+                  fingerprint=insert_statement.excluded.fingerprint,
+                  updated_at=insert_statement.excluded.updated_at))
+
+
+UPSERT_ACCOUNT_SYNC_CURSORS_QUERY = DialectStatement(get_upsert_account_sync_cursor_query)
 
 
 async def get_last_account_statement(session: async_sessionmaker,
                                      address: str,
-                                     account_type_id: str) -> Optional[AccountStatement]:
+                                     account_type_id: str) -> Optional[AccountLatestStatement]:
     async with session() as session:
         result: Result = await session.execute(
-            get_last_account_statement_query(account_address=address,
-                                             account_type_id=account_type_id))
+            LAST_ACCOUNT_STATEMENT_QUERY, dict(account_address=address, account_type_id=account_type_id))
     return result.scalars().one_or_none()
 
 
@@ -278,65 +620,228 @@ def get_account_addresses_from_tx(account_tx: List[APIAccountTransaction],
     for tx in account_tx:
         addresses.add(tx.from_address)
         addresses.add(tx.to_address)
-    addresses.remove(account.address)
+    addresses.discard(account.address)
     return [{"address": address,
              "account_type_id": account.account_type_id} for address in addresses]
 
 
+INSERT_ACCOUNT_STATEMENTS_QUERY = generic_insert(AccountStatement)
+INSERT_COUNTERPARTY_ACCOUNTS_QUERY = DialectStatement(lambda insert: insert(Account).on_conflict_do_nothing())
+INSERT_ACCOUNT_TRANSACTIONS_QUERY = DialectStatement(
+    lambda insert: insert(AccountTransaction).on_conflict_do_nothing())
+
+
+async def sync_db_accounts(session: async_sessionmaker, syncs: List[AccountSync]) -> int:
+    """
+    Write refresh results of many accounts in one transaction: last statements are read by one query
+    per SYNC_LOOKUP_CHUNK accounts, every kind of row is written by one executemany statement.
+    A statement row is moved forward while the balances are unchanged since it, a new one is added otherwise,
+    the latest statement copy follows it.
+    :return: Count of synced accounts
+    """
+    if not syncs:
+        return 0
+    op_timestamp = datetime.datetime.now()
+    account_values, statement_updates, statement_inserts, latest_values, cursor_values = [], [], [], [], []
+    counterparty_values: Dict[Tuple[str, str], dict] = {}
+    tx_values = []
+    async with session() as session:
+        keys = [(sync.net_account.address, sync.net_account.account_type_id) for sync in syncs]
+        last_statements = {}
+        for i in range(0, len(keys), SYNC_LOOKUP_CHUNK):
+            result: Result = await session.execute(LAST_ACCOUNT_STATEMENTS_QUERY,
+                                                   dict(keys=keys[i:i + SYNC_LOOKUP_CHUNK]))
+            last_statements.update({(statement.account_address, statement.account_type_id): statement
+                                    for statement in result.scalars().all()})
+
+        for key, sync in zip(keys, syncs):
+            db_account, net_account = sync.db_account, sync.net_account
+            account_values.append(dict(address=net_account.address,
+                                       account_type_id=net_account.account_type_id,
+                                       native_balance=net_account.native_balance,
+                                       token_balance=net_account.token_balance,
+                                       updated_at=op_timestamp))
+            last_statement = last_statements.get(key)
+            if last_statement and db_account and (
+                    last_statement.token_balance == db_account.token_balance and
+                    last_statement.native_balance == db_account.native_balance):
+                statement_updates.append(dict(b_account_address=last_statement.account_address,
+                                              b_account_type_id=last_statement.account_type_id,
+                                              b_timestamp=last_statement.timestamp,
+                                              b_new_timestamp=op_timestamp,
+                                              b_native_balance=net_account.native_balance,
+                                              b_token_balance=net_account.token_balance))
+            else:
+                statement_inserts.append(dict(account_address=net_account.address,
+                                              account_type_id=net_account.account_type_id,
+                                              timestamp=op_timestamp,
+                                              native_balance=net_account.native_balance,
+                                              token_balance=net_account.token_balance))
+            latest_values.append(dict(account_address=net_account.address,
+                                      account_type_id=net_account.account_type_id,
+                                      timestamp=op_timestamp,
+                                      native_balance=net_account.native_balance,
+                                      token_balance=net_account.token_balance))
+            for tx_type, account_tx in sync.tx.items():
+                if not account_tx:
+                    continue
+                tx_values.extend(get_actual_tx(tx_type=tx_type, account_tx=account_tx, account=net_account) or [])
+                counterparty_values.update({(values["address"], values["account_type_id"]): values
+                                            for values in get_account_addresses_from_tx(account_tx=account_tx,
+                                                                                        account=net_account)})
+            cursor_values.extend(dict(account_address=net_account.address,
+                                      account_type_id=net_account.account_type_id,
+                                      tx_type=tx_type,
+                                      last_block=cursor.block_number,
+                                      last_timestamp=cursor.timestamp,
+                                      fingerprint=cursor.fingerprint,
+                                      updated_at=op_timestamp) for tx_type, cursor in sync.cursors.items())
+
+        await session.execute(UPSERT_ACCOUNTS_QUERY(session), account_values)
+        if statement_updates:
+            await session.execute(UPDATE_ACCOUNT_STATEMENTS_QUERY, statement_updates)
+        if statement_inserts:
+            await session.execute(INSERT_ACCOUNT_STATEMENTS_QUERY, statement_inserts)
+        await session.execute(UPSERT_ACCOUNT_LATEST_STATEMENTS_QUERY(session), latest_values)
+        if counterparty_values:
+            await session.execute(INSERT_COUNTERPARTY_ACCOUNTS_QUERY(session), list(counterparty_values.values()))
+        if tx_values:
+            await session.execute(INSERT_ACCOUNT_TRANSACTIONS_QUERY(session), tx_values)
+        if cursor_values:
+            await session.execute(UPSERT_ACCOUNT_SYNC_CURSORS_QUERY(session), cursor_values)
+        await session.commit()
+    return len(syncs)
+
+
 async def sync_db_account(session: async_sessionmaker,
-                          db_account: Account,
+                          db_account: Optional[Account],
                           net_account: Account,
-                          tx: dict) -> Optional[Account]:
+                          tx: Dict[str, List[APIAccountTransaction]],
+                          cursors: Optional[Dict[str, APISyncCursor]] = None) -> None:
+    """
+    :param tx: transactions by tx_type
+    :param cursors: sync cursors by tx_type pointing after the transactions in `tx`
+    """
+    await sync_db_accounts(session=session, syncs=[AccountSync(db_account=db_account,
+                                                               net_account=net_account,
+                                                               tx=tx,
+                                                               cursors=cursors or {})])
+
+
+ACCOUNT_BACKFILL_QUERY = select(AccountBackfill).where(AccountBackfill.account_address == bindparam("address"),
+                                                       AccountBackfill.account_type_id == bindparam("account_type_id"),
+                                                       AccountBackfill.tx_type == bindparam("tx_type"))
+
+
+CHAIN_SCAN_CURSOR_QUERY = select(ChainScanCursor.last_block).where(
+    ChainScanCursor.account_type_id == bindparam("account_type_id"))
+
+
+ALERT_STATES_QUERY = select(AccountAlertState).where(
+    tuple_(AccountAlertState.account_address,
+           AccountAlertState.account_type_id).in_(bindparam("keys", expanding=True)))
+
+
+def get_upsert_alert_state_query(insert: InsertConstruct) -> Insert:
+    insert_statement = insert(AccountAlertState)
+    return insert_statement.on_conflict_do_update(
+        index_elements=["account_address", "account_type_id"],
+        set_=dict(native_balance=insert_statement.excluded.native_balance,
+                  token_balance=insert_statement.excluded.token_balance,
+                  updated_at=insert_statement.excluded.updated_at))
+
+
+UPSERT_ALERT_STATES_QUERY = DialectStatement(get_upsert_alert_state_query)
+
+
+async def advance_alert_states(session: async_sessionmaker,
+                               accounts: List[Account]) -> Dict[Tuple[str, str], AccountAlertState]:
+    """
+    Move the alert states of the accounts to their balances in one transaction.
+    :return: previous alert states by (address, account_type_id), accounts never evaluated are missing
+    """
     op_timestamp = datetime.datetime.now()
-    last_account_statement = await get_last_account_statement(session=session,
-                                                              address=net_account.address,
-                                                              account_type_id=net_account.account_type_id)
-
-    if last_account_statement and (
-            last_account_statement.token_balance == db_account.token_balance and
-            last_account_statement.native_balance == db_account.native_balance):
-        upsert_account_statement_query = update(AccountStatement
-                                                ).where(
-            AccountStatement.account_address == last_account_statement.account_address,
-            AccountStatement.account_type_id == last_account_statement.account_type_id,
-            AccountStatement.timestamp == last_account_statement.timestamp)
-        upsert_account_statement_query = upsert_account_statement_query.values(
-            dict(timestamp=op_timestamp,
-                 native_balance=net_account.native_balance,
-                 token_balance=net_account.token_balance))
-    else:
-        upsert_account_statement_query = insert(
-            AccountStatement).values(dict(account_address=net_account.address,
-                                          account_type_id=net_account.account_type_id,
-                                          timestamp=op_timestamp,
-                                          native_balance=net_account.native_balance,
-                                          token_balance=net_account.token_balance))
+    keys = [(account.address, account.account_type_id) for account in accounts]
+    previous = {}
+    async with session() as session:
+        for i in range(0, len(keys), SYNC_LOOKUP_CHUNK):
+            result: Result = await session.execute(ALERT_STATES_QUERY, dict(keys=keys[i:i + SYNC_LOOKUP_CHUNK]))
+            previous.update({(state.account_address, state.account_type_id): state
+                             for state in result.scalars().all()})
+        await session.execute(UPSERT_ALERT_STATES_QUERY(session),
+                              [dict(account_address=account.address,
+                                    account_type_id=account.account_type_id,
+                                    native_balance=account.native_balance,
+                                    token_balance=account.token_balance,
+                                    updated_at=op_timestamp) for account in accounts])
+        await session.commit()
+    return previous
 
+
+async def get_chain_scan_cursor(session: async_sessionmaker, account_type_id: str) -> Optional[int]:
+    """
+    :return: last block scanned by the block watcher, None if the chain was never scanned
+    """
     async with session() as session:
-        result: Result = await session.execute(get_upsert_account_query(
-            dict(address=net_account.address,
-                 account_type_id=net_account.account_type_id,
-                 native_balance=net_account.native_balance,
-                 token_balance=net_account.token_balance,
-                 updated_at=op_timestamp)))
-        updated_account: Account = result.scalars().one()
-        await session.execute(upsert_account_statement_query)
-
-        for tx_type, t in tx.items():
-            if not t:
-                continue
-            tx_list = list(t)
-            actual_tx_values = get_actual_tx(tx_type=tx_type,
-                                             account_tx=tx_list,
-                                             old_amount=db_account.token_balance if db_account else 0,
-                                             account=net_account)
-            account_addresses = get_account_addresses_from_tx(account_tx=tx_list, account=net_account)
-            if len(account_addresses):
-                await session.execute(insert(Account).values(account_addresses).on_conflict_do_nothing())
-            if len(actual_tx_values):
-                insert_statement = insert(AccountTransaction).values(actual_tx_values).on_conflict_do_nothing()
-                await session.execute(insert_statement)
+        result: Result = await session.execute(CHAIN_SCAN_CURSOR_QUERY, dict(account_type_id=account_type_id))
+        return result.scalar_one_or_none()
 
+
+async def save_chain_scan_cursor(session: async_sessionmaker, account_type_id: str, last_block: int) -> None:
+    async with session() as session:
+        insert_statement = get_insert(session)(ChainScanCursor).values(account_type_id=account_type_id,
+                                                                       last_block=last_block,
+                                                                       updated_at=datetime.datetime.now())
+        insert_statement = insert_statement.on_conflict_do_update(
+            index_elements=["account_type_id"],
+            set_=dict(last_block=insert_statement.excluded.last_block,
+                      updated_at=insert_statement.excluded.updated_at))
+        await session.execute(insert_statement)
         await session.commit()
 
-    return updated_account
+
+async def get_account_backfill(session: async_sessionmaker,
+                               address: str,
+                               account_type_id: str,
+                               tx_type: str) -> Optional[AccountBackfill]:
+    async with session() as session:
+        result: Result = await session.execute(ACCOUNT_BACKFILL_QUERY,
+                                               dict(address=address, account_type_id=account_type_id, tx_type=tx_type))
+        return result.scalars().one_or_none()
+
+
+async def save_backfill_page(session: async_sessionmaker,
+                             account: Account,
+                             tx_type: str,
+                             account_tx: List[APIAccountTransaction],
+                             cursor: Optional[str],
+                             tx_count: int) -> None:
+    """
+    Store one history page and the checkpoint after it in one transaction.
+    Rows are sent as executemany batches, the page is never rendered as one huge VALUES clause.
+    :param cursor: cursor of the next page, None when the history is exhausted
+    :param tx_count: count of transactions backfilled so far including this page
+    """
+    op_timestamp = datetime.datetime.now()
+    account_addresses = get_account_addresses_from_tx(account_tx=account_tx, account=account)
+    tx_values = get_actual_tx(tx_type=tx_type, account_tx=account_tx, account=account)
+    async with session() as session:
+        insert_backfill = get_insert(session)(AccountBackfill).values(dict(account_address=account.address,
+                                                                           account_type_id=account.account_type_id,
+                                                                           tx_type=tx_type,
+                                                                           cursor=cursor,
+                                                                           tx_count=tx_count,
+                                                                           is_done=cursor is None,
+                                                                           updated_at=op_timestamp))
+        insert_backfill = insert_backfill.on_conflict_do_update(
+            index_elements=["account_address", "account_type_id", "tx_type"],
+            set_=dict(cursor=insert_backfill.excluded.cursor,
+                      tx_count=insert_backfill.excluded.tx_count,
+                      is_done=insert_backfill.excluded.is_done,
+                      updated_at=insert_backfill.excluded.updated_at))
+        if account_addresses:
+            await session.execute(INSERT_COUNTERPARTY_ACCOUNTS_QUERY(session), account_addresses)
+        if tx_values:
+            await session.execute(INSERT_ACCOUNT_TRANSACTIONS_QUERY(session), tx_values)
+        await session.execute(insert_backfill)
+        await session.commit()
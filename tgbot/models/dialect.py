@@ -0,0 +1,47 @@
+"""
+Dialect specific statement constructs. The construct is taken from the dialect of the engine the session
+is bound to, so statements are built for the database they are executed on whatever the settings are.
+"""
+from typing import Callable, Dict, Generic, TypeVar
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+T = TypeVar("T")
+
+Insert = postgresql.Insert | sqlite.Insert
+InsertConstruct = Callable[..., Insert]
+INSERTS: Dict[str, InsertConstruct] = {"postgresql": postgresql.insert,
+                                       "sqlite": sqlite.insert}
+
+
+def is_postgresql(db_dialect: str) -> bool:
+    return db_dialect.startswith("postgresql")
+
+
+def get_dialect_name(session: AsyncSession) -> str:
+    return session.get_bind().dialect.name
+
+
+def get_insert(session: AsyncSession) -> InsertConstruct:
+    """
+    :return: insert construct with ON CONFLICT support of the session dialect
+    """
+    return INSERTS[get_dialect_name(session)]
+
+
+class DialectStatement(Generic[T]):
+    """
+    Prebuilt statement of every dialect, `build` makes the statement from the dialect insert construct
+    the first time the statement is taken for a session of that dialect.
+    """
+
+    def __init__(self, build: Callable[[InsertConstruct], T]) -> None:
+        self.__build = build
+        self.__statements: Dict[str, T] = {}
+
+    def __call__(self, session: AsyncSession) -> T:
+        dialect_name = get_dialect_name(session)
+        if (statement := self.__statements.get(dialect_name)) is None:
+            statement = self.__statements[dialect_name] = self.__build(INSERTS[dialect_name])
+        return statement
@@ -0,0 +1,172 @@
+import sys
+from typing import Dict, Tuple, Iterable, Iterator, Optional, Set, KeysView, Any
+
+from tgbot.models.addressbook import AccountType
+
+AccountKey = Tuple[str, str]
+
+
+class Subscription:
+    """
+    Address book entry as kept by the watchlist index: what a chat wants to know about an account.
+    """
+    __slots__ = ("address_book_id", "account_address", "account_type_id", "account_alias",
+                 "track_native", "native_threshold", "track_token", "token_threshold", "schedule")
+
+    def __init__(self,
+                 address_book_id: int,
+                 account_address: str,
+                 account_type_id: str,
+                 account_alias: str,
+                 track_native: bool,
+                 native_threshold: int,
+                 track_token: bool,
+                 token_threshold: int,
+                 schedule: int) -> None:
+        self.address_book_id = address_book_id
+        self.account_address = account_address
+        self.account_type_id = account_type_id
+        self.account_alias = account_alias
+        self.track_native = track_native
+        self.native_threshold = native_threshold
+        self.track_token = track_token
+        self.token_threshold = token_threshold
+        self.schedule = schedule
+
+    @classmethod
+    def from_entry(cls, entry: Any) -> "Subscription":
+        """
+        :param entry: AddressBookEntry or a row of its columns
+        """
+        return cls(address_book_id=entry.address_book_id,
+                   account_address=sys.intern(entry.account_address),
+                   account_type_id=sys.intern(entry.account_type_id),
+                   account_alias=entry.account_alias,
+                   track_native=bool(entry.track_native),
+                   native_threshold=entry.native_threshold,
+                   track_token=bool(entry.track_token),
+                   token_threshold=entry.token_threshold,
+                   schedule=entry.schedule)
+
+    @property
+    def is_tracked(self) -> bool:
+        return self.track_native or self.track_token
+
+    def replace(self, **changes: Any) -> "Subscription":
+        """
+        :return: copy of the subscription with the given fields changed
+        """
+        return Subscription(**{**{name: getattr(self, name) for name in self.__slots__}, **changes})
+
+    def __repr__(self) -> str:
+        return (f"Subscription(address_book_id={self.address_book_id!r}, "
+                f"account_address={self.account_address!r}, account_type_id={self.account_type_id!r})")
+
+
+class WatchlistIndex:
+    """
+    In-process index of all address book entries: subscriptions of every account by chain and address.
+
+    The index is loaded once at startup and then kept in step by the db_commands functions which write
+    entries, so the pollers find the subscribers of an account without a query. Addresses and chain ids
+    are interned, subscriptions of an account are kept in a tuple which is replaced on every change
+    together with the changed subscriptions, so nothing taken by a reader is ever modified under it.
+    """
+
+    def __init__(self) -> None:
+        self.__accounts: Dict[str, Dict[str, Tuple[Subscription, ...]]] = {}
+        self.__inactive_address_books: Set[int] = set()
+        self.__account_types: Dict[str, AccountType] = {}
+        self.__size = 0
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def load(self,
+             entries: Iterable[Any],
+             inactive_address_books: Iterable[int] = (),
+             account_types: Iterable[AccountType] = ()) -> None:
+        self.__accounts.clear()
+        self.__size = 0
+        self.__inactive_address_books = set(inactive_address_books)
+        self.__account_types = {account_type.id: account_type for account_type in account_types}
+        for entry in entries:
+            self.put(entry)
+
+    def account_type(self, account_type_id: str) -> Optional[AccountType]:
+        return self.__account_types.get(account_type_id)
+
+    def put(self, entry: Any) -> Subscription:
+        """
+        Add the entry or replace the stored subscription of its address book.
+        """
+        subscription = Subscription.from_entry(entry)
+        chain = self.__accounts.setdefault(subscription.account_type_id, {})
+        subscriptions = chain.get(subscription.account_address, ())
+        kept = tuple(stored for stored in subscriptions if stored.address_book_id != subscription.address_book_id)
+        self.__size += 1 + len(kept) - len(subscriptions)
+        chain[subscription.account_address] = kept + (subscription,)
+        return subscription
+
+    def remove(self, address_book_id: int, account_address: str, account_type_id: str) -> None:
+        if not (chain := self.__accounts.get(account_type_id)):
+            return
+        subscriptions = chain.get(account_address, ())
+        kept = tuple(stored for stored in subscriptions if stored.address_book_id != address_book_id)
+        self.__size -= len(subscriptions) - len(kept)
+        if kept:
+            chain[account_address] = kept
+        else:
+            chain.pop(account_address, None)
+
+    def move_address_book(self, old_id: int, new_id: int) -> None:
+        """
+        Chat migration, every subscription of the old chat goes to the new one. Scans the whole index.
+        """
+        for chain in self.__accounts.values():
+            for account_address, subscriptions in chain.items():
+                if any(subscription.address_book_id == old_id for subscription in subscriptions):
+                    chain[account_address] = tuple(subscription.replace(address_book_id=new_id)
+                                                   if subscription.address_book_id == old_id else subscription
+                                                   for subscription in subscriptions)
+        if old_id in self.__inactive_address_books:
+            self.__inactive_address_books.discard(old_id)
+            self.__inactive_address_books.add(new_id)
+
+    def set_address_book_active(self, address_book_id: int, is_active: bool) -> None:
+        if is_active:
+            self.__inactive_address_books.discard(address_book_id)
+        else:
+            self.__inactive_address_books.add(address_book_id)
+
+    def subscribers(self, account_address: str, account_type_id: str) -> Tuple[Subscription, ...]:
+        """
+        :return: subscriptions of the active address books to the account
+        """
+        subscriptions = self.__accounts.get(account_type_id, {}).get(account_address, ())
+        if not self.__inactive_address_books:
+            return subscriptions
+        return tuple(subscription for subscription in subscriptions
+                     if subscription.address_book_id not in self.__inactive_address_books)
+
+    def addresses(self, account_type_id: str) -> KeysView[str]:
+        """
+        :return: live view of the addresses of the chain which are in any address book
+        """
+        return self.__accounts.get(account_type_id, {}).keys()
+
+    def tracked(self) -> Iterator[Subscription]:
+        """
+        Subscriptions of the active address books tracking a balance, as TRACKED_ADDRESS_BOOK_ENTRIES_QUERY.
+        """
+        for chain in list(self.__accounts.values()):
+            for subscriptions in list(chain.values()):
+                for subscription in subscriptions:
+                    if subscription.is_tracked and subscription.address_book_id not in self.__inactive_address_books:
+                        yield subscription
+
+
+"""
+Index of the running bot, filled by db_commands.load_watchlist.
+"""
+watchlist = WatchlistIndex()
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+from typing import Dict, List, Tuple, Iterable
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from tgbot.models.addressbook import Account
+from tgbot.models.db_commands import read_account, get_account_backfill, save_backfill_page
+from tgbot.utils.net_accounts import AccountReaders, get_address_account_types, normalize_address
+
+logger = logging.getLogger(__name__)
+
+TX_TYPES = ("native", "token")
+
+
+async def backfill_account_history(db_session: async_sessionmaker,
+                                   readers: AccountReaders,
+                                   account: Account,
+                                   tx_type: str,
+                                   restart: bool = False) -> int:
+    """
+    Walk the account history page by page from the newest transaction to the oldest one.
+    Every page is stored together with the checkpoint, so an interrupted backfill resumes
+    from the last stored page and only one page is kept in memory.
+    :return: Count of backfilled transactions
+    """
+    if not (reader := readers.get(account.account_type_id)):
+        return 0
+    backfill = await get_account_backfill(session=db_session,
+                                          address=account.address,
+                                          account_type_id=account.account_type_id,
+                                          tx_type=tx_type)
+    if backfill and backfill.is_done and not restart:
+        return backfill.tx_count
+
+    cursor = backfill.cursor if backfill and not restart else None
+    tx_count = backfill.tx_count if backfill and not restart else 0
+    while True:
+        page = await reader.get_history_page(account.address, tx_type, cursor)
+        if not page:
+            logger.error("Backfill of %s %s %s transactions stopped at cursor %r",
+                         account.account_type_id, account.address, tx_type, cursor)
+            break
+        tx_count += len(page.transactions)
+        await save_backfill_page(session=db_session,
+                                 account=account,
+                                 tx_type=tx_type,
+                                 account_tx=page.transactions,
+                                 cursor=page.next_cursor,
+                                 tx_count=tx_count)
+        if not (cursor := page.next_cursor):
+            break
+    logger.info("Backfill of %s %s %s transactions: %d transaction(s)",
+                account.account_type_id, account.address, tx_type, tx_count)
+    return tx_count
+
+
+async def backfill_account(db_session: async_sessionmaker,
+                           readers: AccountReaders,
+                           address: str,
+                           account_type: str,
+                           restart: bool = False) -> Dict[str, int]:
+    """
+    :return: Count of backfilled transactions by tx_type
+    """
+    account = await read_account(session=db_session,
+                                 address=normalize_address(address, account_type),
+                                 account_type_id=account_type)
+    if not account:
+        logger.error("Account %s %s is not in the database", account_type, address)
+        return {}
+    return {tx_type: await backfill_account_history(db_session=db_session,
+                                                    readers=readers,
+                                                    account=account,
+                                                    tx_type=tx_type,
+                                                    restart=restart) for tx_type in TX_TYPES}
+
+
+async def backfill_accounts(db_session: async_sessionmaker,
+                            readers: AccountReaders,
+                            accounts: Iterable[Tuple[str, str]],
+                            concurrency: int = 4,
+                            restart: bool = False) -> Dict[Tuple[str, str], Dict[str, int]]:
+    """
+    Backfill accounts concurrently, requests are throttled by the readers key pools,
+    `concurrency` bounds the count of accounts (and pages) in flight.
+    :param accounts: (address, account_type) pairs, account_type may be None to backfill all matching chains
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    keys: List[Tuple[str, str]] = []
+    for address, account_type in accounts:
+        for key_type in [account_type] if account_type else get_address_account_types(address):
+            keys.append((address, key_type))
+
+    async def backfill(key: Tuple[str, str]) -> Dict[str, int]:
+        async with semaphore:
+            try:
+                return await backfill_account(db_session=db_session,
+                                              readers=readers,
+                                              address=key[0],
+                                              account_type=key[1],
+                                              restart=restart)
+            except Exception as e:
+                logger.error("Error while backfilling %s %s: %r", key[1], key[0], e)
+                return {}
+
+    results = await asyncio.gather(*(backfill(key) for key in keys))
+    return dict(zip(keys, results))
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Optional, Dict, List, Tuple, KeysView
+
+from aiogram import Bot
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from tgbot.config import Settings
+from tgbot.models.addressbook import Account
+from tgbot.models.db_commands import AccountSync, read_accounts, get_chain_scan_cursor, save_chain_scan_cursor
+from tgbot.models.watchlist import watchlist
+from tgbot.utils.net_accounts import AccountReaders, store_account_syncs, TX_STREAMS
+from tgbot.wallet_readers.account_readers import EvmRpcAccountReader, APIAccountTransaction, APISyncCursor
+
+logger = logging.getLogger(__name__)
+
+AccountKey = Tuple[str, str]
+
+
+class BlockWatcher:
+    """
+    Block-scanning ingestion of EVM chains read from a JSON-RPC node.
+
+    Every tick new confirmed blocks of every chain are read once: value transfers of the block transactions
+    and USDT Transfer logs are matched against the set of all addresses in address books, so the cost
+    follows the chain throughput instead of the watchlist size. Matched accounts get their transactions
+    stored and their balances re-read by one batch request, threshold alerts are sent by store_account_syncs
+    as for the balance poller. Addresses and subscribers are taken from the watchlist index.
+    A chain is scanned from the block it was first seen at.
+    """
+
+    def __init__(self,
+                 bot: Bot,
+                 db_session: async_sessionmaker,
+                 account_readers: AccountReaders,
+                 config: Settings,
+                 tick: Optional[float] = None,
+                 max_blocks: Optional[int] = None,
+                 confirmations: Optional[int] = None) -> None:
+        self.bot = bot
+        self.db_session = db_session
+        self.account_readers = account_readers
+        self.tick = tick or config.watcher_tick
+        self.max_blocks = max_blocks or config.watcher_max_blocks
+        self.confirmations = config.watcher_confirmations if confirmations is None else confirmations
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def account_types(self) -> List[str]:
+        """
+        Chains read from a JSON-RPC node, only they can be scanned by blocks.
+        """
+        return [account_type_id for account_type_id, reader in self.account_readers.items()
+                if isinstance(reader, EvmRpcAccountReader)]
+
+    @staticmethod
+    def get_watched_addresses(account_type_id: str) -> KeysView[str]:
+        return watchlist.addresses(account_type_id)
+
+    async def _build_syncs(self,
+                           reader: EvmRpcAccountReader,
+                           account_type_id: str,
+                           matched: Dict[str, Dict[str, List[APIAccountTransaction]]],
+                           last_block: int) -> List[AccountSync]:
+        addresses = list(matched)
+        db_accounts, balances = await asyncio.gather(
+            read_accounts(session=self.db_session, keys=[(address, account_type_id) for address in addresses]),
+            reader.get_accounts_data(addresses))
+        if missing := [address for address in addresses if address not in balances]:
+            raise RuntimeError(f"Balances of {len(missing)} {account_type_id} account(s) were not read")
+        return [AccountSync(db_account=db_accounts.get((address, account_type_id)),
+                            net_account=Account(address=address,
+                                                account_type=account_type_id,
+                                                native_balance=balances[address].native_balance,
+                                                token_balance=balances[address].token_balance),
+                            tx=dict(matched[address]),
+                            cursors={tx_type: APISyncCursor(block_number=last_block) for tx_type in TX_STREAMS})
+                for address in addresses]
+
+    async def scan_chain(self, account_type_id: str) -> int:
+        """
+        Scan up to `max_blocks` blocks after the chain cursor, the cursor is moved only after
+        the matched accounts are stored, so a failed range is scanned again.
+        :return: Count of matched transfers
+        """
+        reader: EvmRpcAccountReader = self.account_readers[account_type_id]
+        latest_block = await reader.get_block_number() - self.confirmations
+        last_block = await get_chain_scan_cursor(session=self.db_session, account_type_id=account_type_id)
+        if last_block is None:
+            await save_chain_scan_cursor(session=self.db_session, account_type_id=account_type_id,
+                                         last_block=latest_block)
+            return 0
+        if latest_block <= last_block:
+            return 0
+
+        from_block, to_block = last_block + 1, min(latest_block, last_block + self.max_blocks)
+        native_transfers, token_transfers = await asyncio.gather(
+            reader.get_native_transfers(from_block, to_block),
+            reader.get_token_transfers(None, from_block, to_block))
+        watched = self.get_watched_addresses(account_type_id)
+        matched: Dict[str, Dict[str, List[APIAccountTransaction]]] = defaultdict(lambda: defaultdict(list))
+        transfers_count = 0
+        for tx_type, transfers in (("native", native_transfers), ("token", token_transfers)):
+            for transfer in transfers:
+                addresses = {address for address in (transfer.from_address.lower(), transfer.to_address.lower())
+                             if address in watched}
+                transfers_count += bool(addresses)
+                for address in addresses:
+                    matched[address][tx_type].append(transfer)
+
+        if matched:
+            syncs = await self._build_syncs(reader, account_type_id, matched, to_block)
+            await store_account_syncs(db_session=self.db_session, syncs=syncs)
+        await save_chain_scan_cursor(session=self.db_session, account_type_id=account_type_id, last_block=to_block)
+        logger.info("Blocks %d-%d of %s: %d transfer(s) of %d account(s) matched",
+                    from_block, to_block, account_type_id, transfers_count, len(matched))
+        return transfers_count
+
+    async def scan_once(self) -> int:
+        """
+        :return: Count of matched transfers of all chains
+        """
+        results = await asyncio.gather(*(self.scan_chain(account_type_id) for account_type_id in self.account_types),
+                                       return_exceptions=True)
+        count = 0
+        for account_type_id, result in zip(self.account_types, results):
+            if isinstance(result, BaseException):
+                logger.error("Error while scanning %s blocks: %r", account_type_id, result)
+                continue
+            count += result
+        return count
+
+    async def run(self) -> None:
+        logger.info("Block watcher started for %s", ", ".join(self.account_types))
+        while True:
+            try:
+                await self.scan_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error while scanning blocks: %r", e)
+            await asyncio.sleep(self.tick)
+
+    def start(self) -> asyncio.Task:
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        logger.info("Block watcher stopped")
@@ -0,0 +1,165 @@
+import asyncio
+import itertools
+import logging
+from collections import deque
+from typing import Optional, Dict, Deque, Tuple, List, Set
+
+from aiogram import Bot
+from aiogram import exceptions
+
+from tgbot.config import Settings
+
+logger = logging.getLogger(__name__)
+
+ALERT_PRIORITY: int = 10
+"""
+Alerts of a chat are joined into one message up to the Telegram message length.
+"""
+MESSAGE_MAX_LENGTH: int = 4096
+MESSAGE_SEPARATOR: str = "\n\n"
+STOP_TIMEOUT: float = 10.0
+
+
+class DeliveryQueue:
+    """
+    Queue of outgoing messages sent by a pool of workers within the Telegram limits.
+
+    `send` only queues the text, so handlers and pollers are never blocked by the delivery.
+    Texts queued for a chat are kept together and sent as one message when the chat is taken by a worker,
+    a chat is taken not earlier than `chat_interval` (`group_interval` for groups) after its last message,
+    and all workers together send no more than `rate` messages per second.
+    Chats are taken by priority of their most urgent text. RetryAfter pauses only the chat it was raised for.
+    Messages are kept in memory, queued texts are lost on restart.
+    """
+
+    def __init__(self,
+                 bot: Bot,
+                 config: Settings,
+                 rate: Optional[float] = None,
+                 workers: Optional[int] = None,
+                 chat_interval: Optional[float] = None,
+                 group_interval: Optional[float] = None) -> None:
+        self.bot = bot
+        self.rate = rate or config.delivery_rate
+        self.workers = workers or config.delivery_workers
+        self.chat_interval = config.delivery_chat_interval if chat_interval is None else chat_interval
+        self.group_interval = config.delivery_group_interval if group_interval is None else group_interval
+        self.__ready: asyncio.PriorityQueue[Tuple[int, int, int]] = asyncio.PriorityQueue()
+        self.__pending: Dict[int, Deque[Tuple[int, str]]] = {}
+        self.__scheduled: Set[int] = set()
+        self.__chat_next: Dict[int, float] = {}
+        self.__order = itertools.count()
+        self.__rate_lock = asyncio.Lock()
+        self.__next_send = 0.0
+        self.__idle = asyncio.Event()
+        self.__idle.set()
+        self.__tasks: List[asyncio.Task] = []
+        self.sent = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        """
+        :return: Count of queued texts
+        """
+        return sum(len(texts) for texts in self.__pending.values())
+
+    def send(self, chat_id: int, text: str, priority: int = ALERT_PRIORITY) -> None:
+        """
+        Queue the text for the chat, a lower priority is sent earlier.
+        """
+        self.__pending.setdefault(chat_id, deque()).append((priority, text))
+        self.__idle.clear()
+        self.__schedule(chat_id)
+
+    def __schedule(self, chat_id: int) -> None:
+        if chat_id in self.__scheduled or not self.__pending.get(chat_id):
+            return
+        self.__scheduled.add(chat_id)
+        item = (min(priority for priority, _ in self.__pending[chat_id]), next(self.__order), chat_id)
+        loop = asyncio.get_running_loop()
+        if (delay := self.__chat_next.get(chat_id, 0.0) - loop.time()) > 0:
+            loop.call_later(delay, self.__ready.put_nowait, item)
+        else:
+            self.__ready.put_nowait(item)
+
+    def __take(self, chat_id: int) -> List[Tuple[int, str]]:
+        """
+        :return: queued texts of the chat which fit into one message of MESSAGE_MAX_LENGTH
+        """
+        texts = self.__pending[chat_id]
+        taken = [texts.popleft()]
+        length = len(taken[0][1])
+        while texts and length + len(MESSAGE_SEPARATOR) + len(texts[0][1]) <= MESSAGE_MAX_LENGTH:
+            taken.append(texts.popleft())
+            length += len(MESSAGE_SEPARATOR) + len(taken[-1][1])
+        return taken
+
+    async def __throttle(self) -> None:
+        async with self.__rate_lock:
+            now = asyncio.get_running_loop().time()
+            if (wait := self.__next_send - now) > 0:
+                await asyncio.sleep(wait)
+            self.__next_send = max(now, self.__next_send) + 1 / self.rate
+
+    async def __deliver(self, chat_id: int) -> None:
+        loop = asyncio.get_running_loop()
+        taken = self.__take(chat_id)
+        await self.__throttle()
+        interval = self.group_interval if chat_id < 0 else self.chat_interval
+        try:
+            await self.bot.send_message(chat_id, MESSAGE_SEPARATOR.join(text for _, text in taken))
+        except exceptions.TelegramRetryAfter as e:
+            logger.warning("Target [ID:%s]: flood limit is exceeded, chat paused for %s seconds",
+                           chat_id, e.retry_after)
+            self.__pending[chat_id].extendleft(reversed(taken))
+            interval = e.retry_after
+        except exceptions.TelegramForbiddenError:
+            logger.error("Target [ID:%s]: got TelegramForbiddenError, %d queued text(s) dropped",
+                         chat_id, len(taken) + len(self.__pending[chat_id]))
+            self.__pending[chat_id].clear()
+        except exceptions.TelegramAPIError as e:
+            logger.error("Target [ID:%s]: failed, %d text(s) dropped: %r", chat_id, len(taken), e)
+        else:
+            self.sent += 1
+            self.coalesced += len(taken) - 1
+        self.__chat_next[chat_id] = loop.time() + interval
+
+    async def __work(self) -> None:
+        while True:
+            _, _, chat_id = await self.__ready.get()
+            try:
+                await self.__deliver(chat_id)
+            except Exception as e:
+                logger.error("Error while delivering to [ID:%s]: %r", chat_id, e)
+            finally:
+                self.__scheduled.discard(chat_id)
+                if self.__pending.get(chat_id):
+                    self.__schedule(chat_id)
+                else:
+                    self.__pending.pop(chat_id, None)
+                    if not self.__pending:
+                        self.__idle.set()
+                self.__ready.task_done()
+
+    async def join(self) -> None:
+        """
+        Wait until every queued text is delivered or dropped.
+        """
+        await self.__idle.wait()
+
+    def start(self) -> List[asyncio.Task]:
+        if not self.__tasks:
+            self.__tasks = [asyncio.create_task(self.__work()) for _ in range(self.workers)]
+            logger.info("Delivery queue started with %d worker(s)", self.workers)
+        return self.__tasks
+
+    async def stop(self, timeout: float = STOP_TIMEOUT) -> None:
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Delivery queue stopped with %d undelivered text(s)", len(self))
+        for task in self.__tasks:
+            task.cancel()
+        await asyncio.gather(*self.__tasks, return_exceptions=True)
+        self.__tasks = []
+        logger.info("Delivery queue stopped")
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Optional, Dict, List, Tuple, Iterable
+
+from aiogram import Bot
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from tgbot.config import Settings
+from tgbot.models.addressbook import Account
+from tgbot.models.watchlist import watchlist, Subscription
+from tgbot.models.db_commands import AccountSync
+from tgbot.utils.net_accounts import AccountRefresh, get_evm_accounts_from_net, AccountReaders, fetch_account_sync, \
+    store_account_syncs
+
+logger = logging.getLogger(__name__)
+
+AccountKey = Tuple[str, str]
+BATCH_ACCOUNT_TYPES = ("ERC20", "BEP20")
+
+
+class BalancePoller:
+    """
+    Background poller of the tracked address book entries, entries are taken from the watchlist index.
+
+    Every tick entries are grouped by account (address, account_type_id), the account is polled once
+    per the shortest schedule among the entries tracking it, threshold alerts of the subscribed chats
+    are sent by store_account_syncs. Requests to every chain are limited by its own concurrency budget,
+    fetched accounts are written to the database in a few bulk transactions.
+    Chains in `watched_account_types` are followed by the block watcher, which does not see internal native
+    transfers made by contracts, so their accounts are still polled, but every `watched_interval` minutes at most.
+    """
+
+    def __init__(self,
+                 bot: Bot,
+                 db_session: async_sessionmaker,
+                 account_readers: AccountReaders,
+                 config: Settings,
+                 tick: Optional[float] = None,
+                 chain_concurrency: Optional[int] = None,
+                 watched_account_types: Optional[Iterable[str]] = None,
+                 watched_interval: Optional[int] = None) -> None:
+        self.bot = bot
+        self.db_session = db_session
+        self.account_readers = account_readers
+        self.tick = tick or config.poller_tick
+        self.chain_concurrency = chain_concurrency or config.poller_chain_concurrency
+        self.watched_account_types = set(watched_account_types or ())
+        self.watched_interval = watched_interval or config.poller_watched_interval
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._last_polled: Dict[AccountKey, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _get_semaphore(self, account_type_id: str) -> asyncio.Semaphore:
+        if account_type_id not in self._semaphores:
+            self._semaphores[account_type_id] = asyncio.Semaphore(self.chain_concurrency)
+        return self._semaphores[account_type_id]
+
+    @staticmethod
+    def group_by_schedule(entries: List[Subscription]) -> Dict[int, Dict[AccountKey, List[Subscription]]]:
+        subscribers: Dict[AccountKey, List[Subscription]] = defaultdict(list)
+        for entry in entries:
+            subscribers[(entry.account_address, entry.account_type_id)].append(entry)
+
+        schedules: Dict[int, Dict[AccountKey, List[Subscription]]] = defaultdict(dict)
+        for key, key_entries in subscribers.items():
+            schedules[min(entry.schedule for entry in key_entries)][key] = key_entries
+        return schedules
+
+    async def _prefetch(self, keys: List[AccountKey]) -> Dict[AccountKey, Account]:
+        """
+        Batch read of balances for chains which support it.
+        """
+        prefetched = {}
+        for account_type_id in BATCH_ACCOUNT_TYPES:
+            addresses = [address for address, key_type_id in keys if key_type_id == account_type_id]
+            if not addresses:
+                continue
+            try:
+                accounts = await get_evm_accounts_from_net(readers=self.account_readers,
+                                                           addresses=addresses,
+                                                           account_type=account_type_id)
+            except Exception as e:
+                logger.error("Error while prefetching %s balances: %r", account_type_id, e)
+                continue
+            prefetched.update({(address, account_type_id): account for address, account in accounts.items()})
+        return prefetched
+
+    async def _fetch(self, key: AccountKey, net_account: Optional[Account] = None) -> Optional[AccountSync]:
+        address, account_type_id = key
+        async with self._get_semaphore(account_type_id):
+            try:
+                return await fetch_account_sync(db_session=self.db_session,
+                                                readers=self.account_readers,
+                                                address=address,
+                                                account_type=account_type_id,
+                                                net_account=net_account)
+            except Exception as e:
+                logger.error("Error while polling account %s %s: %r", account_type_id, address, e)
+
+    async def _store(self, syncs: List[Optional[AccountSync]]) -> List[Optional[AccountRefresh]]:
+        fetched = [account_sync for account_sync in syncs if account_sync]
+        try:
+            refreshes = iter(await store_account_syncs(db_session=self.db_session, syncs=fetched))
+        except Exception as e:
+            logger.error("Error while storing polled accounts: %r", e)
+            return [None] * len(syncs)
+        return [next(refreshes) if account_sync else None for account_sync in syncs]
+
+    async def poll_once(self, now: Optional[float] = None) -> int:
+        """
+        :return: Count of polled accounts
+        """
+        now = now or time.monotonic()
+        entries = list(watchlist.tracked())
+        due: Dict[AccountKey, List[Subscription]] = {}
+        for schedule, accounts in self.group_by_schedule(entries).items():
+            for key, key_entries in accounts.items():
+                interval = max(schedule, self.watched_interval) if key[1] in self.watched_account_types else schedule
+                if now - self._last_polled.get(key, -float("inf")) >= interval * 60 - self.tick / 2:
+                    due[key] = key_entries
+                    self._last_polled[key] = now
+
+        tracked = {(entry.account_address, entry.account_type_id) for entry in entries}
+        for key in self._last_polled.keys() - tracked:
+            del self._last_polled[key]
+
+        if not due:
+            return 0
+
+        prefetched = await self._prefetch(list(due))
+        syncs = await asyncio.gather(*(self._fetch(key, prefetched.get(key)) for key in due))
+        await self._store(syncs)
+        return len(due)
+
+    async def run(self) -> None:
+        logger.info("Balance poller started")
+        while True:
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error while polling balances: %r", e)
+            await asyncio.sleep(self.tick)
+
+    def start(self) -> asyncio.Task:
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        logger.info("Balance poller stopped")
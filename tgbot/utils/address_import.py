@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Optional, List, Dict, Callable, Awaitable, Tuple
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from tgbot.models.addressbook import Account, AddressBookEntry
+from tgbot.models.db_commands import compose_address_book_entries
+from tgbot.utils.net_accounts import AccountReaders, AccountKey, get_address_account_types, normalize_address, \
+    get_account_from_net, get_evm_accounts_from_net
+
+logger = logging.getLogger(__name__)
+
+IMPORT_MAX_ADDRESSES: int = 5000
+IMPORT_EVM_CHUNK_SIZE: int = 100
+IMPORT_CONCURRENCY: int = 8
+ALIAS_MAX_LENGTH: int = 64
+LINE_SPLIT_RE = re.compile(r"[\s,;]+")
+
+"""
+Progress callback of the import: count of addresses read from the network and their total count.
+"""
+ImportProgress = Callable[[int, int], Awaitable[None]]
+
+
+@dataclass
+class AddressImport:
+    """
+    Result of the bulk import, `not_found` are valid addresses no chain returned an account for.
+    """
+    entries: List[AddressBookEntry] = field(default_factory=list)
+    accounts: List[Account] = field(default_factory=list)
+    invalid: List[str] = field(default_factory=list)
+    not_found: List[str] = field(default_factory=list)
+
+
+def parse_address_list(text: str) -> Tuple[Dict[str, Optional[str]], List[str]]:
+    """
+    Lines of `address[,;<space>alias]`, empty lines and lines started with # are skipped,
+    a CSV header line is skipped too. Addresses are validated locally, the first alias of the address wins.
+    :return: aliases by valid address and the list of invalid lines
+    """
+    addresses: Dict[str, Optional[str]] = {}
+    invalid = []
+    for line_no, line in enumerate(text.splitlines()):
+        if not (line := line.strip()) or line.startswith("#"):
+            continue
+        address, *alias = [value.strip("\"' ") for value in LINE_SPLIT_RE.split(line, maxsplit=1)]
+        if not (account_types := get_address_account_types(address)):
+            if line_no or address.lower() != "address":
+                invalid.append(line)
+            continue
+        alias = alias[0][:ALIAS_MAX_LENGTH] if alias and alias[0] else None
+        addresses.setdefault(normalize_address(address, account_types[0]), alias)
+    return addresses, invalid
+
+
+async def read_net_accounts(readers: AccountReaders,
+                            addresses: List[str],
+                            concurrency: int = IMPORT_CONCURRENCY,
+                            progress: Optional[ImportProgress] = None) -> Dict[str, List[Account]]:
+    """
+    Detect chains of the addresses by reading them from the network concurrently,
+    EVM addresses are read by batch requests, requests are throttled by the readers key pools.
+    :return: accounts found by address
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    found: Dict[str, List[Account]] = {}
+    done = 0
+
+    async def report(count: int) -> None:
+        nonlocal done
+        done += count
+        if progress:
+            await progress(min(done, len(addresses)), len(addresses))
+
+    async def read_evm(chunk: List[str]) -> None:
+        async with semaphore:
+            results = await asyncio.gather(*(get_evm_accounts_from_net(readers=readers,
+                                                                       addresses=chunk,
+                                                                       account_type=account_type)
+                                             for account_type in ("ERC20", "BEP20")),
+                                           return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.error("Error while reading EVM accounts: %r", result)
+                continue
+            for address, account in result.items():
+                found.setdefault(address, []).append(account)
+        await report(len(chunk))
+
+    async def read_tron(address: str) -> None:
+        async with semaphore:
+            try:
+                if account := await get_account_from_net(readers=readers, address=address, account_type="TRC20"):
+                    found.setdefault(address, []).append(account)
+            except Exception as e:
+                logger.error("Error while reading TRC20 account %s: %r", address, e)
+        await report(1)
+
+    evm_addresses = [address for address in addresses if "ERC20" in get_address_account_types(address)]
+    tron_addresses = [address for address in addresses if "TRC20" in get_address_account_types(address)]
+    await asyncio.gather(*(read_evm(evm_addresses[i:i + IMPORT_EVM_CHUNK_SIZE])
+                           for i in range(0, len(evm_addresses), IMPORT_EVM_CHUNK_SIZE)),
+                         *(read_tron(address) for address in tron_addresses))
+    return found
+
+
+async def import_address_list(db_session: async_sessionmaker,
+                              readers: AccountReaders,
+                              address_book_id: int,
+                              address_book_title: str,
+                              text: str,
+                              progress: Optional[ImportProgress] = None) -> AddressImport:
+    """
+    Add every address of the list to the address book, all found accounts are persisted in one transaction.
+    An address found on several chains gets an entry per chain, the alias is suffixed with the chain then.
+    Database errors are raised, no account of the list is added then.
+    """
+    addresses, invalid = parse_address_list(text)
+    if len(addresses) > IMPORT_MAX_ADDRESSES:
+        invalid.extend(list(addresses)[IMPORT_MAX_ADDRESSES:])
+        addresses = dict(list(addresses.items())[:IMPORT_MAX_ADDRESSES])
+    result = AddressImport(invalid=invalid)
+    if not addresses:
+        return result
+
+    found = await read_net_accounts(readers=readers, addresses=list(addresses), progress=progress)
+    aliases: Dict[AccountKey, str] = {}
+    for address, alias in addresses.items():
+        if not (accounts := found.get(address)):
+            result.not_found.append(address)
+            continue
+        result.accounts.extend(accounts)
+        if not alias:
+            continue
+        for account in accounts:
+            suffix = f" {account.account_type_id}" if len(accounts) > 1 else ""
+            aliases[(account.address, account.account_type_id)] = alias[:ALIAS_MAX_LENGTH - len(suffix)] + suffix
+    if result.accounts:
+        result.entries = await compose_address_book_entries(session=db_session,
+                                                            address_book_id=address_book_id,
+                                                            address_book_title=address_book_title,
+                                                            accounts=result.accounts,
+                                                            aliases=aliases)
+    return result
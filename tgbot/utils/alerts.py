@@ -0,0 +1,52 @@
+from typing import Optional, Callable, List
+
+from tgbot.models.addressbook import AddressBookEntry, Account, AccountType, AccountAlertState
+from tgbot.models.watchlist import Subscription
+from tgbot.utils.decimals import format_decimal, value_to_decimal
+
+"""
+Sender of the threshold alerts by chat id, set once the bot is running. Alerts are not evaluated
+while it is not set, so tools writing accounts without a bot do not consume crossings.
+"""
+AlertSender = Callable[[int, str], None]
+alert_sender: Optional[AlertSender] = None
+
+
+def set_alert_sender(sender: Optional[AlertSender]) -> None:
+    global alert_sender
+    alert_sender = sender
+
+
+def get_alert_sender() -> Optional[AlertSender]:
+    return alert_sender
+
+
+def threshold_crossed(old_value: int, new_value: int, threshold: int) -> bool:
+    return (old_value < threshold) != (new_value < threshold)
+
+
+def format_alert(entry: AddressBookEntry | Subscription, token: str, old_value: int, new_value: int,
+                 threshold: int, unit: int) -> str:
+    return (f"⚠️ {entry.account_alias} ({entry.account_address})\n"
+            f"{token} balance crossed threshold {format_decimal(value_to_decimal(threshold / unit), pre=6)}: "
+            f"{format_decimal(value_to_decimal(old_value / unit), pre=2)} → "
+            f"{format_decimal(value_to_decimal(new_value / unit), pre=2)}")
+
+
+def get_threshold_alerts(entry: AddressBookEntry | Subscription,
+                         old: Account | AccountAlertState,
+                         new: Account,
+                         account_type: Optional[AccountType] = None) -> List[str]:
+    """
+    :param old: balances alerts were last evaluated at
+    :param account_type: units of the chain, taken from the entry account if not given
+    """
+    account_type = account_type or entry.account.account_type
+    alerts = []
+    if entry.track_native and threshold_crossed(old.native_balance, new.native_balance, entry.native_threshold):
+        alerts.append(format_alert(entry, account_type.native_token, old.native_balance, new.native_balance,
+                                   entry.native_threshold, account_type.native_unit))
+    if entry.track_token and threshold_crossed(old.token_balance, new.token_balance, entry.token_threshold):
+        alerts.append(format_alert(entry, entry.account_type_id, old.token_balance, new.token_balance,
+                                   entry.token_threshold, account_type.token_unit))
+    return alerts
@@ -1,184 +1,408 @@
+import asyncio
 import logging
-from typing import Optional, List, Generator, Any
+import re
+import time
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Tuple, Callable, Awaitable, Set
 
+import base58
 from aiohttp import ClientSession
+from cachetools import TTLCache
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
+from tgbot.config import Settings, settings
 from tgbot.models.addressbook import Account
+from tgbot.models.db_commands import read_account, get_account_sync_cursors, AccountSync, sync_db_accounts, \
+    advance_alert_states
+from tgbot.models.watchlist import watchlist
+from tgbot.utils.alerts import get_alert_sender, get_threshold_alerts
 from tgbot.wallet_readers.account_readers import TronAccountReader, EthereumAccountReader, BSCSCAN_API_URL, \
-    BSCSCAN_USDT_CONTRACT, APIAccountTransaction
+    BSCSCAN_USDT_CONTRACT, ETHERSCAN_USDT_CONTRACT, APISyncCursor, APITransactionsSync, EvmRpcAccountReader
+from tgbot.utils.single_flight import SingleFlight
+from tgbot.wallet_readers.json_stream import get_json_loads
+from tgbot.wallet_readers.rate_limiter import configure_key_pool
+from tgbot.wallet_readers.response_cache import ResponseCache
 
 logger = logging.getLogger(__name__)
 
-
-async def get_tron_account_from_net(http_session: ClientSession,
-                                    address: str,
-                                    tron_api_keys: list) -> Optional[Account]:
-    tron = TronAccountReader(session=http_session,
-                             address=address,
-                             api_keys=tron_api_keys,
-                             logger=logger)
-
-    if account := await tron.get_account_data():
-        return Account(address=address,
-                       account_type='TRC20',
+EVM_ADDRESS_RE = re.compile(r"0x[0-9a-fA-F]{40}")
+TRON_ADDRESS_RE = re.compile(r"T[1-9A-HJ-NP-Za-km-z]{33}")
+TRON_ADDRESS_PREFIX = b"\x41"
+
+AccountReaders = Dict[str, TronAccountReader | EthereumAccountReader | EvmRpcAccountReader]
+AccountKey = Tuple[str, str]
+
+"""
+Refreshes of the same account are shared: concurrent callers await one run,
+and a refresh completed less than `refresh_freshness` seconds ago is reused.
+"""
+refresh_flight = SingleFlight()
+recent_refreshes: TTLCache = TTLCache(maxsize=4096, ttl=settings.refresh_freshness)
+SYNC_BATCH_SIZE: int = 500
+TX_STREAMS = ("native", "token")
+
+"""
+Wall clock time of the last stored refresh of every account, readers show it as the age of the data.
+"""
+refresh_times: TTLCache = TTLCache(maxsize=16384, ttl=24 * 3600)
+"""
+Wall clock time of the last failed background refresh of every account. A failure is kept
+for `entry_refresh_interval` seconds, so readers do not restart the refresh on every render.
+"""
+refresh_failures: TTLCache = TTLCache(maxsize=16384, ttl=settings.entry_refresh_interval)
+"""
+Callbacks of the running background refreshes by account, tasks are referenced until they are done.
+"""
+RefreshCallback = Callable[[Optional["AccountRefresh"]], Awaitable[None]]
+background_refreshes: Dict[AccountKey, List[RefreshCallback]] = {}
+background_tasks: Set[asyncio.Task] = set()
+
+
+@dataclass
+class AccountRefresh:
+    db_account: Optional[Account]
+    net_account: Account
+
+
+def create_account_readers(http_session: ClientSession, config: Settings,
+                           response_cache: Optional[ResponseCache] = None) -> AccountReaders:
+    """
+    One reader per chain for the whole process, readers are safe to share between coroutines.
+    EVM chains with a configured JSON-RPC url are read from the node instead of the explorer API.
+    :param response_cache: cache of balances and transaction pages, responses are not cached if None
+    """
+    reader_options = {"stream": config.stream_json,
+                    "json_loads": get_json_loads(config.json_backend),
+                    "response_cache": response_cache,
+                    "cache_ttls": {"balance": config.cache_balance_ttl,
+                                   "transactions": config.cache_transactions_ttl}}
+    readers = {"TRC20": TronAccountReader(session=http_session,
+                                          api_keys=config.tron_api_keys,
+                                          key_pool=configure_key_pool(config.tron_api_keys, config.tron_api_rps),
+                                          logger=logger,
+                                          **reader_options),
+               "ERC20": EthereumAccountReader(session=http_session,
+                                              api_keys=config.etherscan_api_keys,
+                                              key_pool=configure_key_pool(config.etherscan_api_keys,
+                                                                          config.etherscan_api_rps),
+                                              logger=logger,
+                                              **reader_options),
+               "BEP20": EthereumAccountReader(session=http_session,
+                                              url=BSCSCAN_API_URL,
+                                              usdt_contract=BSCSCAN_USDT_CONTRACT,
+                                              api_keys=config.bsc_scan_api_keys,
+                                              key_pool=configure_key_pool(config.bsc_scan_api_keys,
+                                                                          config.bsc_scan_api_rps),
+                                              logger=logger,
+                                              **reader_options)}
+    for account_type, rpc_url, usdt_contract in (("ERC20", config.eth_rpc_url, ETHERSCAN_USDT_CONTRACT),
+                                                 ("BEP20", config.bsc_rpc_url, BSCSCAN_USDT_CONTRACT)):
+        if rpc_url:
+            readers[account_type] = EvmRpcAccountReader(session=http_session,
+                                                        url=rpc_url,
+                                                        usdt_contract=usdt_contract,
+                                                        key_pool=configure_key_pool([rpc_url], config.rpc_rps),
+                                                        batch_size=config.rpc_batch_size,
+                                                        logs_block_range=config.rpc_logs_block_range,
+                                                        json_loads=reader_options["json_loads"],
+                                                        logger=logger)
+    return readers
+
+
+def normalize_address(address: str, account_type: str) -> str:
+    return address if account_type == "TRC20" else address.lower()
+
+
+async def get_account_from_net(readers: AccountReaders,
+                               address: str,
+                               account_type: str) -> Optional[Account]:
+    if not (reader := readers.get(account_type)):
+        return
+    if account := await reader.get_account_data(address):
+        return Account(address=normalize_address(address, account_type),
+                       account_type=account_type,
                        native_balance=account.native_balance,
                        token_balance=account.token_balance)
 
 
-async def get_tron_native_trns_from_net(http_session: ClientSession,
-                                        address: str,
-                                        tron_api_keys: list) -> Optional[Generator[APIAccountTransaction, Any, None]]:
-    tron = TronAccountReader(session=http_session,
-                             address=address,
-                             api_keys=tron_api_keys,
-                             logger=logger)
-
-    return await tron.get_native_transactions()
-
-
-async def get_tron_token_trns_from_net(http_session: ClientSession,
-                                       address: str,
-                                       tron_api_keys: list) -> Optional[Generator[APIAccountTransaction, Any, None]]:
-    tron = TronAccountReader(session=http_session,
-                             address=address,
-                             api_keys=tron_api_keys,
-                             logger=logger)
-
-    return await tron.get_token_transactions()
-
-
-async def get_erc20_account_from_net(http_session: ClientSession,
-                                     address: str,
-                                     erc20_api_keys: list) -> Optional[Account]:
-    etherscan = EthereumAccountReader(session=http_session,
-                                      address=address,
-                                      api_keys=erc20_api_keys,
-                                      logger=logger)
-    if account := await etherscan.get_account_data():
-        return Account(address=address.lower(),
-                       account_type='ERC20',
-                       native_balance=account.native_balance,
-                       token_balance=account.token_balance)
-
-
-async def get_erc20_native_trns_from_net(http_session: ClientSession,
-                                         address: str,
-                                         erc20_api_keys: list) -> Optional[Generator[APIAccountTransaction, Any, None]]:
-    etherscan = EthereumAccountReader(session=http_session,
-                                      address=address,
-                                      api_keys=erc20_api_keys,
-                                      logger=logger)
-    return await etherscan.get_native_transactions()
-
-
-async def get_erc20_token_trns_from_net(http_session: ClientSession,
-                                        address: str,
-                                        erc20_api_keys: list) -> Optional[Generator[APIAccountTransaction, Any, None]]:
-    etherscan = EthereumAccountReader(session=http_session,
-                                      address=address,
-                                      api_keys=erc20_api_keys,
-                                      logger=logger)
-    return await etherscan.get_token_transactions()
-
-
-async def get_bep20_account_from_net(http_session: ClientSession,
-                                     address: str,
-                                     bep20_api_keys: list) -> Optional[Account]:
-    bscscan = EthereumAccountReader(session=http_session,
-                                    url=BSCSCAN_API_URL,
-                                    usdt_contract=BSCSCAN_USDT_CONTRACT,
-                                    address=address,
-                                    api_keys=bep20_api_keys,
-                                    logger=logger)
-    if account := await bscscan.get_account_data():
-        return Account(address=address.lower(),
-                       account_type='BEP20',
-                       native_balance=account.native_balance,
-                       token_balance=account.token_balance)
-
-
-async def get_bep20_native_trns_from_net(http_session: ClientSession,
-                                         address: str,
-                                         bep20_api_keys: list) -> Optional[Generator[APIAccountTransaction, Any, None]]:
-    bscscan = EthereumAccountReader(session=http_session,
-                                    url=BSCSCAN_API_URL,
-                                    usdt_contract=BSCSCAN_USDT_CONTRACT,
-                                    address=address,
-                                    api_keys=bep20_api_keys,
-                                    logger=logger)
-    return await bscscan.get_native_transactions()
-
-
-async def get_bep20_token_trns_from_net(http_session,
-                                        address,
-                                        bep20_api_keys: list) -> Optional[Generator[APIAccountTransaction, Any, None]]:
-    bscscan = EthereumAccountReader(session=http_session,
-                                    url=BSCSCAN_API_URL,
-                                    usdt_contract=BSCSCAN_USDT_CONTRACT,
-                                    address=address,
-                                    api_keys=bep20_api_keys,
-                                    logger=logger)
-    return await bscscan.get_token_transactions()
-
-
-async def ensure_account_at_net(http_session: ClientSession,
-                                address: str,
-                                api_keys: dict) -> Optional[List[Account]]:
+async def get_evm_accounts_from_net(readers: AccountReaders,
+                                    addresses: List[str],
+                                    account_type: str) -> Dict[str, Account]:
+    if not isinstance(reader := readers.get(account_type), EthereumAccountReader | EvmRpcAccountReader):
+        return {}
+    accounts = await reader.get_accounts_data(addresses)
+    return {address: Account(address=normalize_address(address, account_type),
+                             account_type=account_type,
+                             native_balance=account.native_balance,
+                             token_balance=account.token_balance) for address, account in accounts.items()}
+
+
+def get_address_account_types(address: str) -> List[str]:
+    """
+    Syntactic classification of the address: base58check "T..." is Tron, "0x" + 40 hex digits is EVM.
+    :return: account types the address can belong to
+    """
+    if EVM_ADDRESS_RE.fullmatch(address):
+        return ["ERC20", "BEP20"]
+    if TRON_ADDRESS_RE.fullmatch(address):
+        try:
+            if base58.b58decode_check(address)[:1] == TRON_ADDRESS_PREFIX:
+                return ["TRC20"]
+        except ValueError:
+            pass
+    return []
+
+
+async def ensure_account_at_net(readers: AccountReaders,
+                                address: str) -> Optional[List[Account]]:
+    address = address.strip()
+    account_types = get_address_account_types(address)
+    results = await asyncio.gather(*(get_account_from_net(readers=readers,
+                                                          address=address,
+                                                          account_type=account_type)
+                                     for account_type in account_types),
+                                   return_exceptions=True)
     accounts = []
+    for account_type, account in zip(account_types, results):
+        if isinstance(account, BaseException):
+            logger.error("Error while reading %s account %s: %r", account_type, address, account)
+            continue
+        if account:
+            accounts.append(account)
 
-    if account := await get_tron_account_from_net(http_session, address, api_keys.get('TRC20')):
-        accounts.append(Account(address=address, account_type='TRC20', native_balance=account.native_balance,
-                                token_balance=account.token_balance))
-        return accounts
-
-    if account := await get_erc20_account_from_net(http_session, address, api_keys.get('ERC20')):
-        accounts.append(Account(address=address.lower(), account_type='ERC20', native_balance=account.native_balance,
-                                token_balance=account.token_balance))
+    return accounts if len(accounts) else None
 
-    if account := await get_bep20_account_from_net(http_session, address, api_keys.get('BEP20')):
-        accounts.append(Account(address=address.lower(), account_type='BEP20', native_balance=account.native_balance,
-                                token_balance=account.token_balance))
 
-    return accounts if len(accounts) else None
+async def sync_native_trns_from_net(readers: AccountReaders,
+                                    account: Account,
+                                    cursor: Optional[APISyncCursor] = None) -> Optional[APITransactionsSync]:
+    if not (reader := readers.get(account.account_type_id)):
+        return
+    return await reader.sync_native_transactions(account.address, cursor)
 
 
-async def get_native_trns_from_net(http_session: ClientSession,
+async def sync_token_trns_from_net(readers: AccountReaders,
                                    account: Account,
-                                   api_keys: dict) -> Generator[APIAccountTransaction, Any, None] | None:
-    match account.account_type_id:
-        case "TRC20":
-            transactions = await get_tron_native_trns_from_net(http_session=http_session,
-                                                               address=account.address,
-                                                               tron_api_keys=api_keys.get("TRC20"))
-        case "BEP20":
-            transactions = await get_bep20_native_trns_from_net(http_session=http_session,
-                                                                address=account.address,
-                                                                bep20_api_keys=api_keys.get("BEP20"))
-        case "ERC20":
-            transactions = await get_erc20_native_trns_from_net(http_session=http_session,
-                                                                address=account.address,
-                                                                erc20_api_keys=api_keys.get("ERC20"))
-        case _:
-            transactions = None
-    return transactions
-
-
-async def get_token_trns_from_net(http_session: ClientSession,
-                                  account: Account,
-                                  api_keys: dict) -> Generator[APIAccountTransaction, Any, None] | None:
-    match account.account_type_id:
-        case "TRC20":
-            transactions = await get_tron_token_trns_from_net(http_session=http_session,
-                                                              address=account.address,
-                                                              tron_api_keys=api_keys.get("TRC20"))
-        case "BEP20":
-            transactions = await get_bep20_token_trns_from_net(http_session=http_session,
-                                                               address=account.address,
-                                                               bep20_api_keys=api_keys.get("BEP20"))
-        case "ERC20":
-            transactions = await get_erc20_token_trns_from_net(http_session=http_session,
-                                                               address=account.address,
-                                                               erc20_api_keys=api_keys.get("ERC20"))
-        case _:
-            transactions = None
-    return transactions
+                                   cursor: Optional[APISyncCursor] = None) -> Optional[APITransactionsSync]:
+    if not (reader := readers.get(account.account_type_id)):
+        return
+    return await reader.sync_token_transactions(account.address, cursor)
+
+
+async def refresh_account(db_session: async_sessionmaker,
+                          readers: AccountReaders,
+                          address: str,
+                          account_type: str,
+                          net_account: Optional[Account] = None) -> Optional[AccountRefresh]:
+    """
+    Fetch account balances from the network, fetch transactions for every changed balance
+    and sync all of it to the database. Concurrent refreshes of the same account share one run.
+    :param net_account: account balances already fetched from the network (e.g. by a batch request)
+    :return: account state before (db_account) and after (net_account) the refresh
+    """
+    key = (normalize_address(address.strip(), account_type), account_type)
+    if refresh := recent_refreshes.get(key):
+        return refresh
+    return await refresh_flight.do(key, lambda: _refresh_account(db_session=db_session,
+                                                                 readers=readers,
+                                                                 address=address,
+                                                                 account_type=account_type,
+                                                                 net_account=net_account))
+
+
+def get_refresh_time(address: str, account_type: str) -> Optional[float]:
+    """
+    :return: time.time() of the last refresh of the account by this process, None if it is unknown
+    """
+    return refresh_times.get((normalize_address(address.strip(), account_type), account_type))
+
+
+def get_refresh_failure_time(address: str, account_type: str) -> Optional[float]:
+    """
+    :return: time.time() of the background refresh failed within `entry_refresh_interval`, None if there is none
+    """
+    return refresh_failures.get((normalize_address(address.strip(), account_type), account_type))
+
+
+def refresh_account_in_background(db_session: async_sessionmaker,
+                                  readers: AccountReaders,
+                                  address: str,
+                                  account_type: str,
+                                  on_refreshed: Optional[RefreshCallback] = None) -> None:
+    """
+    Stale-while-revalidate refresh: the caller renders the stored state while the account is refreshed
+    by a background task, `on_refreshed` is awaited once the refresh is stored. A failed refresh is recorded
+    in `refresh_failures` and `on_refreshed` is awaited with None.
+    Callers of the account already refreshing join the running task.
+    """
+    key = (normalize_address(address.strip(), account_type), account_type)
+    if key in background_refreshes:
+        if on_refreshed:
+            background_refreshes[key].append(on_refreshed)
+        return
+    background_refreshes[key] = [on_refreshed] if on_refreshed else []
+
+    async def refresh() -> None:
+        try:
+            account_refresh = await refresh_account(db_session=db_session,
+                                                    readers=readers,
+                                                    address=address,
+                                                    account_type=account_type)
+        except Exception as e:
+            logger.error("Error while refreshing %s %s: %r", account_type, address, e)
+            account_refresh = None
+        if not account_refresh:
+            refresh_failures[key] = time.time()
+        callbacks = background_refreshes.pop(key, [])
+        for callback in callbacks:
+            try:
+                await callback(account_refresh)
+            except Exception as e:
+                logger.warning("Refresh callback of %s %s failed: %r", account_type, address, e)
+
+    task = asyncio.create_task(refresh())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+async def _refresh_account(db_session: async_sessionmaker,
+                           readers: AccountReaders,
+                           address: str,
+                           account_type: str,
+                           net_account: Optional[Account] = None) -> Optional[AccountRefresh]:
+    account_sync = await fetch_account_sync(db_session=db_session,
+                                            readers=readers,
+                                            address=address,
+                                            account_type=account_type,
+                                            net_account=net_account)
+    if not account_sync:
+        return
+    refreshes = await store_account_syncs(db_session=db_session, syncs=[account_sync])
+    return refreshes[0]
+
+
+async def fetch_account_sync(db_session: async_sessionmaker,
+                             readers: AccountReaders,
+                             address: str,
+                             account_type: str,
+                             net_account: Optional[Account] = None) -> Optional[AccountSync]:
+    """
+    Fetch account balances from the network and transactions for every changed balance,
+    nothing is written to the database. The database state is read while balances are fetched,
+    native and token streams run concurrently: transactions of a stream are fetched as soon as
+    its balance is known to differ from the stored one.
+    :param net_account: account balances already fetched from the network (e.g. by a batch request)
+    """
+    address = normalize_address(address.strip(), account_type)
+    balances = _fetch_balances(readers=readers, address=address, account_type=account_type, net_account=net_account)
+    db_state = asyncio.ensure_future(asyncio.gather(
+        read_account(session=db_session, address=address, account_type_id=account_type),
+        get_account_sync_cursors(session=db_session, address=address, account_type_id=account_type)))
+
+    async def sync_stream(tx_type: str) -> Optional[APITransactionsSync]:
+        if (balance := await balances[tx_type]) is None:
+            return
+        db_account, cursors = await db_state
+        if db_account and getattr(db_account, f"{tx_type}_balance") == balance:
+            return
+        reader = readers[account_type]
+        sync_trns = reader.sync_native_transactions if tx_type == "native" else reader.sync_token_transactions
+        return await sync_trns(address, cursors.get(tx_type))
+
+    streams = await asyncio.gather(*(sync_stream(tx_type) for tx_type in TX_STREAMS), return_exceptions=True)
+    native_balance, token_balance = await asyncio.gather(balances["native"], balances["token"],
+                                                         return_exceptions=True)
+    db_account, _ = await db_state
+    for result in (*streams, native_balance, token_balance):
+        if isinstance(result, BaseException):
+            raise result
+    if native_balance is None or token_balance is None:
+        return
+
+    tx_syncs = dict(zip(TX_STREAMS, streams))
+    return AccountSync(db_account=db_account,
+                       net_account=Account(address=address,
+                                           account_type=account_type,
+                                           native_balance=native_balance,
+                                           token_balance=token_balance),
+                       tx={tx_type: tx_sync.transactions for tx_type, tx_sync in tx_syncs.items() if tx_sync},
+                       cursors={tx_type: tx_sync.cursor for tx_type, tx_sync in tx_syncs.items()
+                                if tx_sync and tx_sync.cursor})
+
+
+def _fetch_balances(readers: AccountReaders,
+                    address: str,
+                    account_type: str,
+                    net_account: Optional[Account] = None) -> Dict[str, asyncio.Future]:
+    """
+    Futures of the native and token balances, EVM balances are separate requests and land independently.
+    """
+    loop = asyncio.get_running_loop()
+    reader = readers.get(account_type)
+    if net_account or not reader:
+        balances = {tx_type: loop.create_future() for tx_type in TX_STREAMS}
+        for tx_type, balance in balances.items():
+            balance.set_result(getattr(net_account, f"{tx_type}_balance") if net_account else None)
+        return balances
+    if isinstance(reader, EthereumAccountReader):
+        return {"native": asyncio.ensure_future(reader.get_native_balance(address)),
+                "token": asyncio.ensure_future(reader.get_token_balance(address))}
+
+    account = asyncio.ensure_future(get_account_from_net(readers=readers, address=address, account_type=account_type))
+
+    async def balance(tx_type: str) -> Optional[int]:
+        return getattr(await account, f"{tx_type}_balance", None)
+
+    return {tx_type: asyncio.ensure_future(balance(tx_type)) for tx_type in TX_STREAMS}
+
+
+async def store_account_syncs(db_session: async_sessionmaker,
+                              syncs: List[AccountSync],
+                              batch_size: int = SYNC_BATCH_SIZE) -> List[AccountRefresh]:
+    """
+    Write fetched accounts in transactions of `batch_size` accounts, stored refreshes are reused
+    by refresh_account within the freshness window. Every writer of refreshes goes through here,
+    so threshold alerts of the written accounts are sent here too.
+    :return: account state before (db_account) and after (net_account) the refresh, in order of `syncs`
+    """
+    for i in range(0, len(syncs), batch_size):
+        await sync_db_accounts(session=db_session, syncs=syncs[i:i + batch_size])
+    refreshes = []
+    for account_sync in syncs:
+        refresh = AccountRefresh(db_account=account_sync.db_account, net_account=account_sync.net_account)
+        recent_refreshes[(refresh.net_account.address, refresh.net_account.account_type_id)] = refresh
+        refresh_times[(refresh.net_account.address, refresh.net_account.account_type_id)] = time.time()
+        refresh_failures.pop((refresh.net_account.address, refresh.net_account.account_type_id), None)
+        refreshes.append(refresh)
+    try:
+        await send_threshold_alerts(db_session=db_session, refreshes=refreshes)
+    except Exception as e:
+        logger.error("Error while sending threshold alerts: %r", e)
+    return refreshes
+
+
+async def send_threshold_alerts(db_session: async_sessionmaker, refreshes: List[AccountRefresh]) -> int:
+    """
+    Check thresholds of every subscriber of the refreshed accounts against the balances alerts were
+    last evaluated at, then move the alert states to the new balances. Nothing is evaluated while
+    no alert sender is set. An account evaluated for the first time is compared with its stored state.
+    :return: Count of sent alerts
+    """
+    if not (sender := get_alert_sender()):
+        return 0
+    watched = [refresh for refresh in refreshes
+               if watchlist.subscribers(refresh.net_account.address, refresh.net_account.account_type_id)]
+    if not watched:
+        return 0
+    previous = await advance_alert_states(session=db_session, accounts=[refresh.net_account for refresh in watched])
+    count = 0
+    for refresh in watched:
+        key = (refresh.net_account.address, refresh.net_account.account_type_id)
+        if not (old := previous.get(key) or refresh.db_account):
+            continue
+        account_type = watchlist.account_type(refresh.net_account.account_type_id)
+        for entry in watchlist.subscribers(*key):
+            for text in get_threshold_alerts(entry, old, refresh.net_account, account_type):
+                sender(entry.address_book_id, text)
+                count += 1
+    return count
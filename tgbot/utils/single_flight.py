@@ -0,0 +1,30 @@
+import asyncio
+from typing import Dict, Hashable, Callable, Awaitable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one in-flight task instead of running the call again.
+    The task is shielded, so a cancelled caller does not cancel it for the other callers.
+    """
+
+    def __init__(self) -> None:
+        self.__calls: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self.__calls)
+
+    def __done(self, key: Hashable, task: asyncio.Future) -> None:
+        if self.__calls.get(key) is task:
+            del self.__calls[key]
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[T]]) -> T:
+        if (task := self.__calls.get(key)) is None:
+            task = asyncio.ensure_future(call())
+            self.__calls[key] = task
+            task.add_done_callback(lambda done: self.__done(key, done))
+        return await asyncio.shield(task)
@@ -1,10 +1,10 @@
 import asyncio
 import datetime
+import json
 import logging
-import random
 from dataclasses import dataclass
 from enum import IntEnum
-from typing import Optional, Dict, Any, Generator
+from typing import Optional, Dict, Any, List, Tuple, Callable, Awaitable, AsyncIterator, Iterable
 
 import aiohttp
 import base58
@@ -12,6 +12,23 @@ import tenacity
 from aiohttp.typedefs import StrOrURL
 from fake_useragent import UserAgent
 
+from tgbot.wallet_readers.json_stream import JsonLoads, JsonRecords, JsonObjectStream, map_json_records
+from tgbot.utils.single_flight import SingleFlight
+from tgbot.wallet_readers.rate_limiter import ApiKeyPool, RateLimitExceeded, get_key_pool
+from tgbot.wallet_readers.response_cache import ResponseCache, CacheTTLs, make_cache_key
+
+_user_agent: Optional[UserAgent] = None
+
+
+def get_user_agent() -> UserAgent:
+    """
+    UserAgent loads the browsers database on construction, so it is created once per process.
+    """
+    global _user_agent
+    if not _user_agent:
+        _user_agent = UserAgent()
+    return _user_agent
+
 
 class UrlReaderMode(IntEnum):
     HTML = 0
@@ -31,12 +48,67 @@ class APIAccountTransaction:
     to_address: str
     amount: int
     timestamp: datetime.datetime
+    block_number: Optional[int] = None
+
+
+@dataclass
+class APISyncCursor:
+    """
+    Position of the last synced transaction: block number for EVM chains,
+    block timestamp and pending TronGrid page fingerprint for Tron.
+    """
+    block_number: Optional[int] = None
+    timestamp: Optional[datetime.datetime] = None
+    fingerprint: Optional[str] = None
+
+    def __bool__(self) -> bool:
+        return self.block_number is not None or self.timestamp is not None or self.fingerprint is not None
+
+
+@dataclass
+class APITransactionsSync:
+    transactions: List[APIAccountTransaction]
+    cursor: APISyncCursor
+
+
+@dataclass
+class APITransactionsPage:
+    """
+    One page of the account history, `next_cursor` is None on the last page.
+    """
+    transactions: List[APIAccountTransaction]
+    next_cursor: Optional[str]
+
+
+SYNC_MAX_PAGES: int = 10
+
+
+async def get_latest_transactions_sync(transactions: Optional[AsyncIterator[APIAccountTransaction]]
+                                       ) -> Optional[APITransactionsSync]:
+    """
+    First sync of the account: the latest page of transactions, the cursor points to the newest of them.
+    """
+    if transactions is None:
+        return
+    transactions = [transaction async for transaction in transactions]
+    return APITransactionsSync(transactions=transactions,
+                               cursor=APISyncCursor(
+                                   block_number=max((tx.block_number for tx in transactions
+                                                     if tx.block_number is not None), default=None),
+                                   timestamp=max((tx.timestamp for tx in transactions), default=None)))
+
+
+async def iterate_records(records: Iterable[Any]) -> AsyncIterator[Any]:
+    for record in records:
+        yield record
 
 
 class UrlReader:
     """
     This is base class get JSON data or HTML page from various API.
     """
+    api_key_param: Optional[str] = None
+    api_key_header: Optional[str] = None
 
     def __init__(self,
                  session: Optional[aiohttp.ClientSession] = None,
@@ -46,6 +118,11 @@ class UrlReader:
                  data: Optional[Dict] = None,
                  mode: UrlReaderMode = UrlReaderMode.JSON,
                  method: str = "GET",
+                 key_pool: Optional[ApiKeyPool] = None,
+                 stream: bool = False,
+                 json_loads: JsonLoads = json.loads,
+                 response_cache: Optional[ResponseCache] = None,
+                 cache_ttls: Optional[CacheTTLs] = None,
                  logger: Optional[logging.Logger] = None,
                  **kwargs) -> None:
         self.__session = session or aiohttp.ClientSession()
@@ -55,10 +132,13 @@ class UrlReader:
         self.__data = data or None
         self.__mode = mode
         self.__method = method
-        self.__response_status = 0
-        self.__response_url: StrOrURL = ''
+        self.__key_pool = key_pool
+        self.__stream = stream
+        self.__json_loads = json_loads
+        self.__response_cache = response_cache
+        self.__cache_ttls = cache_ttls or {}
+        self.__in_flight = SingleFlight()
         self.__logger = logger or logging.getLogger(self.__class__.__module__)
-        self.__result = None
 
     @property
     def session(self):
@@ -101,92 +181,273 @@ class UrlReader:
         self.__data = data
 
     @property
-    def status(self):
-        return self.__response_status
+    def key_pool(self) -> Optional[ApiKeyPool]:
+        return self.__key_pool
+
+    @key_pool.setter
+    def key_pool(self, key_pool: ApiKeyPool):
+        self.__key_pool = key_pool
+
+    @property
+    def stream(self) -> bool:
+        return self.__stream
+
+    @stream.setter
+    def stream(self, stream: bool):
+        self.__stream = stream
 
     @property
-    def response_url(self) -> StrOrURL:
-        return self.__response_url
+    def response_cache(self) -> Optional[ResponseCache]:
+        return self.__response_cache
+
+    @response_cache.setter
+    def response_cache(self, response_cache: ResponseCache):
+        self.__response_cache = response_cache
+
+    def is_rate_limited(self, status: int, result: Optional[Dict[str, Any] | str]) -> bool:
+        return status == 429
+
+    def cache_endpoint(self, url: StrOrURL, params: Optional[Dict]) -> Optional[str]:
+        """
+        :return: endpoint name to look up its TTL in `cache_ttls`, None if responses are never cached
+        """
+        return
+
+    def is_cacheable(self, result: Optional[Dict[str, Any] | str]) -> bool:
+        return result is not None
 
     @property
     def logger(self):
         return self.__logger
 
+    async def __prepare_request(self,
+                                url: Optional[StrOrURL],
+                                params: Optional[Dict]
+                                ) -> Tuple[StrOrURL, Optional[Dict], Optional[Dict], Optional[str]]:
+        url = url or self.url
+        if not url:
+            self.__logger.error("Url can not be None.")
+            raise ValueError("Url can not be None.")
+        params = self.params if params is None else params
+        headers = self.headers
+        api_key = await self.key_pool.acquire() if self.key_pool else None
+        if api_key and self.api_key_param:
+            params = {**(params or {}), self.api_key_param: api_key}
+        if api_key and self.api_key_header:
+            headers = {**(headers or {}), self.api_key_header: api_key}
+        return url, params, headers, api_key
+
+    def __check_rate_limit(self, response: aiohttp.ClientResponse, result: Optional[Dict[str, Any] | str],
+                           api_key: Optional[str]) -> None:
+        if not self.is_rate_limited(response.status, result):
+            return
+        retry_after = response.headers.get("Retry-After", "")
+        retry_after = float(retry_after) if retry_after.isdigit() else 1.0
+        if self.key_pool:
+            self.key_pool.penalize(api_key, retry_after)
+        self.__logger.warning("Rate limit exceeded for %s", response.url)
+        raise RateLimitExceeded(api_key, retry_after)
+
+    def __cache_ttl(self, url: Optional[StrOrURL], params: Optional[Dict]) -> float:
+        """
+        :return: TTL of the request responses, 0 if they are not cached
+        """
+        if self.__response_cache is None:
+            return 0
+        endpoint = self.cache_endpoint(url or self.url, self.params if params is None else params)
+        return self.__cache_ttls.get(endpoint, 0) if endpoint else 0
+
+    async def __cached(self, kind: str, url: Optional[StrOrURL], params: Optional[Dict],
+                       fetch: Callable[[], Awaitable[Any]], cacheable: Callable[[Any], bool]) -> Any:
+        """
+        Read through the response cache, concurrent identical requests share one in-flight fetch.
+        """
+        url = url or self.url
+        params = self.params if params is None else params
+        if not (ttl := self.__cache_ttl(url, params)):
+            return await fetch()
+        key = make_cache_key(f"{kind}:{url}", params, exclude=(self.api_key_param,))
+
+        async def read_through() -> Any:
+            if (result := await self.__response_cache.get(key)) is not None:
+                return result
+            result = await fetch()
+            if cacheable(result):
+                await self.__response_cache.set(key, result, ttl)
+            return result
+
+        return await self.__in_flight.do(key, read_through)
+
+    async def get_raw_data(self,
+                           url: Optional[StrOrURL] = None,
+                           params: Optional[Dict] = None,
+                           data: Optional[Dict | List] = None) -> Optional[Dict[str, Any] | List | str]:
+        """
+        Request arguments are passed per call and never stored in the reader,
+        so one reader instance can serve concurrent requests.
+        :param url: request url, reader url is used if None
+        :param params: request params, reader params are used if None
+        :param data: JSON body of the request, reader data is used if None. Responses to bodies are not cached
+        :return JSON Result:
+        """
+        if data is not None:
+            return await self.__fetch_raw_data(url, params, data)
+        return await self.__cached("raw", url, params,
+                                   fetch=lambda: self.__fetch_raw_data(url, params, data),
+                                   cacheable=self.is_cacheable)
+
     @tenacity.retry(stop=tenacity.stop_after_attempt(6), wait=tenacity.wait_random(min=0.2, max=0.5),
                     after=tenacity.after_log(logging.getLogger(__name__), logging.ERROR))
-    async def get_raw_data(self) -> Optional[Dict[str, Any] | str]:
+    async def __fetch_raw_data(self,
+                               url: Optional[StrOrURL] = None,
+                               params: Optional[Dict] = None,
+                               data: Optional[Dict | List] = None) -> Optional[Dict[str, Any] | List | str]:
+        url, params, headers, api_key = await self.__prepare_request(url, params)
+        result = None
+        method = self.session.get if self.__method == "GET" else self.session.post
+        async with method(url=url, params=params, headers=headers,
+                          json=self.data if data is None else data) as response:
+            if response.status != 429:
+                result = await response.json(encoding='utf-8', loads=self.__json_loads) \
+                    if self.__mode == UrlReaderMode.JSON else await response.text()
+        self.__check_rate_limit(response, result, api_key)
+        return result
+
+    @tenacity.retry(stop=tenacity.stop_after_attempt(6), wait=tenacity.wait_random(min=0.2, max=0.5),
+                    after=tenacity.after_log(logging.getLogger(__name__), logging.ERROR))
+    async def __stream_json_records(self,
+                                    array_key: str,
+                                    process: Callable[[Any], Any],
+                                    url: Optional[StrOrURL] = None,
+                                    params: Optional[Dict] = None) -> Optional[JsonRecords]:
+        url, params, headers, api_key = await self.__prepare_request(url, params)
+        records = None
+        method = self.session.get if self.__method == "GET" else self.session.post
+        async with method(url=url, params=params, headers=headers, json=self.data) as response:
+            if response.status != 429:
+                records = await JsonObjectStream(response.content, array_key, loads=self.__json_loads).read(process)
+        self.__check_rate_limit(response, records.fields if records else None, api_key)
+        return records
+
+    @tenacity.retry(stop=tenacity.stop_after_attempt(6), wait=tenacity.wait_random(min=0.2, max=0.5),
+                    after=tenacity.after_log(logging.getLogger(__name__), logging.ERROR))
+    async def __open_json_records(self,
+                                  array_key: str,
+                                  process: Callable[[Any], Any],
+                                  url: Optional[StrOrURL] = None,
+                                  params: Optional[Dict] = None,
+                                  is_valid: Optional[Callable[[Dict[str, Any]], bool]] = None
+                                  ) -> Optional[AsyncIterator[Any]]:
         """
-        :return JSON Result:
+        Open the response and read it up to the `array_key` array, the rest of it is read by the returned iterator.
         """
-        if not self.url:
-            self.__logger.error("Url can not be None.")
-            raise ValueError("Url can not be None.")
-        self.__result = None
+        url, params, headers, api_key = await self.__prepare_request(url, params)
         method = self.session.get if self.__method == "GET" else self.session.post
-        async with method(url=self.url, params=self.params, headers=self.headers, json=self.data) as response:
-            self.__response_url = response.url
-            self.__response_status = response.status
-            self.__result = await response.json(encoding='utf-8') \
-                if self.__mode == UrlReaderMode.JSON else await response.text()
-        return self.__result
+        response = await method(url=url, params=params, headers=headers, json=self.data)
+        try:
+            stream = JsonObjectStream(response.content, array_key, loads=self.__json_loads)
+            is_opened = response.status != 429 and await stream.open_array()
+            self.__check_rate_limit(response, stream.fields if response.status != 429 else None, api_key)
+        except BaseException:
+            response.release()
+            raise
+        if not is_opened or (is_valid and not is_valid(stream.fields)):
+            response.release()
+            return
+
+        async def read_records() -> AsyncIterator[Any]:
+            try:
+                async for record in stream.records(process):
+                    yield record
+            finally:
+                response.release()
+
+        return read_records()
+
+    async def get_json_records(self,
+                               array_key: str,
+                               process: Callable[[Any], Any],
+                               url: Optional[StrOrURL] = None,
+                               params: Optional[Dict] = None) -> Optional[JsonRecords]:
+        """
+        Read JSON object and map items of its `array_key` array by `process`, None results are dropped.
+        In stream mode items are decoded and mapped one by one while the body is read,
+        so neither the body nor the dict tree of the whole array is kept in memory.
+        Cached responses are kept as the decoded JSON object and mapped after every read,
+        they are shared with `get_raw_data` of the same request.
+        :return: mapped records and the rest of the object fields
+        """
+        if self.__cache_ttl(url, params):
+            return map_json_records(await self.get_raw_data(url=url, params=params), array_key, process)
+        if self.__stream:
+            return await self.__stream_json_records(array_key, process, url=url, params=params)
+        return map_json_records(await self.__fetch_raw_data(url=url, params=params), array_key, process)
+
+    async def iter_json_records(self,
+                                array_key: str,
+                                process: Callable[[Any], Any],
+                                url: Optional[StrOrURL] = None,
+                                params: Optional[Dict] = None,
+                                is_valid: Optional[Callable[[Dict[str, Any]], bool]] = None
+                                ) -> Optional[AsyncIterator[Any]]:
+        """
+        Items of the `array_key` array of JSON object mapped by `process`, None results are dropped.
+        In stream mode not cached responses are read while the caller iterates over the records,
+        the response is released once the iterator is exhausted or closed.
+        :param is_valid: check of the object fields, in stream mode only fields preceding the array are known to it
+        :return: None if the object has no such array or its fields are not valid
+        """
+        if self.__stream and not self.__cache_ttl(url, params):
+            return await self.__open_json_records(array_key, process, url=url, params=params, is_valid=is_valid)
+        records = await self.get_json_records(array_key, process, url=url, params=params)
+        if not records or records.records is None or (is_valid and not is_valid(records.fields)):
+            return
+        return iterate_records(records.records)
 
 
 TRON_API_URL: str = "https://api.trongrid.io/v1/accounts/"
 TRON_USDT_CONTRACT: str = "TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t"
+TRON_API_RPS: float = 10.0
+TRON_PAGE_LIMIT: int = 200
 
 
 class TronAccountReader(UrlReader):
+    api_key_header = 'TRON-PRO-API-KEY'
+
     def __init__(self,
                  session: aiohttp.ClientSession,
-                 address: str,
                  api_keys: list[str],
                  url: StrOrURL = TRON_API_URL,
                  usdt_contract: str = TRON_USDT_CONTRACT,
+                 key_pool: Optional[ApiKeyPool] = None,
+                 stream: bool = False,
+                 json_loads: JsonLoads = json.loads,
+                 response_cache: Optional[ResponseCache] = None,
+                 cache_ttls: Optional[CacheTTLs] = None,
                  logger: Optional[logging.Logger] = None) -> None:
-        super().__init__(session=session, url=url, logger=logger)
+        super().__init__(session=session, url=url, key_pool=key_pool or get_key_pool(api_keys, TRON_API_RPS),
+                         stream=stream, json_loads=json_loads, response_cache=response_cache,
+                         cache_ttls=cache_ttls, logger=logger)
         self.__base_url = url
-        self.__address = address
-        self.__api_keys = api_keys
-        self.__api_key = random.choice(api_keys)
         self.__usdt_contract = usdt_contract
-        self.__ua = UserAgent()
-
-        if not self.headers:
-            self.headers = {}
-        self.headers['User-Agent'] = self.__ua.random
-        self.headers['Content-Type'] = "application/json"
-        self.headers['Accept'] = "application/json"
-        self.headers['TRON-PRO-API-KEY'] = self.__api_key
-
-        if not self.params:
-            self.params = {}
-
-    @property
-    def address(self):
-        return self.__address
-
-    @address.setter
-    def address(self, wallet):
-        self.__address = wallet
-        self.__api_key = random.choice(self.__api_keys)
-        self.headers['TRON-PRO-API-KEY'] = self.__api_key
-        self.headers['User-Agent'] = self.__ua.random
-
-    @property
-    def api_key(self):
-        return self.__api_key
 
-    @api_key.setter
-    def api_key(self, api_key):
-        self.__api_key = api_key
+        self.headers = {'User-Agent': get_user_agent().random,
+                        'Content-Type': "application/json",
+                        'Accept': "application/json"}
 
     @property
     def usdt_contract(self):
         return self.__usdt_contract
 
-    @usdt_contract.setter
-    def usdt_contract(self, usdt_contract):
-        self.__usdt_contract = usdt_contract
+    def cache_endpoint(self, url: StrOrURL, params: Optional[Dict]) -> Optional[str]:
+        if "/transactions" not in str(url):
+            return "balance"
+        # ascending reads are incremental syncs, they must see the newest transactions
+        if not (params or {}).get("order_by", "").endswith(",asc"):
+            return "transactions"
+
+    def is_cacheable(self, result: Optional[Dict[str, Any] | str]) -> bool:
+        return isinstance(result, dict) and bool(result.get("success"))
 
     @staticmethod
     def hex_to_base58(hex_string):
@@ -196,9 +457,8 @@ class TronAccountReader(UrlReader):
         base58_str = base58.b58encode_check(bytes_str)
         return base58_str.decode("UTF-8")
 
-    async def get_account_data(self) -> Optional[APIAccountBalance]:
-        self.url = self.__base_url + self.__address
-        raw_data = await self.get_raw_data()
+    async def get_account_data(self, address: str) -> Optional[APIAccountBalance]:
+        raw_data = await self.get_raw_data(url=self.__base_url + address, params={})
         result = raw_data.get("success") if raw_data else None
         if result:
             data = next((data for data in raw_data.get("data")), None)
@@ -208,15 +468,15 @@ class TronAccountReader(UrlReader):
             trc20 = data.get("trc20")
             trc20_usdt_balance = int(next((item.get(self.__usdt_contract, 0) for item in trc20
                                            if item.get(self.__usdt_contract)), 0)) if trc20 else 0
-            return APIAccountBalance(address=self.__address,
+            return APIAccountBalance(address=address,
                                      native_balance=trx_balance,
                                      token_balance=trc20_usdt_balance)
 
-    def __process_native_transaction(self, trn) -> Optional[APIAccountTransaction]:
+    @staticmethod
+    def __process_native_transaction(trn) -> Optional[APIAccountTransaction]:
         contract = next((item for item in trn.get("raw_data").get("contract")), None)
         if not contract or contract.get("type") != "TransferContract":
             return
-        address = self.__address
         amount = contract.get("parameter").get("value").get("amount")
         owner_address = TronAccountReader.hex_to_base58(contract.get("parameter").get("value").get("owner_address"))
         to_address = TronAccountReader.hex_to_base58(contract.get("parameter").get("value").get("to_address"))
@@ -225,196 +485,615 @@ class TronAccountReader(UrlReader):
         return APIAccountTransaction(from_address=owner_address,
                                      to_address=to_address,
                                      amount=amount,
-                                     timestamp=timestamp)
+                                     timestamp=timestamp,
+                                     block_number=trn.get("blockNumber"))
 
-    async def get_native_transactions(self) -> Optional[Generator[APIAccountTransaction, Any, None]]:
-        self.url = self.__base_url + self.__address + "/transactions"
-        params = self.params
-        headers = self.headers
-        self.params["only_confirmed"] = "true"
-        self.params["search_internal"] = "false"
-        self.params["limit"] = 200
-        try:
-            raw_data = await self.get_raw_data()
-        finally:
-            self.params = params
-            self.headers = headers
-        result = raw_data.get("success") if raw_data else None
+    @staticmethod
+    def __process_token_transaction(trn) -> Optional[APIAccountTransaction]:
+        if not abs(int(trn["value"])):
+            return
+        return APIAccountTransaction(from_address=trn["from"],
+                                     to_address=trn["to"],
+                                     amount=int(trn["value"]),
+                                     timestamp=datetime.datetime.fromtimestamp(trn.get('block_timestamp') / 1000.0,
+                                                                               datetime.timezone.utc))
 
-        if result:
-            data = raw_data.get("data")
-            return (record for trn in data if (record := self.__process_native_transaction(trn)))
+    @staticmethod
+    def __is_success(fields: Dict[str, Any]) -> bool:
+        # TronGrid puts "success" after "data", so a streamed page is only rejected by an explicit failure
+        return fields.get("success") is not False
 
-    async def get_token_transactions(self) -> Optional[Generator[APIAccountTransaction, Any, None]]:
-        self.url = self.__base_url + self.__address + "/transactions/trc20"
-        params = self.params
-        headers = self.headers
-        self.params["contract_address"] = self.__usdt_contract
-        self.params["only_confirmed"] = "true"
-        self.params["limit"] = 200
-        try:
-            raw_data = await self.get_raw_data()
-        finally:
-            self.params = params
-            self.headers = headers
-        result = raw_data.get("success") if raw_data else None
-        if result:
-            data = raw_data.get("data")
-            return (APIAccountTransaction(from_address=trn["from"],
-                                          to_address=trn["to"],
-                                          amount=int(trn["value"]),
-                                          timestamp=datetime.datetime.fromtimestamp(trn.get('block_timestamp') / 1000.0,
-                                                                                    datetime.timezone.utc))
-                    for trn in data if abs(int(trn["value"])))
+    async def get_native_transactions(self, address: str) -> Optional[AsyncIterator[APIAccountTransaction]]:
+        return await self.iter_json_records(array_key="data",
+                                            process=self.__process_native_transaction,
+                                            url=self.__base_url + address + "/transactions",
+                                            params={"only_confirmed": "true",
+                                                    "search_internal": "false",
+                                                    "limit": TRON_PAGE_LIMIT},
+                                            is_valid=self.__is_success)
+
+    async def get_token_transactions(self, address: str) -> Optional[AsyncIterator[APIAccountTransaction]]:
+        return await self.iter_json_records(array_key="data",
+                                            process=self.__process_token_transaction,
+                                            url=self.__base_url + address + "/transactions/trc20",
+                                            params={"contract_address": self.__usdt_contract,
+                                                    "only_confirmed": "true",
+                                                    "limit": TRON_PAGE_LIMIT},
+                                            is_valid=self.__is_success)
+
+    async def __sync_transactions(self, url: str, params: Dict, cursor: APISyncCursor,
+                                  process) -> Optional[APITransactionsSync]:
+        """
+        Read transactions newer than cursor timestamp in ascending order following the fingerprint pagination.
+        If SYNC_MAX_PAGES is not enough to catch up, the cursor keeps its timestamp and the pending fingerprint,
+        so the next sync continues from the same page.
+        """
+        params = {**params, "only_confirmed": "true", "order_by": "block_timestamp,asc", "limit": TRON_PAGE_LIMIT}
+        if cursor.timestamp:
+            params["min_timestamp"] = int(cursor.timestamp.timestamp() * 1000)
+        fingerprint = cursor.fingerprint
+        last_timestamp = cursor.timestamp
+        transactions = []
+        for page in range(SYNC_MAX_PAGES):
+            records = await self.get_json_records(array_key="data",
+                                                  process=process,
+                                                  url=url,
+                                                  params={**params, "fingerprint": fingerprint} if fingerprint
+                                                  else params)
+            if not records or not records.fields.get("success"):
+                if not page:
+                    return
+                break
+            transactions.extend(records.records or [])
+            if records.last_item:
+                timestamp = datetime.datetime.fromtimestamp(records.last_item.get("block_timestamp") / 1000.0,
+                                                            datetime.timezone.utc)
+                last_timestamp = max(last_timestamp, timestamp) if last_timestamp else timestamp
+            if not (fingerprint := (records.fields.get("meta") or {}).get("fingerprint")):
+                break
+
+        if fingerprint:
+            return APITransactionsSync(transactions=transactions,
+                                       cursor=APISyncCursor(timestamp=cursor.timestamp, fingerprint=fingerprint))
+        return APITransactionsSync(transactions=transactions, cursor=APISyncCursor(timestamp=last_timestamp))
+
+    async def sync_native_transactions(self, address: str,
+                                       cursor: Optional[APISyncCursor] = None) -> Optional[APITransactionsSync]:
+        if not cursor:
+            transactions = await self.get_native_transactions(address)
+            return await get_latest_transactions_sync(transactions)
+        return await self.__sync_transactions(url=self.__base_url + address + "/transactions",
+                                              params={"search_internal": "false"},
+                                              cursor=cursor,
+                                              process=self.__process_native_transaction)
+
+    async def sync_token_transactions(self, address: str,
+                                      cursor: Optional[APISyncCursor] = None) -> Optional[APITransactionsSync]:
+        if not cursor:
+            transactions = await self.get_token_transactions(address)
+            return await get_latest_transactions_sync(transactions)
+        return await self.__sync_transactions(url=self.__base_url + address + "/transactions/trc20",
+                                              params={"contract_address": self.__usdt_contract},
+                                              cursor=cursor,
+                                              process=self.__process_token_transaction)
+
+    async def get_history_page(self, address: str, tx_type: str,
+                               cursor: Optional[str] = None) -> Optional[APITransactionsPage]:
+        """
+        Page of the account history from the newest transaction to the oldest one.
+        :param cursor: TronGrid fingerprint of the page, None for the first page
+        """
+        if tx_type == "native":
+            url, params, process = (self.__base_url + address + "/transactions",
+                                    {"search_internal": "false"},
+                                    self.__process_native_transaction)
+        else:
+            url, params, process = (self.__base_url + address + "/transactions/trc20",
+                                    {"contract_address": self.__usdt_contract},
+                                    self.__process_token_transaction)
+        params = {**params, "only_confirmed": "true", "limit": TRON_PAGE_LIMIT}
+        if cursor:
+            params["fingerprint"] = cursor
+        records = await self.get_json_records(array_key="data", process=process, url=url, params=params)
+        if not records or not records.fields.get("success"):
+            return
+        return APITransactionsPage(transactions=records.records or [],
+                                   next_cursor=(records.fields.get("meta") or {}).get("fingerprint"))
 
 
 ETHERSCAN_API_URL: str = "https://api.etherscan.io/api"
 ETHERSCAN_USDT_CONTRACT: str = "0xdAC17F958D2ee523a2206206994597C13D831ec7"
 BSCSCAN_API_URL: str = "https://api.bscscan.com/api"
 BSCSCAN_USDT_CONTRACT: str = "0x55d398326f99059ff775485246999027b3197955"
+ETHERSCAN_API_RPS: float = 5.0
+ETHERSCAN_BALANCEMULTI_LIMIT: int = 20
+ETHERSCAN_PAGE_SIZE: int = 100
+ETHERSCAN_HISTORY_PAGE_SIZE: int = 1000
+ETHERSCAN_MAX_BLOCK: int = 99999999
+ETHERSCAN_MAX_RESULT_WINDOW: int = 10000
 
 
 class EthereumAccountReader(UrlReader):
+    api_key_param = "apikey"
+
     def __init__(self,
                  session: aiohttp.ClientSession,
-                 address: str,
                  api_keys: list[str],
                  url: StrOrURL = ETHERSCAN_API_URL,
                  usdt_contract: str = ETHERSCAN_USDT_CONTRACT,
+                 key_pool: Optional[ApiKeyPool] = None,
+                 stream: bool = False,
+                 json_loads: JsonLoads = json.loads,
+                 response_cache: Optional[ResponseCache] = None,
+                 cache_ttls: Optional[CacheTTLs] = None,
                  logger: Optional[logging.Logger] = None) -> None:
-        super().__init__(session=session, url=url, logger=logger)
-        self.__base_url = url
-        self.__address = address
-        self.__api_keys = api_keys
-        self.__api_key = random.choice(api_keys)
+        super().__init__(session=session, url=url, key_pool=key_pool or get_key_pool(api_keys, ETHERSCAN_API_RPS),
+                         stream=stream, json_loads=json_loads, response_cache=response_cache,
+                         cache_ttls=cache_ttls, logger=logger)
         self.__usdt_contract = usdt_contract
-        self.__ua = UserAgent()
-
-        if not self.headers:
-            self.headers = {}
-        self.headers['User-Agent'] = self.__ua.random
-        self.headers['Content-Type'] = "application/json"
-        self.headers['Accept'] = "application/json"
-
-        if not self.params:
-            self.params = {}
-        self.__native_balance_params = {"module": "account",
-                                        "action": "balance",
-                                        "address": address,
-                                        "tag": "latest",
-                                        "apikey": self.__api_key}
-        self.__token_balance_params = {"module": "account",
-                                       "action": "tokenbalance",
-                                       "contractaddress": usdt_contract,
-                                       "address": address,
-                                       "tag": "latest",
-                                       "apikey": self.__api_key}
-        self.__native_transactions_params = {"module": "account",
-                                             "action": "txlist",
-                                             "address": address,
-                                             "page": 1,
-                                             "offset": 100,
-                                             "startblock": 0,
-                                             "endblock": 99999999,
-                                             "sort": "desc",
-                                             "apikey": self.__api_key}
-        self.__token_transactions_params = {"module": "account",
-                                            "action": "tokentx",
-                                            "contractaddress": usdt_contract,
-                                            "address": address,
-                                            "page": 1,
-                                            "offset": 100,
-                                            "startblock": 0,
-                                            "endblock": 99999999,
-                                            "sort": "desc",
-                                            "apikey": self.__api_key}
 
-    @property
-    def address(self):
-        return self.__address
-
-    @address.setter
-    def address(self, address):
-        self.__address = address
-        self.__api_key = random.choice(self.__api_keys)
-        self.headers['User-Agent'] = self.__ua.random
-        self.__native_balance_params["address"] = address
-        self.__native_balance_params["apikey"] = self.__api_key
-        self.__token_balance_params["address"] = address
-        self.__token_balance_params["apikey"] = self.__api_key
-        self.__native_transactions_params["address"] = address
-        self.__native_transactions_params["apikey"] = self.__api_key
-        self.__token_transactions_params["address"] = address
-        self.__token_transactions_params["apikey"] = self.__api_key
+        self.headers = {'User-Agent': get_user_agent().random,
+                        'Content-Type': "application/json",
+                        'Accept': "application/json"}
 
     @property
-    def api_keys(self):
-        return self.__api_keys
-
-    @api_keys.setter
-    def api_keys(self, api_keys):
-        self.__api_keys = api_keys
-        self.__api_key = random.choice(api_keys)
-        self.__native_balance_params["apikey"] = self.__api_key
-        self.__token_balance_params["apikey"] = self.__api_key
-        self.__native_transactions_params["apikey"] = self.__api_key
-        self.__token_transactions_params["apikey"] = self.__api_key
+    def usdt_contract(self):
+        return self.__usdt_contract
 
-    @property
-    def api_key(self):
-        return self.__api_key
+    def is_rate_limited(self, status: int, result: Optional[Dict[str, Any] | str]) -> bool:
+        return super().is_rate_limited(status, result) or (
+                isinstance(result, dict) and result.get("message") == "NOTOK" and
+                "rate limit" in str(result.get("result")).lower())
 
-    @api_key.setter
-    def api_key(self, api_key):
-        self.__api_key = api_key
-        self.__native_balance_params["apikey"] = api_key
-        self.__token_balance_params["apikey"] = api_key
-        self.__native_transactions_params["apikey"] = api_key
-        self.__token_transactions_params["apikey"] = api_key
+    def cache_endpoint(self, url: StrOrURL, params: Optional[Dict]) -> Optional[str]:
+        action = (params or {}).get("action")
+        if action in ("balance", "balancemulti", "tokenbalance"):
+            return "balance"
+        # ascending reads are incremental syncs, they must see the newest transactions
+        if action in ("txlist", "tokentx") and params.get("sort") == "desc":
+            return "transactions"
 
-    @property
-    def usdt_contract(self):
-        return self.__usdt_contract
+    def is_cacheable(self, result: Optional[Dict[str, Any] | str]) -> bool:
+        return isinstance(result, dict) and (result.get("message") == "OK" or
+                                             result.get("message") == "No transactions found")
 
-    @usdt_contract.setter
-    def usdt_contract(self, usdt_contract):
-        self.__usdt_contract = usdt_contract
-        self.__token_balance_params["contractaddress"] = usdt_contract
-        self.__token_transactions_params["contractaddress"] = usdt_contract
+    async def get_account_data(self, address: str) -> Optional[APIAccountBalance]:
+        """
+        Native and token balances are read concurrently.
+        """
+        native_balance, token_balance = await asyncio.gather(self.get_native_balance(address),
+                                                             self.get_token_balance(address))
+        if native_balance is None or token_balance is None:
+            return
+        return APIAccountBalance(address=address,
+                                 native_balance=native_balance,
+                                 token_balance=token_balance)
 
-    async def get_account_data(self) -> Optional[APIAccountBalance]:
-        self.params = self.__native_balance_params
-        native_balance_raw_data = await self.get_raw_data()
-        if native_balance_raw_data and native_balance_raw_data.get("message") != "OK":
+    async def get_native_balance(self, address: str) -> Optional[int]:
+        raw_data = await self.get_raw_data(params={"module": "account",
+                                                   "action": "balance",
+                                                   "address": address,
+                                                   "tag": "latest"})
+        if not raw_data or raw_data.get("message") != "OK":
             return
-        await asyncio.sleep(0.2)
-        self.params = self.__token_balance_params
-        token_balance_raw_data = await self.get_raw_data()
-        if token_balance_raw_data and token_balance_raw_data.get("message") != "OK":
+        return int(raw_data.get("result"))
+
+    async def __get_native_balances(self, addresses: List[str]) -> Dict[str, int]:
+        raw_data = await self.get_raw_data(params={"module": "account",
+                                                   "action": "balancemulti",
+                                                   "address": ",".join(addresses),
+                                                   "tag": "latest"})
+        if not raw_data or raw_data.get("message") != "OK":
+            return {}
+        return {item["account"].lower(): int(item["balance"]) for item in raw_data.get("result", [])}
+
+    async def get_token_balance(self, address: str) -> Optional[int]:
+        raw_data = await self.get_raw_data(params={"module": "account",
+                                                   "action": "tokenbalance",
+                                                   "contractaddress": self.__usdt_contract,
+                                                   "address": address,
+                                                   "tag": "latest"})
+        if not raw_data or raw_data.get("message") != "OK":
             return
-        return APIAccountBalance(address=self.__address,
-                                 native_balance=int(native_balance_raw_data.get("result")),
-                                 token_balance=int(token_balance_raw_data.get("result")), )
-
-    def __process_transaction(self, data) -> Optional[Generator[APIAccountTransaction, Any, None]]:
-        address = self.__address
-        return (APIAccountTransaction(from_address=trn["from"],
-                                      to_address=trn["to"],
-                                      amount=int(trn["value"]),
-                                      timestamp=datetime.datetime.fromtimestamp(int(trn.get('timeStamp')),
-                                                                                datetime.timezone.utc))
-                for trn in data if abs(int(trn["value"])))
-
-    async def get_native_transactions(self) -> Optional[Generator[APIAccountTransaction, Any, None]]:
-        self.params = self.__native_transactions_params
-        native_transactions_raw_data = await self.get_raw_data()
-        if native_transactions_raw_data and native_transactions_raw_data.get("message") != "OK":
+        return int(raw_data.get("result"))
+
+    async def get_accounts_data(self, addresses: List[str]) -> Dict[str, APIAccountBalance]:
+        """
+        Native balances are read by `balancemulti` in chunks of ETHERSCAN_BALANCEMULTI_LIMIT addresses,
+        token balances are read concurrently, all requests are throttled by the key pool.
+        :return: balances of the addresses which were read successfully
+        """
+        addresses = list(dict.fromkeys(addresses))
+        chunks = [addresses[i:i + ETHERSCAN_BALANCEMULTI_LIMIT]
+                  for i in range(0, len(addresses), ETHERSCAN_BALANCEMULTI_LIMIT)]
+        results = await asyncio.gather(*(self.__get_native_balances(chunk) for chunk in chunks),
+                                       *(self.get_token_balance(address) for address in addresses),
+                                       return_exceptions=True)
+        native_balances = {}
+        for result in results[:len(chunks)]:
+            if isinstance(result, BaseException):
+                self.logger.error("Error while reading native balances: %r", result)
+                continue
+            native_balances.update(result)
+
+        accounts = {}
+        for address, token_balance in zip(addresses, results[len(chunks):]):
+            if isinstance(token_balance, BaseException):
+                self.logger.error("Error while reading token balance of %s: %r", address, token_balance)
+                continue
+            if token_balance is None or (native_balance := native_balances.get(address.lower())) is None:
+                continue
+            accounts[address] = APIAccountBalance(address=address,
+                                                  native_balance=native_balance,
+                                                  token_balance=token_balance)
+        return accounts
+
+    @staticmethod
+    def __process_transaction(trn) -> Optional[APIAccountTransaction]:
+        if not abs(int(trn["value"])):
             return
-        return self.__process_transaction(native_transactions_raw_data.get("result", []))
+        return APIAccountTransaction(from_address=trn["from"],
+                                     to_address=trn["to"],
+                                     amount=int(trn["value"]),
+                                     timestamp=datetime.datetime.fromtimestamp(int(trn.get('timeStamp')),
+                                                                               datetime.timezone.utc),
+                                     block_number=int(trn["blockNumber"]) if trn.get("blockNumber") else None)
+
+    async def __get_transaction_records(self, params: Dict) -> Optional[JsonRecords]:
+        return await self.get_json_records(array_key="result", process=self.__process_transaction, params=params)
+
+    async def get_native_transactions(self, address: str) -> Optional[AsyncIterator[APIAccountTransaction]]:
+        return await self.iter_json_records(array_key="result",
+                                            process=self.__process_transaction,
+                                            params={"module": "account",
+                                                    "action": "txlist",
+                                                    "address": address,
+                                                    "page": 1,
+                                                    "offset": ETHERSCAN_PAGE_SIZE,
+                                                    "startblock": 0,
+                                                    "endblock": ETHERSCAN_MAX_BLOCK,
+                                                    "sort": "desc"},
+                                            is_valid=lambda fields: fields.get("message") == "OK")
+
+    async def get_token_transactions(self, address: str) -> Optional[AsyncIterator[APIAccountTransaction]]:
+        return await self.iter_json_records(array_key="result",
+                                            process=self.__process_transaction,
+                                            params={"module": "account",
+                                                    "action": "tokentx",
+                                                    "contractaddress": self.__usdt_contract,
+                                                    "address": address,
+                                                    "page": 1,
+                                                    "offset": ETHERSCAN_PAGE_SIZE,
+                                                    "startblock": 0,
+                                                    "endblock": ETHERSCAN_MAX_BLOCK,
+                                                    "sort": "desc"},
+                                            is_valid=lambda fields: fields.get("message") == "OK")
 
-    async def get_token_transactions(self) -> Optional[Generator[APIAccountTransaction, Any, None]]:
-        self.params = self.__token_transactions_params
-        token_transactions_raw_data = await self.get_raw_data()
-        if token_transactions_raw_data and token_transactions_raw_data.get("message") != "OK":
+    async def __sync_transactions(self, params: Dict, cursor: APISyncCursor) -> Optional[APITransactionsSync]:
+        """
+        Read transactions from the cursor block (inclusive) in ascending order moving `startblock`
+        forward page by page, duplicates of the boundary block are dropped by the database.
+        A full page of one block is followed by the next page of the same `startblock`,
+        so the rest of a busy block is never skipped.
+        """
+        start_block = cursor.block_number or 0
+        block_page = 1
+        transactions = []
+        for page in range(SYNC_MAX_PAGES):
+            records = await self.__get_transaction_records(params={**params,
+                                                                   "page": block_page,
+                                                                   "offset": ETHERSCAN_PAGE_SIZE,
+                                                                   "startblock": start_block,
+                                                                   "endblock": ETHERSCAN_MAX_BLOCK,
+                                                                   "sort": "asc"})
+            if not records or records.records is None or (records.fields.get("message") != "OK" and records.count):
+                if not page:
+                    return
+                break
+            transactions.extend(records.records)
+            if not records.count:
+                break
+            last_block = int(records.last_item["blockNumber"])
+            if records.count < ETHERSCAN_PAGE_SIZE:
+                start_block = last_block
+                break
+            if last_block > start_block:
+                start_block, block_page = last_block, 1
+            else:
+                block_page += 1
+        return APITransactionsSync(transactions=transactions, cursor=APISyncCursor(block_number=start_block))
+
+    async def sync_native_transactions(self, address: str,
+                                       cursor: Optional[APISyncCursor] = None) -> Optional[APITransactionsSync]:
+        if not cursor:
+            transactions = await self.get_native_transactions(address)
+            return await get_latest_transactions_sync(transactions)
+        return await self.__sync_transactions(params={"module": "account",
+                                                      "action": "txlist",
+                                                      "address": address},
+                                              cursor=cursor)
+
+    async def sync_token_transactions(self, address: str,
+                                      cursor: Optional[APISyncCursor] = None) -> Optional[APITransactionsSync]:
+        if not cursor:
+            transactions = await self.get_token_transactions(address)
+            return await get_latest_transactions_sync(transactions)
+        return await self.__sync_transactions(params={"module": "account",
+                                                      "action": "tokentx",
+                                                      "contractaddress": self.__usdt_contract,
+                                                      "address": address},
+                                              cursor=cursor)
+
+    async def get_history_page(self, address: str, tx_type: str,
+                               cursor: Optional[str] = None) -> Optional[APITransactionsPage]:
+        """
+        Page of the account history from the newest transaction to the oldest one.
+        Pages are `endblock` windows, so the walk is not limited by Etherscan's page * offset <= 10000.
+        Transactions of the oldest block of a full page are left to the next page, which starts at that block,
+        and a full page of one block is followed by the next page of the same `endblock`. Only a block
+        of more than ETHERSCAN_MAX_RESULT_WINDOW transactions can not be read to the end.
+        :param cursor: "end_block" or "end_block:page" of the page (end block inclusive), None for the first page
+        """
+        params = {"module": "account", "action": "txlist", "address": address} if tx_type == "native" else \
+            {"module": "account", "action": "tokentx", "contractaddress": self.__usdt_contract, "address": address}
+        end_block, _, page = (cursor or str(ETHERSCAN_MAX_BLOCK)).partition(":")
+        end_block, page = int(end_block), int(page or 1)
+        records = await self.__get_transaction_records(params={**params,
+                                                               "page": page,
+                                                               "offset": ETHERSCAN_HISTORY_PAGE_SIZE,
+                                                               "startblock": 0,
+                                                               "endblock": end_block,
+                                                               "sort": "desc"})
+        if not records or records.records is None or (records.fields.get("message") != "OK" and records.count):
             return
-        return self.__process_transaction(token_transactions_raw_data.get("result", []))
+        transactions, next_cursor = records.records, None
+        if records.count >= ETHERSCAN_HISTORY_PAGE_SIZE:
+            last_block = int(records.last_item["blockNumber"])
+            if last_block < end_block:
+                transactions = [trn for trn in transactions if trn.block_number != last_block]
+                next_cursor = str(last_block)
+            elif (page + 1) * ETHERSCAN_HISTORY_PAGE_SIZE <= ETHERSCAN_MAX_RESULT_WINDOW:
+                next_cursor = f"{end_block}:{page + 1}"
+            else:
+                self.logger.warning("More than %d transactions of %s in block %d, the rest of them are skipped",
+                                    ETHERSCAN_MAX_RESULT_WINDOW, address, end_block)
+                next_cursor = str(end_block - 1)
+        return APITransactionsPage(transactions=transactions, next_cursor=next_cursor)
+
+
+RPC_API_RPS: float = 25.0
+RPC_BATCH_SIZE: int = 200
+RPC_LOGS_BLOCK_RANGE: int = 5000
+RPC_LOGS_MIN_BLOCK_RANGE: int = 16
+RPC_LOGS_LOOKBACK: int = 10000
+RPC_HISTORY_BLOCK_RANGE: int = 50000
+RPC_BLOCK_TIMESTAMPS_CACHE_SIZE: int = 10000
+RPC_FULL_BLOCKS_BATCH_SIZE: int = 10
+ERC20_TRANSFER_TOPIC: str = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+ERC20_BALANCE_OF_SELECTOR: str = "0x70a08231"
+
+
+class RpcError(Exception):
+    def __init__(self, method: str, error: Dict[str, Any]) -> None:
+        super().__init__(f"{method}: {error.get('message')} ({error.get('code')})")
+        self.method = method
+        self.code = error.get("code")
+
+
+class EvmRpcAccountReader(UrlReader):
+    """
+    EVM chain reader of a JSON-RPC node. Balances of many addresses are read by batch requests
+    (`eth_getBalance` and `eth_call` of USDT `balanceOf`), token transfers are read by `eth_getLogs`
+    of the Transfer topic over block ranges. JSON-RPC has no index of native transfers by address,
+    so native syncs only move the cursor, balance changes are still detected by balances.
+    """
+
+    def __init__(self,
+                 session: aiohttp.ClientSession,
+                 url: StrOrURL,
+                 usdt_contract: str = ETHERSCAN_USDT_CONTRACT,
+                 key_pool: Optional[ApiKeyPool] = None,
+                 batch_size: int = RPC_BATCH_SIZE,
+                 logs_block_range: int = RPC_LOGS_BLOCK_RANGE,
+                 json_loads: JsonLoads = json.loads,
+                 logger: Optional[logging.Logger] = None,
+                 **kwargs) -> None:
+        super().__init__(session=session, url=url, method="POST",
+                         key_pool=key_pool or get_key_pool([str(url)], RPC_API_RPS),
+                         json_loads=json_loads, logger=logger)
+        self.__usdt_contract = usdt_contract.lower()
+        self.__batch_size = batch_size
+        self.__logs_block_range = logs_block_range
+        self.__block_timestamps: Dict[int, datetime.datetime] = {}
+
+        self.headers = {'Content-Type': "application/json",
+                        'Accept': "application/json"}
+
+    @property
+    def usdt_contract(self):
+        return self.__usdt_contract
+
+    def is_rate_limited(self, status: int, result: Optional[Dict[str, Any] | List | str]) -> bool:
+        items = result if isinstance(result, list) else [result]
+        return super().is_rate_limited(status, result) or any(
+            isinstance(item, dict) and (item.get("error") or {}).get("code") == -32005 and
+            "limit" in str(item["error"].get("message")).lower() for item in items)
+
+    @staticmethod
+    def __topic(address: str) -> str:
+        return "0x" + address[2:].lower().rjust(64, "0")
+
+    async def __call_batch(self, calls: List[Tuple[str, List]]) -> List[Any]:
+        body = [{"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+                for i, (method, params) in enumerate(calls)]
+        raw_data = await self.get_raw_data(params={}, data=body)
+        if isinstance(raw_data, dict):
+            raw_data = [raw_data]
+        responses = {item.get("id"): item for item in raw_data or [] if isinstance(item, dict)}
+        results = []
+        for i, (method, _) in enumerate(calls):
+            response = responses.get(i) or {"error": {"message": "No response", "code": None}}
+            results.append(RpcError(method, response["error"]) if response.get("error") else response.get("result"))
+        return results
+
+    async def call_batch(self, calls: List[Tuple[str, List]]) -> List[Any]:
+        """
+        JSON-RPC calls sent by batches of `batch_size` calls, batches are sent concurrently.
+        :return: result of every call in order of `calls`, RpcError for failed calls
+        """
+        batches = [calls[i:i + self.__batch_size] for i in range(0, len(calls), self.__batch_size)]
+        results = await asyncio.gather(*(self.__call_batch(batch) for batch in batches))
+        return [result for batch in results for result in batch]
+
+    async def call(self, method: str, params: List) -> Any:
+        result = (await self.__call_batch([(method, params)]))[0]
+        if isinstance(result, RpcError):
+            raise result
+        return result
+
+    async def get_block_number(self) -> int:
+        return int(await self.call("eth_blockNumber", []), 16)
+
+    async def get_accounts_data(self, addresses: List[str]) -> Dict[str, APIAccountBalance]:
+        """
+        Native and token balances of all addresses by batch requests, two calls per address.
+        :return: balances of the addresses which were read successfully
+        """
+        addresses = list(dict.fromkeys(addresses))
+        calls = []
+        for address in addresses:
+            calls.append(("eth_getBalance", [address, "latest"]))
+            calls.append(("eth_call", [{"to": self.__usdt_contract,
+                                        "data": ERC20_BALANCE_OF_SELECTOR + self.__topic(address)[2:]},
+                                       "latest"]))
+        results = await self.call_batch(calls)
+        accounts = {}
+        for i, address in enumerate(addresses):
+            native_balance, token_balance = results[2 * i], results[2 * i + 1]
+            if isinstance(native_balance, RpcError) or isinstance(token_balance, RpcError) or \
+                    native_balance is None or token_balance is None:
+                self.logger.error("Error while reading balances of %s: %r, %r", address, native_balance, token_balance)
+                continue
+            accounts[address] = APIAccountBalance(address=address,
+                                                  native_balance=int(native_balance, 16),
+                                                  token_balance=int(token_balance, 16) if token_balance != "0x" else 0)
+        return accounts
+
+    async def get_account_data(self, address: str) -> Optional[APIAccountBalance]:
+        return (await self.get_accounts_data([address])).get(address)
+
+    async def get_blocks(self, block_numbers: List[int], full_transactions: bool = False) -> List[Dict]:
+        """
+        Blocks in order of `block_numbers`, blocks with transactions are requested by small batches.
+        """
+        batch_size = RPC_FULL_BLOCKS_BATCH_SIZE if full_transactions else self.__batch_size
+        batches = [block_numbers[i:i + batch_size] for i in range(0, len(block_numbers), batch_size)]
+        results = await asyncio.gather(*(self.__call_batch([("eth_getBlockByNumber", [hex(number), full_transactions])
+                                                            for number in batch]) for batch in batches))
+        blocks = []
+        for number, block in zip(block_numbers, (block for batch in results for block in batch)):
+            if isinstance(block, RpcError) or not block:
+                raise block if isinstance(block, RpcError) else RpcError("eth_getBlockByNumber",
+                                                                         {"message": f"No block {number}"})
+            self.__block_timestamps[number] = self.__block_timestamp(block)
+            blocks.append(block)
+        while len(self.__block_timestamps) > RPC_BLOCK_TIMESTAMPS_CACHE_SIZE:
+            del self.__block_timestamps[next(iter(self.__block_timestamps))]
+        return blocks
+
+    @staticmethod
+    def __block_timestamp(block: Dict) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(int(block["timestamp"], 16), datetime.timezone.utc)
+
+    async def __get_block_timestamps(self, block_numbers: List[int]) -> Dict[int, datetime.datetime]:
+        timestamps = {number: self.__block_timestamps[number] for number in set(block_numbers)
+                      if number in self.__block_timestamps}
+        missing = [number for number in set(block_numbers) if number not in timestamps]
+        for number, block in zip(missing, await self.get_blocks(missing)):
+            timestamps[number] = self.__block_timestamp(block)
+        return timestamps
+
+    async def get_native_transfers(self, from_block: int, to_block: int) -> List[APIAccountTransaction]:
+        """
+        Value transfers of all transactions in the block range (inclusive), internal transfers are not included.
+        """
+        blocks = await self.get_blocks(list(range(from_block, to_block + 1)), full_transactions=True)
+        return [APIAccountTransaction(from_address=trn["from"].lower(),
+                                      to_address=trn["to"].lower(),
+                                      amount=int(trn["value"], 16),
+                                      timestamp=self.__block_timestamp(block),
+                                      block_number=int(block["number"], 16))
+                for block in blocks for trn in block.get("transactions") or []
+                if trn.get("to") and int(trn.get("value") or "0x0", 16)]
+
+    async def __get_transfer_logs(self, address: Optional[str], from_block: int, to_block: int) -> List[Dict]:
+        """
+        Transfer logs from and to the address (all transfers if None), a range the node refuses is split in halves.
+        """
+        if address:
+            topic = self.__topic(address)
+            filters = [[ERC20_TRANSFER_TOPIC, topic], [ERC20_TRANSFER_TOPIC, None, topic]]
+        else:
+            filters = [[ERC20_TRANSFER_TOPIC]]
+        results = await self.call_batch([("eth_getLogs", [{"address": self.__usdt_contract,
+                                                           "fromBlock": hex(from_block),
+                                                           "toBlock": hex(to_block),
+                                                           "topics": topics}]) for topics in filters])
+        if error := next((result for result in results if isinstance(result, RpcError)), None):
+            if to_block - from_block < RPC_LOGS_MIN_BLOCK_RANGE:
+                raise error
+            middle = (from_block + to_block) // 2
+            return (await self.__get_transfer_logs(address, from_block, middle) +
+                    await self.__get_transfer_logs(address, middle + 1, to_block))
+        return [log for logs in results for log in logs or []]
+
+    async def get_token_transfers(self, address: Optional[str], from_block: int,
+                                  to_block: int) -> List[APIAccountTransaction]:
+        """
+        USDT transfers of the address (of all addresses if None) in the block range (inclusive) in ascending order,
+        the range is read by windows of `logs_block_range` blocks.
+        """
+        windows = [(start, min(start + self.__logs_block_range - 1, to_block))
+                   for start in range(max(from_block, 0), to_block + 1, self.__logs_block_range)]
+        results = await asyncio.gather(*(self.__get_transfer_logs(address, start, end) for start, end in windows))
+        logs = {(log["transactionHash"], log["logIndex"]): log for window in results for log in window
+                if not log.get("removed")}
+        logs = sorted(logs.values(), key=lambda log: (int(log["blockNumber"], 16), int(log["logIndex"], 16)))
+        timestamps = await self.__get_block_timestamps([int(log["blockNumber"], 16) for log in logs])
+        return [APIAccountTransaction(from_address="0x" + log["topics"][1][-40:],
+                                      to_address="0x" + log["topics"][2][-40:],
+                                      amount=int(log["data"], 16),
+                                      timestamp=timestamps[int(log["blockNumber"], 16)],
+                                      block_number=int(log["blockNumber"], 16))
+                for log in logs if len(log["topics"]) == 3 and int(log["data"], 16)]
+
+    async def sync_native_transactions(self, address: str,
+                                       cursor: Optional[APISyncCursor] = None) -> Optional[APITransactionsSync]:
+        return APITransactionsSync(transactions=[], cursor=APISyncCursor(block_number=await self.get_block_number()))
+
+    async def sync_token_transactions(self, address: str,
+                                      cursor: Optional[APISyncCursor] = None) -> Optional[APITransactionsSync]:
+        """
+        Transfers from the cursor block (inclusive) to the latest block, the first sync reads
+        the last RPC_LOGS_LOOKBACK blocks.
+        """
+        latest_block = await self.get_block_number()
+        from_block = cursor.block_number if cursor and cursor.block_number is not None else \
+            latest_block - RPC_LOGS_LOOKBACK
+        transactions = await self.get_token_transfers(address, from_block, latest_block)
+        return APITransactionsSync(transactions=transactions, cursor=APISyncCursor(block_number=latest_block))
+
+    async def get_history_page(self, address: str, tx_type: str,
+                               cursor: Optional[str] = None) -> Optional[APITransactionsPage]:
+        """
+        Page of the token history is a window of RPC_HISTORY_BLOCK_RANGE blocks walked from the latest block
+        to the genesis, native history is not available by JSON-RPC.
+        :param cursor: end block of the page (inclusive), None for the first page
+        """
+        if tx_type != "token":
+            return APITransactionsPage(transactions=[], next_cursor=None)
+        end_block = int(cursor) if cursor else await self.get_block_number()
+        start_block = max(end_block - RPC_HISTORY_BLOCK_RANGE + 1, 0)
+        transactions = await self.get_token_transfers(address, start_block, end_block)
+        return APITransactionsPage(transactions=list(reversed(transactions)),
+                                   next_cursor=str(start_block - 1) if start_block else None)
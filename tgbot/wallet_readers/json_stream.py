@@ -0,0 +1,204 @@
+import codecs
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List, Callable, AsyncIterator
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+JsonLoads = Callable[[str | bytes], Any]
+CHUNK_SIZE: int = 64 * 1024
+WHITESPACE = " \t\n\r"
+STRUCTURE_TOKEN = re.compile(r'["\[\]{}]')
+STRING_TOKEN = re.compile(r'["\\]')
+SCALAR_END = re.compile(r'[\s,\]}]')
+
+
+@dataclass
+class JsonRecords:
+    """
+    Top level JSON object with one array field mapped to records.
+    `records` is None if the array field is missing or is not an array (it is left in `fields` then),
+    `count` is the count of the array items before mapping and `last_item` is the last of them.
+    """
+    records: Optional[List[Any]]
+    fields: Dict[str, Any] = field(default_factory=dict)
+    count: int = 0
+    last_item: Any = None
+
+
+def get_json_loads(backend: str = "json") -> JsonLoads:
+    """
+    Faster JSON backend for aiohttp `loads=` hook, falls back to the standard json module.
+    """
+    if backend == "orjson":
+        try:
+            import orjson
+            return orjson.loads
+        except ImportError:
+            logger.warning("orjson is not installed, standard json module is used")
+    return json.loads
+
+
+class JsonObjectStream:
+    """
+    Incremental parser of a top level JSON object read from a response stream.
+    Values are cut out of the stream by a scanner which keeps its place across chunks, so every byte
+    is scanned once however the values are split into chunks, and each value is decoded by `loads`.
+    Items of the `array_key` array are decoded one by one and mapped while the caller iterates over
+    `records`, so neither the whole body nor the dict tree of the whole array is held in memory.
+    """
+
+    def __init__(self, content: aiohttp.StreamReader, array_key: str, loads: JsonLoads = json.loads,
+                 chunk_size: int = CHUNK_SIZE) -> None:
+        self.__content = content
+        self.__array_key = array_key
+        self.__loads = loads
+        self.__chunk_size = chunk_size
+        self.__text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.__buffer = ""
+        self.__pos = 0
+        self.__eof = False
+        self.__started = False
+        self.fields: Dict[str, Any] = {}
+        self.count = 0
+        self.last_item: Any = None
+
+    async def __read(self) -> bool:
+        if self.__eof:
+            return False
+        chunk = await self.__content.read(self.__chunk_size)
+        if not chunk:
+            self.__eof = True
+            self.__buffer = self.__buffer[self.__pos:] + self.__text_decoder.decode(b"", final=True)
+        else:
+            self.__buffer = self.__buffer[self.__pos:] + self.__text_decoder.decode(chunk)
+        self.__pos = 0
+        return True
+
+    async def __peek(self) -> str:
+        while True:
+            while self.__pos < len(self.__buffer) and self.__buffer[self.__pos] in WHITESPACE:
+                self.__pos += 1
+            if self.__pos < len(self.__buffer):
+                return self.__buffer[self.__pos]
+            if not await self.__read():
+                raise ValueError("Unexpected end of JSON stream")
+
+    async def __expect(self, chars: str) -> str:
+        if (char := await self.__peek()) not in chars:
+            raise ValueError(f"Unexpected {char!r} in JSON stream, expected one of {chars!r}")
+        self.__pos += 1
+        return char
+
+    async def __value_end(self) -> int:
+        """
+        :return: end of the value at the current position, the buffer is read on until the value is complete
+        """
+        # `scanned` is relative to the value start, reading a chunk moves the value to the buffer start
+        scanned = 0
+        if await self.__peek() not in '"[{':
+            while not (match := SCALAR_END.search(self.__buffer, self.__pos + scanned)):
+                scanned = len(self.__buffer) - self.__pos
+                if not await self.__read():
+                    return len(self.__buffer)
+            return match.start()
+        depth, in_string = 0, False
+        while True:
+            match = (STRING_TOKEN if in_string else STRUCTURE_TOKEN).search(self.__buffer, self.__pos + scanned)
+            if not match or (match.group() == "\\" and match.end() == len(self.__buffer)):
+                # the escaped character is in the next chunk, the backslash is scanned again with it
+                scanned = match.start() - self.__pos if match else len(self.__buffer) - self.__pos
+                if not await self.__read():
+                    raise ValueError("Unexpected end of JSON stream")
+                continue
+            token = match.group()
+            scanned = match.end() - self.__pos
+            if token == "\\":
+                scanned += 1
+            elif token == '"':
+                in_string = not in_string
+            elif token in "[{":
+                depth += 1
+            else:
+                depth -= 1
+            if not depth and not in_string:
+                return match.end()
+
+    async def __value(self) -> Any:
+        end = await self.__value_end()
+        value = self.__loads(self.__buffer[self.__pos:end])
+        self.__pos = end
+        return value
+
+    async def __fields(self) -> bool:
+        """
+        Read fields into `fields` up to the `array_key` array or to the end of the object.
+        :return: True if the array is reached, the position is at its first item then
+        """
+        if not self.__started:
+            self.__started = True
+            await self.__expect("{")
+            if await self.__peek() == "}":
+                self.__pos += 1
+                return False
+        elif await self.__expect(",}") == "}":
+            return False
+        while True:
+            key = await self.__value()
+            await self.__expect(":")
+            if key == self.__array_key and await self.__peek() == "[":
+                self.__pos += 1
+                return True
+            self.fields[key] = await self.__value()
+            if await self.__expect(",}") == "}":
+                return False
+
+    async def open_array(self) -> bool:
+        """
+        Read the object fields which precede the `array_key` array.
+        :return: True if the object has the array, its items are read by `records` then
+        """
+        return await self.__fields()
+
+    async def records(self, process: Callable[[Any], Any]) -> AsyncIterator[Any]:
+        """
+        Items of the array opened by `open_array` mapped by `process`, None results are dropped.
+        Fields which follow the array are read into `fields` once the items are exhausted.
+        """
+        if await self.__peek() != "]":
+            while True:
+                item = await self.__value()
+                self.count += 1
+                self.last_item = item
+                if (record := process(item)) is not None:
+                    yield record
+                if await self.__expect(",]") == "]":
+                    break
+        else:
+            self.__pos += 1
+        await self.__fields()
+
+    async def read(self, process: Callable[[Any], Any]) -> JsonRecords:
+        records = [record async for record in self.records(process)] if await self.open_array() else None
+        return JsonRecords(records=records, fields=self.fields, count=self.count, last_item=self.last_item)
+
+
+def map_json_records(raw_data: Optional[Dict[str, Any]], array_key: str,
+                     process: Callable[[Any], Any]) -> Optional[JsonRecords]:
+    """
+    JsonRecords from the already decoded JSON object.
+    """
+    if not isinstance(raw_data, dict):
+        return
+    items = raw_data.get(array_key)
+    fields = {key: value for key, value in raw_data.items() if key != array_key or not isinstance(value, list)}
+    if not isinstance(items, list):
+        return JsonRecords(records=None, fields=fields)
+    return JsonRecords(records=[record for item in items if (record := process(item)) is not None],
+                       fields=fields,
+                       count=len(items),
+                       last_item=items[-1] if items else None)
@@ -0,0 +1,113 @@
+import asyncio
+import time
+from typing import Optional, Dict, Tuple, List
+
+
+class RateLimitExceeded(Exception):
+    """
+    API answered that the request rate limit of the key is exceeded.
+    """
+
+    def __init__(self, api_key: Optional[str], retry_after: float = 1.0) -> None:
+        super().__init__(f"Rate limit exceeded, retry after {retry_after} second(s)")
+        self.api_key = api_key
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second are added up to `capacity`,
+    every request consumes one token.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.__tokens = self.capacity
+        self.__updated = time.monotonic()
+
+    def available(self, now: Optional[float] = None) -> float:
+        now = now or time.monotonic()
+        self.__tokens = min(self.capacity, self.__tokens + (now - self.__updated) * self.rate)
+        self.__updated = now
+        return self.__tokens
+
+    def try_consume(self, now: Optional[float] = None) -> float:
+        """
+        :return: 0 if token was consumed or seconds to wait for the next token
+        """
+        if (tokens := self.available(now)) >= 1:
+            self.__tokens -= 1
+            return 0
+        return (1 - tokens) / self.rate
+
+    def penalize(self, seconds: float, now: Optional[float] = None) -> None:
+        self.available(now)
+        self.__tokens = min(self.__tokens, 0) - seconds * self.rate
+
+    async def acquire(self) -> None:
+        while wait := self.try_consume():
+            await asyncio.sleep(wait)
+
+
+class ApiKey:
+    __slots__ = ("key", "bucket", "last_used")
+
+    def __init__(self, key: str, rate: float) -> None:
+        self.key = key
+        self.bucket = TokenBucket(rate)
+        self.last_used = 0.0
+
+
+class ApiKeyPool:
+    """
+    Pool of API keys of one service. Every key has its own requests-per-second budget,
+    callers get the key with the largest remaining budget (least recently used on tie)
+    and wait when budgets of all keys are exhausted.
+    """
+
+    def __init__(self, api_keys: List[str], rate: float) -> None:
+        if not api_keys:
+            raise ValueError("Api keys can not be empty.")
+        self.rate = rate
+        self.__keys: Dict[str, ApiKey] = {key: ApiKey(key, rate) for key in api_keys}
+
+    @property
+    def keys(self) -> List[str]:
+        return list(self.__keys.keys())
+
+    @property
+    def capacity(self) -> float:
+        return self.rate * len(self.__keys)
+
+    async def acquire(self) -> str:
+        while True:
+            now = time.monotonic()
+            api_key = max(self.__keys.values(), key=lambda k: (k.bucket.available(now), -k.last_used))
+            if not (wait := api_key.bucket.try_consume(now)):
+                api_key.last_used = now
+                return api_key.key
+            await asyncio.sleep(wait)
+
+    def penalize(self, key: str, seconds: float = 1.0) -> None:
+        if api_key := self.__keys.get(key):
+            api_key.bucket.penalize(seconds)
+
+
+DEFAULT_API_RPS: float = 5.0
+_key_pools: Dict[Tuple[str, ...], ApiKeyPool] = {}
+
+
+def configure_key_pool(api_keys: List[str], rate: float) -> ApiKeyPool:
+    key_pool = ApiKeyPool(api_keys, rate)
+    _key_pools[tuple(api_keys)] = key_pool
+    return key_pool
+
+
+def get_key_pool(api_keys: List[str], rate: float = DEFAULT_API_RPS) -> ApiKeyPool:
+    """
+    Process-wide key pool shared by all readers using the same api keys.
+    """
+    if not (key_pool := _key_pools.get(tuple(api_keys))):
+        key_pool = configure_key_pool(api_keys, rate)
+    return key_pool
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional, Any, Dict, Tuple, Iterable
+from urllib.parse import urlencode
+
+from aiohttp.typedefs import StrOrURL
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+CacheTTLs = Dict[str, float]
+RESPONSE_CACHE_SIZE: int = 1024
+REDIS_KEY_PREFIX: str = "wallet_readers:response:"
+
+
+class ResponseCache(ABC):
+    """
+    Cache of decoded JSON API responses, every value expires after its own TTL.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryResponseCache(ResponseCache):
+    """
+    Process local LRU cache, expired values are dropped on access.
+    """
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self.__items: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    async def get(self, key: str) -> Optional[Any]:
+        if not (item := self.__items.get(key)):
+            return
+        expires, value = item
+        if expires <= time.monotonic():
+            del self.__items[key]
+            return
+        self.__items.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self.__items[key] = (time.monotonic() + ttl, value)
+        self.__items.move_to_end(key)
+        while len(self.__items) > self.maxsize:
+            self.__items.popitem(last=False)
+
+
+class RedisResponseCache(ResponseCache):
+    """
+    Cache shared by all bot processes. Values are stored as JSON, the format they were received in,
+    and decoded again after reading. Redis errors and undecodable values are logged and treated as cache misses.
+    """
+
+    def __init__(self, redis: Redis, prefix: str = REDIS_KEY_PREFIX) -> None:
+        self.__redis = redis
+        self.__prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            raw = await self.__redis.get(self.__prefix + key)
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            logger.warning("Response cache read failed: %r", e)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        try:
+            await self.__redis.set(self.__prefix + key, json.dumps(value, separators=(",", ":")), px=int(ttl * 1000))
+        except Exception as e:
+            logger.warning("Response cache write failed: %r", e)
+
+    async def close(self) -> None:
+        await self.__redis.close()
+
+
+def make_cache_key(url: StrOrURL, params: Optional[Dict], exclude: Iterable[Optional[str]] = ()) -> str:
+    """
+    Key of the request by url and params, excluded params (api keys) do not take part in it.
+    """
+    exclude = set(exclude)
+    query = urlencode(sorted((str(key), str(value)) for key, value in (params or {}).items() if key not in exclude))
+    return hashlib.sha1(f"{url}?{query}".encode()).hexdigest()
+
+
+def create_response_cache(use_redis: bool, redis_dsn: Optional[str] = None,
+                          maxsize: int = RESPONSE_CACHE_SIZE) -> Optional[ResponseCache]:
+    if maxsize <= 0:
+        return
+    if use_redis:
+        return RedisResponseCache(Redis.from_url(str(redis_dsn)))
+    return MemoryResponseCache(maxsize)